@@ -0,0 +1,244 @@
+"""Benchmark hot paths of mutwo.diary on synthetic diaries.
+
+Usage:
+
+    python benchmarks/benchmark_diary.py --entry-count 1000 10000 --output results.json
+
+Each diary is created in a file storage in a temporary directory. Each
+benchmark starts with a cold object cache, so that queries load entries
+from the storage instead of measuring objects which have been loaded by
+previous benchmarks. The results are written as JSON, so that the results
+of different versions can be compared.
+"""
+
+import argparse
+import dataclasses
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+import types
+import typing
+
+import numpy as np
+
+from mutwo import diary_converters
+from mutwo import diary_interfaces
+from mutwo import diary_version
+from mutwo import timeline_interfaces
+
+
+CODE = """
+from mutwo import core_events
+from mutwo import timeline_interfaces
+
+def is_supported(context, **kwargs):
+    return context.start % {modulo} == 0
+
+def main(context, random, **kwargs):
+    duration = int(random.integers(1, 4))
+    return timeline_interfaces.EventPlacement(
+        core_events.Concurrence([core_events.Chronon(duration)]),
+        context.start,
+        context.start + duration,
+    )
+"""
+
+ENTRIES_PER_CONTEXT = 100
+
+
+@dataclasses.dataclass(frozen=True)
+class Result(object):
+    benchmark: str
+    entry_count: int
+    operation_count: int
+    seconds: float
+    peak_memory: typing.Optional[int]
+
+    @property
+    def operations_per_second(self) -> float:
+        return self.operation_count / self.seconds
+
+    def to_dict(self) -> dict[str, typing.Any]:
+        return dict(
+            dataclasses.asdict(self),
+            operations_per_second=self.operations_per_second,
+        )
+
+
+def make_context_class(index: int) -> typing.Type[diary_interfaces.Context]:
+    return dataclasses.dataclass(frozen=True)(
+        types.new_class(
+            f"BenchmarkContext{index}",
+            (diary_interfaces.Context,),
+            dict(name=f"benchmark{index}", version=0),
+            lambda namespace: namespace.update(__annotations__={"start": int}),
+        )
+    )
+
+
+def measure(
+    benchmark: str,
+    entry_count: int,
+    function: typing.Callable[[], int],
+    trace_memory: bool,
+) -> Result:
+    if trace_memory:
+        tracemalloc.start()
+    start = time.perf_counter()
+    operation_count = function()
+    seconds = time.perf_counter() - start
+    peak_memory = None
+    if trace_memory:
+        _, peak_memory = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    result = Result(benchmark, entry_count, operation_count, seconds, peak_memory)
+    print(
+        f"{benchmark:>12} {entry_count:>9} entries: "
+        f"{result.operations_per_second:12.1f} ops/s",
+        file=sys.stderr,
+    )
+    return result
+
+
+def minimize_cache():
+    diary_interfaces.fetch_session().connection.cacheMinimize()
+    diary_interfaces.CATALOG_CACHE.clear()
+
+
+def run(
+    entry_count: int, trace_memory: bool = True, context_count: int = 100
+) -> list[Result]:
+    context_class_tuple = tuple(
+        make_context_class(index)
+        for index in range(max(1, entry_count // ENTRIES_PER_CONTEXT))
+    )
+    result_list = []
+    with tempfile.TemporaryDirectory() as directory, diary_interfaces.open(
+        os.path.join(directory, "diary.fs")
+    ):
+
+        def commit() -> int:
+            with diary_interfaces.bulk():
+                for index in range(entry_count):
+                    diary_interfaces.DynamicEntry(
+                        f"e{index}",
+                        context_class_tuple[
+                            index % len(context_class_tuple)
+                        ].identifier,
+                        timeline_interfaces.EventPlacement,
+                        relevance=index % 10,
+                        code=CODE.format(modulo=index % 7 + 1),
+                        skip_check=False,
+                    )
+            return entry_count
+
+        def rquery_index() -> int:
+            wrapped = diary_interfaces.fetch_wrapped_entry_tree()
+            for context_class in context_class_tuple[:context_count]:
+                tuple(wrapped.rquery(context_identifier=str(context_class.identifier)))
+            return min(context_count, len(context_class_tuple))
+
+        def rquery_scan() -> int:
+            tuple(diary_interfaces.fetch_wrapped_entry_tree().rquery(name="e1"))
+            return entry_count
+
+        def fquery() -> int:
+            tuple(
+                diary_interfaces.fetch_wrapped_entry_tree().fquery(
+                    lambda entry: entry.relevance > 5
+                )
+            )
+            return entry_count
+
+        def cquery() -> int:
+            tuple(
+                diary_interfaces.fetch_wrapped_entry_tree().cquery(
+                    lambda catalog: catalog.relevance > 5
+                )
+            )
+            return entry_count
+
+        def execute() -> int:
+            random = np.random.default_rng(10)
+            context = context_class_tuple[0](0)
+            code = CODE.format(modulo=1)
+            for _ in range(entry_count):
+                diary_interfaces.execute("e", code, "main", context, random=random)
+            return entry_count
+
+        def convert() -> int:
+            context_tuple = tuple(
+                context_class_tuple[index % len(context_class_tuple)](index)
+                for index in range(context_count * 10)
+            )
+            diary_converters.ContextTupleToEventPlacementTuple().convert(context_tuple)
+            return len(context_tuple)
+
+        for name, function in (
+            ("commit", commit),
+            ("rquery_index", rquery_index),
+            ("rquery_scan", rquery_scan),
+            ("fquery", fquery),
+            ("cquery", cquery),
+            ("execute", execute),
+            ("convert", convert),
+        ):
+            minimize_cache()
+            result_list.append(measure(name, entry_count, function, trace_memory))
+    return result_list
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--entry-count",
+        type=int,
+        nargs="+",
+        default=[1000, 10000],
+        help="sizes of the synthetic diaries (for instance 1000 100000 1000000)",
+    )
+    parser.add_argument(
+        "--context-count",
+        type=int,
+        default=100,
+        help="how many contexts are queried and converted (x10)",
+    )
+    parser.add_argument(
+        "--no-memory",
+        action="store_true",
+        help="don't trace peak memory (tracing slows down all benchmarks)",
+    )
+    parser.add_argument("--output", help="path of JSON file (default: stdout)")
+    argument_namespace = parser.parse_args()
+
+    result_list = []
+    for entry_count in argument_namespace.entry_count:
+        result_list.extend(
+            run(
+                entry_count,
+                trace_memory=not argument_namespace.no_memory,
+                context_count=argument_namespace.context_count,
+            )
+        )
+
+    report = dict(
+        version=diary_version.VERSION,
+        python=platform.python_version(),
+        numpy=np.__version__,
+        platform=platform.platform(),
+        trace_memory=not argument_namespace.no_memory,
+        result_list=[result.to_dict() for result in result_list],
+    )
+    if argument_namespace.output:
+        with open(argument_namespace.output, "w") as file:
+            json.dump(report, file, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,3 +1,6 @@
 from . import configurations
 
+from .samplers import *
+from .collectors import *
 from .base import *
+from .daemons import *
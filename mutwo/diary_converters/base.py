@@ -1,24 +1,82 @@
+import concurrent.futures
+import contextlib
+import itertools
 import logging
+import multiprocessing.util
 import typing
 
 import numpy as np
+from ZODB.FileStorage import FileStorage
 
 from mutwo import core_converters
-from mutwo import core_utilities
 from mutwo import diary_converters
 from mutwo import diary_interfaces
+from mutwo import diary_utilities
 from mutwo import timeline_interfaces
 
 __all__ = ("ContextTupleToEventPlacementTuple",)
 
 
 class ContextTupleToEventPlacementTuple(core_converters.abc.Converter):
+    """Pick and call entries for each context.
+
+    :param random_seed: Seed of the random generator which picks one of
+        all supported entries of a context.
+    :param logging_level: Logging level of the converter. Defaults to
+        :const:`diary_converters.configurations.LOGGING_LEVEL`.
+    :param process_count: If set, the supported entries of each context are
+        found and the picked entries are called in a pool of ``process_count``
+        processes. Each process opens the storage of the session in
+        read-only mode, therefore all entries need to be
+        committed before converting and the storage can't be a memory
+        storage. Entries
+        are still picked in the main process with the same random generator,
+        so that the same entries are picked as in the sequential mode. The
+        states which entry functions use (their ``random`` and
+        ``activity_level`` arguments) are sent to the workers and restored
+        afterwards. Therefore all calls of an entry which uses states (or
+        whose requirements use states) are executed one after another in
+        the same process: such an entry doesn't gain from parallelism even
+        if it is picked for many contexts. Only calls of entries without
+        states are distributed freely. Contexts and returned objects need
+        to be picklable.
+    :param render_cache: If set, picked entries are called via
+        :meth:`diary_interfaces.RenderCache.call`, so that outputs of unchanged
+        entries are fetched from the cache. Can't be combined with
+        ``process_count``.
+    :param stats: If set, the time spent in finding, checking, picking
+        and calling entries is recorded per entry and context identifier
+        (see :class:`StatsCollector`). Can't be combined with ``process_count``.
+    :param execution_pool: If set, entry functions are executed in the
+        worker processes of the pool (see :class:`diary_interfaces.ExecutionPool`).
+        Entries which raise :class:`diary_utilities.ExecutionError` (for
+        instance because they exceeded the time limit of the pool) are
+        logged and skipped. Can't be combined with ``process_count``.
+    :param session: The session of the database from which entries are
+        fetched. Defaults to the session opened by
+        :func:`diary_interfaces.open`.
+    :param rquery_kwargs: Further arguments passed to :meth:`qwrap.rquery`
+        to find the entries of a context.
+    """
+
     def __init__(
         self,
         random_seed: int = 10,
         logging_level: typing.Optional[int] = None,
+        process_count: typing.Optional[int] = None,
+        render_cache: typing.Optional[diary_interfaces.RenderCache] = None,
+        session: typing.Optional[diary_interfaces.Session] = None,
+        stats: typing.Optional[diary_converters.StatsCollector] = None,
+        execution_pool: typing.Optional[diary_interfaces.ExecutionPool] = None,
         **rquery_kwargs,
     ):
+        if process_count and render_cache is not None:
+            raise ValueError("Render cache can't be used with a process pool.")
+        if process_count and stats is not None:
+            raise ValueError("Stats can't be collected with a process pool.")
+        if process_count and execution_pool is not None:
+            raise ValueError("Execution pool can't be used with a process pool.")
+
         rquery_kwargs.setdefault(
             "entry_identifier",
             "|".join(
@@ -41,58 +99,387 @@ class ContextTupleToEventPlacementTuple(core_converters.abc.Converter):
             logging_level = diary_converters.configurations.LOGGING_LEVEL
 
         self._rquery_kwargs = rquery_kwargs
+        self._logging_level = logging_level
+        self._process_count = process_count
+        self._render_cache = render_cache
+        self._session = session
+        self._stats = stats
+        self._execution_pool = execution_pool
         self._random = np.random.default_rng(random_seed)
+        self._sampler_cache = diary_interfaces.Cache(
+            diary_converters.configurations.SAMPLER_CACHE_SIZE
+        )
         self._logger = logging.getLogger(f"{__name__}.{type(self).__name__}")
         self._logger.setLevel(logging_level)
 
     def convert(
         self, context_tuple: tuple[diary_interfaces.Context, ...]
     ) -> tuple[timeline_interfaces.EventPlacement, ...]:
+        return tuple(self.convert_iter(context_tuple))
+
+    def convert_iter(
+        self, context_iterable: typing.Iterable[diary_interfaces.Context]
+    ) -> typing.Iterator[timeline_interfaces.EventPlacement]:
+        """Yield event placements as soon as they are created.
+
+        :param context_iterable: The contexts. Can also be a lazy
+            generator, it is only consumed while iterating the result.
+
+        Yields the same event placements as :meth:`convert`, but the
+        memory doesn't grow with the count of contexts. With a process
+        pool, contexts are converted in chunks of
+        :const:`configurations.STREAM_CHUNK_SIZE`.
+        """
+        if self._process_count:
+            yield from self._convert_iter_in_parallel(context_iterable)
+            return
 
-        event_placement_list = []
         context_identifier_to_entry_tuple = {}
 
         self._logger.debug("<<<<< find entries")
 
-        for context in context_tuple:
-            self._logger.debug(f"Try to find entry for context '{context}'...")
+        for context in context_iterable:
+            # Don't profile consumers of the generator (and don't
+            # execute their entries in the execution pool).
+            with self._profiling(), self._executing():
+                event_placement = self._convert_context(
+                    context, context_identifier_to_entry_tuple
+                )
+            if event_placement is not None:
+                yield event_placement
+
+        self._logger.debug("finished >>>>>>>")
+
+    def _convert_context(
+        self,
+        context: diary_interfaces.Context,
+        context_identifier_to_entry_tuple: dict[
+            int, tuple[diary_interfaces.Entry, ...]
+        ],
+    ) -> typing.Optional[timeline_interfaces.EventPlacement]:
+        self._logger.debug(f"Try to find entry for context '{context}'...")
+        entry_tuple = self._context_to_supported_entry_tuple(
+            context, context_identifier_to_entry_tuple
+        )
+        entry_relevance_tuple = tuple(e.relevance for e in entry_tuple)
+        with self._measure("pick", context.identifier):
+            picked_entry = self._pick_entry(entry_tuple, entry_relevance_tuple)
+        if picked_entry:
+            self._logger.debug(f"Picked '{picked_entry.name}'.")
             try:
-                entry_tuple = context_identifier_to_entry_tuple[context.identifier]
+                with self._measure("call", context.identifier, picked_entry.path):
+                    return self._call_entry(picked_entry, context)
+            except diary_utilities.ExecutionError as e:
+                self._skip_entry(picked_entry, e)
+                return None
+        self._logger.debug("No entry picked.")
+        return None
+
+    def _convert_iter_in_parallel(
+        self, context_iterable: typing.Iterable[diary_interfaces.Context]
+    ) -> typing.Iterator[timeline_interfaces.EventPlacement]:
+        # Workers can't write to the database, so we need to make
+        # sure the index, the catalog and the dependency tree already exist.
+        session = diary_interfaces.fetch_session(self._session)
+        diary_interfaces.fetch_index_tree(session)
+        diary_interfaces.fetch_catalog_tree(session)
+        diary_interfaces.fetch_dependency_tree(session)
+
+        if (storage_spec := session.storage_spec) is None:
+            if not isinstance(session.storage, FileStorage):
+                raise ValueError(
+                    "Workers can't open the storage of a session without "
+                    "storage specification."
+                )
+            storage_spec = session.storage.getName()
+        if storage_spec.startswith("memory"):
+            raise ValueError("Workers can't open a memory storage.")
+
+        context_iterator = iter(context_iterable)
+        with concurrent.futures.ProcessPoolExecutor(
+            self._process_count,
+            initializer=_initialize_worker,
+            initargs=(
+                storage_spec,
+                self._logging_level,
+                self._rquery_kwargs,
+            ),
+        ) as executor:
+            self._logger.debug("<<<<< find entries")
+            while context_tuple := tuple(
+                itertools.islice(
+                    context_iterator, diary_converters.configurations.STREAM_CHUNK_SIZE
+                )
+            ):
+                yield from self._convert_chunk_in_parallel(context_tuple, executor)
+            self._logger.debug("finished >>>>>>>")
+
+    def _convert_chunk_in_parallel(
+        self,
+        context_tuple: tuple[diary_interfaces.Context, ...],
+        executor: concurrent.futures.Executor,
+    ) -> typing.Iterator[timeline_interfaces.EventPlacement]:
+        chunksize = max(1, len(context_tuple) // (self._process_count * 4))
+        path_and_relevance_tuple_tuple = tuple(
+            executor.map(
+                _context_to_supported_path_and_relevance_tuple,
+                context_tuple,
+                chunksize=chunksize,
+            )
+        )
+
+        # Draw samples of all contexts with supported entries at once.
+        # Drawing the samples of all chunks one after another results
+        # in the same samples as drawing them in one go.
+        path_tuple_and_context_list = []
+        for context, path_and_relevance_tuple in zip(
+            context_tuple, path_and_relevance_tuple_tuple
+        ):
+            if path_and_relevance_tuple:
+                path_tuple_and_context_list.append(
+                    (tuple(zip(*path_and_relevance_tuple)), context)
+                )
+            else:
+                self._logger.debug(f"No entry picked for '{context}'.")
+        uniform_array = self._random.random(len(path_tuple_and_context_list))
+        path_and_context_list = []
+        for ((path_tuple, relevance_tuple), context), uniform in zip(
+            path_tuple_and_context_list, uniform_array
+        ):
+            sampler = self._fetch_sampler(relevance_tuple)
+            picked_path = path_tuple[int(sampler.index(uniform))]
+            self._logger.debug(f"Picked '{picked_path}'.")
+            path_and_context_list.append((picked_path, context))
+
+        # Workers don't know the states (e.g. random generators) of the
+        # entries in the main process: states are sent with each group of
+        # calls and the changed states are restored after the calls.
+        entry_tree = diary_interfaces.fetch_entry_tree(self._session)
+        group_tuple = self._group_call(path_and_context_list, entry_tree)
+        task_list = []
+        for path_tuple, index_and_context_list in group_tuple:
+            task_list.append(
+                (
+                    tuple(
+                        (path, entry_tree[path]._fetch_call_state())
+                        for path in path_tuple
+                    ),
+                    tuple(
+                        (path_and_context_list[index][0], context)
+                        for index, context in index_and_context_list
+                    ),
+                )
+            )
+        event_placement_list = [None] * len(path_and_context_list)
+        for (_, index_and_context_list), (
+            group_event_placement_tuple,
+            path_and_state_tuple,
+        ) in zip(group_tuple, executor.map(_call_entry_group, task_list)):
+            for path, state in path_and_state_tuple:
+                entry_tree[path]._restore_call_state(state)
+            for (index, _), event_placement in zip(
+                index_and_context_list, group_event_placement_tuple
+            ):
+                event_placement_list[index] = event_placement
+
+        for event_placement in event_placement_list:
+            if event_placement is not None:
+                yield event_placement
+
+    def _group_call(
+        self,
+        path_and_context_list: list[tuple[str, diary_interfaces.Context]],
+        entry_tree: typing.Mapping[str, diary_interfaces.Entry],
+    ) -> tuple[tuple[tuple[str, ...], list[tuple[int, diary_interfaces.Context]]], ...]:
+        # Calls of entries which (directly or via requirements) use the
+        # same states change them, so they are grouped and called one
+        # after another in the same worker. Each group consists of the
+        # paths of all involved entries with states and the calls in their
+        # order. Calls without states are independent groups.
+        dependency_graph = diary_interfaces.DependencyGraph.from_diary(self._session)
+        path_to_closure = {}
+        path_to_group = {}
+        stateless_group_list = []
+        for index, (path, context) in enumerate(path_and_context_list):
+            try:
+                closure = path_to_closure[path]
             except KeyError:
+                closure = path_to_closure[path] = tuple(
+                    closure_path
+                    for closure_path in dependency_graph.closure((path,))
+                    if entry_tree[closure_path]._fetch_call_state()
+                )
+            if not closure:
+                stateless_group_list.append(((), [(index, context)]))
+                continue
+            group = (set(closure), [(index, context)])
+            for other_group in {
+                id(other_group): other_group
+                for other_path in closure
+                if (other_group := path_to_group.get(other_path)) is not None
+            }.values():
+                group[0].update(other_group[0])
+                group[1].extend(other_group[1])
+            for group_path in group[0]:
+                path_to_group[group_path] = group
+        group_list = stateless_group_list
+        for path_set, index_and_context_list in {
+            id(group): group for group in path_to_group.values()
+        }.values():
+            index_and_context_list.sort(
+                key=lambda index_and_context: index_and_context[0]
+            )
+            group_list.append((tuple(sorted(path_set)), index_and_context_list))
+        return tuple(sorted(group_list, key=lambda group: group[1][0][0]))
+
+    def _measure(self, *args) -> typing.ContextManager:
+        if self._stats is None:
+            return contextlib.nullcontext()
+        return self._stats.measure(*args)
+
+    def _profiling(self) -> typing.ContextManager:
+        if self._stats is None:
+            return contextlib.nullcontext()
+        return self._stats.profiling()
+
+    def _executing(self) -> typing.ContextManager:
+        if self._execution_pool is None:
+            return contextlib.nullcontext()
+        return self._execution_pool.activate()
+
+    def _skip_entry(
+        self, entry: diary_interfaces.Entry, exception: diary_utilities.ExecutionError
+    ):
+        # Without execution pool, errors of entries are still raised.
+        if self._execution_pool is None:
+            raise exception
+        self._logger.warning(f"Skipped '{entry.path}': {exception}")
+
+    def _call_entry(
+        self, entry: diary_interfaces.Entry, context: diary_interfaces.Context
+    ) -> typing.Optional[timeline_interfaces.EventPlacement]:
+        if self._render_cache is None:
+            return entry(context)
+        return self._render_cache.call(entry, context)
+
+    def _context_to_supported_entry_tuple(
+        self,
+        context: diary_interfaces.Context,
+        context_identifier_to_entry_tuple: dict[
+            int, tuple[diary_interfaces.Entry, ...]
+        ],
+    ) -> tuple[diary_interfaces.Entry, ...]:
+        try:
+            entry_tuple = context_identifier_to_entry_tuple[context.identifier_index]
+        except KeyError:
+            with self._measure("rquery", context.identifier):
                 context_identifier_to_entry_tuple[
-                    context.identifier
+                    context.identifier_index
                 ] = entry_tuple = self._context_to_entry_tuple(context)
-            entry_tuple = tuple(
-                filter(lambda entry: entry.is_supported(context), entry_tuple)
-            )
-            entry_relevance_tuple = tuple(e.relevance for e in entry_tuple)
-            if picked_entry := self._pick_entry(entry_tuple, entry_relevance_tuple):
-                self._logger.debug(f"Picked '{picked_entry.name}'.")
-                if (event_placement := picked_entry(context)) is not None:
-                    event_placement_list.append(event_placement)
-            else:
-                self._logger.debug("No entry picked.")
+                # Load all requirements of the entries in one go.
+                diary_interfaces.prefetch(
+                    (entry.path for entry in entry_tuple), self._session
+                )
+        if self._stats is None and self._execution_pool is None:
+            return tuple(filter(lambda entry: entry.is_supported(context), entry_tuple))
 
-        self._logger.debug("finished >>>>>>>")
+        def is_supported(entry: diary_interfaces.Entry) -> bool:
+            try:
+                with self._measure("is_supported", context.identifier, entry.path):
+                    return entry.is_supported(context)
+            except diary_utilities.ExecutionError as e:
+                self._skip_entry(entry, e)
+                return False
 
-        return tuple(event_placement_list)
+        return tuple(filter(is_supported, entry_tuple))
 
     def _context_to_entry_tuple(
         self, context: diary_interfaces.Context
     ) -> tuple[diary_interfaces.Entry, ...]:
         return tuple(
-            diary_interfaces.fetch_wrapped_entry_tree().rquery(
+            diary_interfaces.fetch_wrapped_entry_tree(session=self._session).rquery(
                 context_identifier=str(context.identifier), **self._rquery_kwargs
             )
         )
 
+    def _fetch_sampler(
+        self, relevance_tuple: tuple[float, ...]
+    ) -> diary_converters.WeightedSampler[int]:
+        # The sampler only depends on the relevances, so it picks indices
+        # and can be shared by all entry sets with equal relevances.
+        return self._sampler_cache.fetch(
+            relevance_tuple,
+            lambda: diary_converters.WeightedSampler(
+                tuple(range(len(relevance_tuple))), relevance_tuple
+            ),
+        )
+
     def _pick_entry(
         self,
         entry_tuple: tuple[diary_interfaces.Entry, ...],
         entry_relevance_tuple: tuple[float, ...],
     ) -> typing.Optional[diary_interfaces.Entry]:
         if entry_tuple:
-            return self._random.choice(
-                entry_tuple,
-                p=core_utilities.scale_sequence_to_sum(entry_relevance_tuple, 1),
-            )
+            return entry_tuple[
+                self._fetch_sampler(entry_relevance_tuple).pick(self._random)
+            ]
+
+
+# Process wide state of workers of
+# 'ContextTupleToEventPlacementTuple(process_count=...)'
+_WORKER_CONVERTER: typing.Optional[ContextTupleToEventPlacementTuple] = None
+_WORKER_DATABASE_CONTEXT = None
+_WORKER_CONTEXT_IDENTIFIER_TO_ENTRY_TUPLE: dict = {}
+
+
+def _initialize_worker(
+    storage_spec: str, logging_level: int, rquery_kwargs: dict[str, str]
+):
+    global _WORKER_CONVERTER, _WORKER_DATABASE_CONTEXT
+
+    # The database stays open until the worker process ends.
+    _WORKER_DATABASE_CONTEXT = diary_interfaces.open(storage_spec, read_only=True)
+    _WORKER_DATABASE_CONTEXT.__enter__()
+    multiprocessing.util.Finalize(
+        None,
+        _WORKER_DATABASE_CONTEXT.__exit__,
+        args=(None, None, None),
+        exitpriority=10,
+    )
+    _WORKER_CONVERTER = ContextTupleToEventPlacementTuple(
+        logging_level=logging_level, **rquery_kwargs
+    )
+    _WORKER_CONTEXT_IDENTIFIER_TO_ENTRY_TUPLE.clear()
+
+
+def _context_to_supported_path_and_relevance_tuple(
+    context: diary_interfaces.Context,
+) -> tuple[tuple[str, float], ...]:
+    return tuple(
+        (str(entry.path), entry.relevance)
+        for entry in _WORKER_CONVERTER._context_to_supported_entry_tuple(
+            context, _WORKER_CONTEXT_IDENTIFIER_TO_ENTRY_TUPLE
+        )
+    )
+
+
+def _call_entry_group(
+    task: tuple[
+        tuple[tuple[str, typing.Any], ...],
+        tuple[tuple[str, diary_interfaces.Context], ...],
+    ],
+) -> tuple[
+    tuple[typing.Optional[timeline_interfaces.EventPlacement], ...],
+    tuple[tuple[str, typing.Any], ...],
+]:
+    path_and_state_tuple, path_and_context_tuple = task
+    entry_tree = diary_interfaces.fetch_entry_tree()
+    for path, state in path_and_state_tuple:
+        entry_tree[path]._restore_call_state(state)
+    event_placement_tuple = tuple(
+        entry_tree[path](context) for path, context in path_and_context_tuple
+    )
+    return event_placement_tuple, tuple(
+        (path, entry_tree[path]._fetch_call_state())
+        for path, _ in path_and_state_tuple
+    )
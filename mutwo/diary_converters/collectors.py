@@ -0,0 +1,163 @@
+import cProfile
+import collections
+import contextlib
+import dataclasses
+import time
+import typing
+
+__all__ = ("Stat", "StatsCollector")
+
+
+@dataclasses.dataclass
+class Stat(object):
+    """Timings of one phase of one entry (or one context identifier)."""
+
+    phase: str
+    context_identifier: str
+    path: str = ""
+    count: int = 0
+    seconds: float = 0
+    exception_count: int = 0
+    last_exception: typing.Optional[str] = None
+
+    @property
+    def mean_seconds(self) -> float:
+        return self.seconds / self.count if self.count else 0
+
+
+class StatsCollector(object):
+    """Record where :class:`ContextTupleToEventPlacementTuple` spends time.
+
+    :param profile: If ``True``, the complete conversion is also profiled
+        with :mod:`cProfile` (see :attr:`profile`).
+
+    The converter records the phases
+
+        - ``rquery``: find the entries of a context identifier
+        - ``is_supported``: check if an entry supports a context
+        - ``pick``: pick one of all supported entries
+        - ``call``: call the picked entry
+
+    per entry path (``rquery`` and ``pick`` per context identifier).
+
+    **Example:**
+
+    >>> stats = diary_converters.StatsCollector()
+    >>> diary_converters.ContextTupleToEventPlacementTuple(stats=stats).convert(
+    ...     context_tuple
+    ... )
+    >>> print(stats.format_summary(limit=10))
+    """
+
+    PHASE_TUPLE = ("rquery", "is_supported", "pick", "call")
+
+    def __init__(self, profile: bool = False):
+        self.profile: typing.Optional[cProfile.Profile] = (
+            cProfile.Profile() if profile else None
+        )
+        self._key_to_stat: dict[tuple[str, str, str], Stat] = {}
+
+    def __len__(self) -> int:
+        return len(self._key_to_stat)
+
+    def clear(self):
+        self._key_to_stat.clear()
+        if self.profile is not None:
+            self.profile = cProfile.Profile()
+
+    @contextlib.contextmanager
+    def measure(self, phase: str, context_identifier: typing.Any, path: str = ""):
+        """Add duration and exception of the block to the stat of the key."""
+        key = (phase, str(context_identifier), str(path))
+        try:
+            stat = self._key_to_stat[key]
+        except KeyError:
+            stat = self._key_to_stat[key] = Stat(*key)
+        start = time.perf_counter()
+        try:
+            yield
+        except Exception as exception:
+            stat.exception_count += 1
+            stat.last_exception = repr(exception)
+            raise
+        finally:
+            stat.seconds += time.perf_counter() - start
+            stat.count += 1
+
+    @contextlib.contextmanager
+    def profiling(self):
+        """Enable profiler (if any) during the block."""
+        if self.profile is None:
+            yield
+        else:
+            self.profile.enable()
+            try:
+                yield
+            finally:
+                self.profile.disable()
+
+    def stat_tuple(self, phase: typing.Optional[str] = None) -> tuple[Stat, ...]:
+        """Recorded stats sorted from the slowest to the fastest.
+
+        :param phase: If set, only stats of the phase are returned.
+        """
+        return tuple(
+            sorted(
+                (
+                    stat
+                    for stat in self._key_to_stat.values()
+                    if phase is None or stat.phase == phase
+                ),
+                key=lambda stat: stat.seconds,
+                reverse=True,
+            )
+        )
+
+    def summary(self, by: str = "path") -> tuple[tuple[str, float, int, int], ...]:
+        """Sum all phases per entry path or per context identifier.
+
+        :param by: Either ``"path"`` or ``"context_identifier"``.
+        :return: Tuples of key, seconds, count and exception count sorted
+            from the slowest to the fastest key.
+        """
+        key_to_summary = collections.defaultdict(lambda: [0.0, 0, 0])
+        for stat in self._key_to_stat.values():
+            key = getattr(stat, by) or stat.context_identifier
+            summary = key_to_summary[key]
+            summary[0] += stat.seconds
+            summary[1] += stat.count
+            summary[2] += stat.exception_count
+        return tuple(
+            sorted(
+                ((key, *summary) for key, summary in key_to_summary.items()),
+                key=lambda summary: summary[1],
+                reverse=True,
+            )
+        )
+
+    def format_summary(self, limit: typing.Optional[int] = 20) -> str:
+        """Readable table of the slowest phases per entry."""
+        line_list = [
+            f"{'seconds':>10} {'count':>7} {'mean':>10} {'errors':>6}  phase / path"
+        ]
+        for stat in self.stat_tuple()[:limit]:
+            line_list.append(
+                f"{stat.seconds:10.4f} {stat.count:7d} {stat.mean_seconds:10.6f} "
+                f"{stat.exception_count:6d}  "
+                f"{stat.phase} / {stat.path or stat.context_identifier}"
+            )
+        return "\n".join(line_list)
+
+    def write_collapsed_stacks(self, path: str):
+        """Write stats in the collapsed stack format of flame graph tools.
+
+        Each line is ``context_identifier;phase[;entry path] microseconds``,
+        so that the file can be rendered with ``flamegraph.pl`` or
+        ``speedscope``.
+        """
+        with open(path, "w") as file:
+            for stat in self.stat_tuple():
+                frame_list = [stat.context_identifier, stat.phase]
+                if stat.path:
+                    frame_list.append(stat.path)
+                file.write(f"{';'.join(frame_list)} {round(stat.seconds * 1e6)}\n")
@@ -1,3 +1,16 @@
 import logging
 
 LOGGING_LEVEL = logging.INFO
+
+SAMPLER_CACHE_SIZE = 1024
+"""How many weighted samplers of supported entry sets a converter caches."""
+
+STREAM_CHUNK_SIZE = 256
+"""How many contexts :meth:`ContextTupleToEventPlacementTuple.convert_iter`
+converts at once if it uses a process pool."""
+
+DEFAULT_SOCKET_PATH = "diary.sock"
+"""Unix socket on which a :class:`DiaryServer` listens if no other path is given."""
+
+DAEMON_THREAD_COUNT = 4
+"""How many requests a :class:`DiaryServer` handles at the same time."""
@@ -0,0 +1,313 @@
+"""Serve a warm diary to many clients over a local socket.
+
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import concurrent.futures
+import os
+import pickle
+import socket
+import stat
+import struct
+import threading
+import typing
+
+from mutwo import diary_converters
+from mutwo import diary_interfaces
+from mutwo import diary_utilities
+from mutwo import timeline_interfaces
+
+__all__ = ("DiaryServer", "DiaryClient", "serve")
+
+# Each message is a pickled object prefixed by its length.
+_HEADER = struct.Struct("!Q")
+
+
+class DiaryServer(object):
+    """Keep a diary open and answer queries of :class:`DiaryClient`.
+
+    :param session: The session of the served diary.
+    :param socket_path: Path of the Unix socket on which the server
+        listens. Defaults to :const:`configurations.DEFAULT_SOCKET_PATH`.
+    :param thread_count: How many requests are handled at the same time.
+        Defaults to :const:`configurations.DAEMON_THREAD_COUNT`.
+
+    Clients are served concurrently with :mod:`asyncio`. Requests are
+    handled in a pool of threads and each thread keeps its connection
+    (and therefore the cache of loaded entries) between requests. Also
+    compiled entry code and results of :meth:`diary_interfaces.Entry.is_supported`
+    stay cached in the process. At the beginning of each request the
+    connection is synchronised, so that entries which have been committed
+    by other processes (for instance via ZEO) are visible.
+
+    Messages are pickled, so the socket is only accessible by the user
+    who started the server.
+    """
+
+    def __init__(
+        self,
+        session: diary_interfaces.Session,
+        socket_path: typing.Optional[str] = None,
+        thread_count: typing.Optional[int] = None,
+    ):
+        self.session = session
+        self.socket_path = (
+            socket_path or diary_converters.configurations.DEFAULT_SOCKET_PATH
+        )
+        self._thread_count = (
+            thread_count or diary_converters.configurations.DAEMON_THREAD_COUNT
+        )
+        self.ready = threading.Event()
+        self._loop: typing.Optional[asyncio.AbstractEventLoop] = None
+        self._stop: typing.Optional[asyncio.Event] = None
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({self.socket_path})"
+
+    def run(self):
+        """Serve until a client sends ``shutdown`` or :meth:`stop` is called."""
+        asyncio.run(self.serve())
+
+    def stop(self):
+        """Stop running server (can be called from any thread)."""
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._stop.set)
+
+    async def serve(self):
+        # Build missing trees before the first request (if the storage
+        # is read-only, they are only kept in memory by the session).
+        for fetch_tree in (
+            diary_interfaces.fetch_index_tree,
+            diary_interfaces.fetch_catalog_tree,
+            diary_interfaces.fetch_dependency_tree,
+        ):
+            fetch_tree(self.session)
+        _remove_socket(self.socket_path)
+        server_socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            server_socket.bind(self.socket_path)
+            # Other users must not be able to connect, therefore the mode
+            # is changed before the socket starts listening.
+            os.chmod(self.socket_path, 0o600)
+        except BaseException:
+            server_socket.close()
+            raise
+        self._loop = asyncio.get_running_loop()
+        self._stop = asyncio.Event()
+        with concurrent.futures.ThreadPoolExecutor(
+            self._thread_count, thread_name_prefix=type(self).__name__
+        ) as executor:
+            self._executor = executor
+            server = await asyncio.start_unix_server(
+                self._serve_client, sock=server_socket
+            )
+            try:
+                async with server:
+                    self.ready.set()
+                    await self._stop.wait()
+            finally:
+                self.ready.clear()
+                self._loop = None
+                _remove_socket(self.socket_path)
+
+    async def _serve_client(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ):
+        try:
+            while True:
+                try:
+                    header = await reader.readexactly(_HEADER.size)
+                except asyncio.IncompleteReadError:
+                    break
+                request = pickle.loads(
+                    await reader.readexactly(_HEADER.unpack(header)[0])
+                )
+                response = await self._loop.run_in_executor(
+                    self._executor, self._handle, request
+                )
+                writer.write(_dump_message(response))
+                await writer.drain()
+                if request[0] == "shutdown":
+                    self._stop.set()
+                    break
+        finally:
+            writer.close()
+
+    def _handle(self, request: tuple) -> tuple[str, typing.Any]:
+        name, *argument_list = request
+        try:
+            handle = getattr(self, f"_handle_{name}")
+        except AttributeError:
+            return "error", diary_utilities.DaemonError(f"Unknown request '{name}'.")
+        # Start new transaction to see changes of other connections.
+        self.session.abort()
+        try:
+            return "ok", handle(*argument_list)
+        except Exception as e:
+            return "error", e
+        finally:
+            self.session.abort()
+
+    def _handle_ping(self) -> str:
+        return "pong"
+
+    def _handle_shutdown(self) -> None:
+        return None
+
+    def _handle_rquery(self, rquery_kwargs: dict[str, str]) -> tuple[str, ...]:
+        return tuple(
+            str(entry.path)
+            for entry in diary_interfaces.fetch_wrapped_entry_tree(
+                session=self.session
+            ).rquery(**rquery_kwargs)
+        )
+
+    def _handle_convert(
+        self,
+        context_tuple: tuple[diary_interfaces.Context, ...],
+        converter_kwargs: dict[str, typing.Any],
+    ) -> tuple[timeline_interfaces.EventPlacement, ...]:
+        return diary_converters.ContextTupleToEventPlacementTuple(
+            session=self.session, **converter_kwargs
+        ).convert(context_tuple)
+
+
+class DiaryClient(object):
+    """Send queries to a :class:`DiaryServer`.
+
+    :param socket_path: Path of the Unix socket of the server. Defaults
+        to :const:`configurations.DEFAULT_SOCKET_PATH`.
+
+    **Example:**
+
+    >>> with diary_converters.DiaryClient() as client:
+    ...     event_placement_tuple = client.convert(context_tuple, random_seed=3)
+
+    Exceptions which are raised by the server are raised again by the
+    client. Exceptions which can't be pickled are raised as
+    :class:`diary_utilities.DaemonError`.
+    """
+
+    def __init__(self, socket_path: typing.Optional[str] = None):
+        self.socket_path = (
+            socket_path or diary_converters.configurations.DEFAULT_SOCKET_PATH
+        )
+        self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._socket.connect(self.socket_path)
+        self._file = self._socket.makefile("rb")
+
+    def __enter__(self) -> DiaryClient:
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        self._file.close()
+        self._socket.close()
+
+    def _request(self, *request) -> typing.Any:
+        data = pickle.dumps(request)
+        self._socket.sendall(_HEADER.pack(len(data)) + data)
+        header = self._file.read(_HEADER.size)
+        if len(header) < _HEADER.size:
+            raise diary_utilities.DaemonError("Server closed the connection.")
+        state, value = pickle.loads(self._file.read(_HEADER.unpack(header)[0]))
+        if state == "error":
+            raise value
+        return value
+
+    def ping(self) -> str:
+        return self._request("ping")
+
+    def shutdown(self):
+        """Stop the server after all running requests are finished."""
+        self._request("shutdown")
+
+    def rquery(self, **rquery_kwargs) -> tuple[str, ...]:
+        """Paths of entries which match (see :meth:`diary_interfaces.qwrap.rquery`)."""
+        return self._request("rquery", rquery_kwargs)
+
+    def convert(
+        self, context_tuple: tuple[diary_interfaces.Context, ...], **converter_kwargs
+    ) -> tuple[timeline_interfaces.EventPlacement, ...]:
+        """Convert contexts with :class:`ContextTupleToEventPlacementTuple`.
+
+        :param context_tuple: The contexts (need to be picklable).
+        :param converter_kwargs: Arguments of the converter, for instance
+            ``random_seed`` or arguments of :meth:`qwrap.rquery`.
+        """
+        return self._request("convert", tuple(context_tuple), converter_kwargs)
+
+
+def _remove_socket(socket_path: str):
+    try:
+        mode = os.lstat(socket_path).st_mode
+    except FileNotFoundError:
+        return
+    if not stat.S_ISSOCK(mode):
+        raise diary_utilities.DaemonError(
+            f"Can't listen at '{socket_path}', because it isn't a socket."
+        )
+    os.unlink(socket_path)
+
+
+def _dump_message(object_: typing.Any) -> bytes:
+    state, value = object_
+    data = pickle.dumps(object_)
+    if state == "error":
+        # Exceptions need to be recreated by the client.
+        try:
+            pickle.loads(data)
+        except Exception:
+            data = pickle.dumps(("error", diary_utilities.DaemonError(repr(value))))
+    return _HEADER.pack(len(data)) + data
+
+
+def serve(
+    storage_spec: typing.Optional[str] = None,
+    socket_path: typing.Optional[str] = None,
+    read_only: bool = False,
+    thread_count: typing.Optional[int] = None,
+):
+    """Open diary and serve it until a client sends ``shutdown``.
+
+    :param storage_spec: The storage of the diary (see
+        :func:`diary_interfaces.create_storage`). Defaults to
+        :const:`diary_interfaces.configurations.DEFAULT_STORAGE_PATH`.
+    :param socket_path: See :class:`DiaryServer`.
+    :param read_only: Open storage in read-only mode.
+    :param thread_count: See :class:`DiaryServer`.
+
+    A file storage can only be written by one process, so other processes
+    can't register entries while the server keeps the diary open in
+    read-write mode. Use a ZEO storage to write to the diary meanwhile.
+    """
+    storage_spec = (
+        storage_spec or diary_interfaces.configurations.DEFAULT_STORAGE_PATH
+    )
+    session = diary_interfaces.Session(
+        diary_interfaces.create_storage(storage_spec, read_only=read_only),
+        storage_spec=storage_spec,
+    )
+    try:
+        DiaryServer(session, socket_path, thread_count).run()
+    finally:
+        session.close()
+
+
+def main(argument_list: typing.Optional[list[str]] = None):
+    parser = argparse.ArgumentParser(description="Serve a diary over a socket.")
+    parser.add_argument("storage", nargs="?", help="storage specification")
+    parser.add_argument("--socket", help="path of the Unix socket")
+    parser.add_argument("--read-only", action="store_true")
+    parser.add_argument("--threads", type=int, help="count of request threads")
+    arguments = parser.parse_args(argument_list)
+    serve(arguments.storage, arguments.socket, arguments.read_only, arguments.threads)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+import typing
+
+import numpy as np
+
+from mutwo import core_utilities
+
+__all__ = ("WeightedSampler",)
+
+T = typing.TypeVar("T")
+
+
+class WeightedSampler(typing.Generic[T]):
+    """Pick items with probabilities proportional to their weights.
+
+    :param item_tuple: The items to pick from.
+    :param weight_tuple: The weight of each item. If all weights are
+        zero, each item is equally likely.
+
+    Picks are equal to the picks of
+    ``random.choice(item_tuple, p=scale_sequence_to_sum(weight_tuple, 1))``
+    for the same state of ``random``, but the cumulative weights are only
+    calculated once.
+
+    **Example:**
+
+    >>> import numpy as np
+    >>> from mutwo import diary_converters
+    >>> sampler = diary_converters.WeightedSampler(("a", "b"), (1, 3))
+    >>> sampler.pick(np.random.default_rng(10))
+    'b'
+    """
+
+    def __init__(self, item_tuple: tuple[T, ...], weight_tuple: tuple[float, ...]):
+        if not item_tuple:
+            raise ValueError("Can't sample from empty tuple.")
+        probability_array = np.asarray(
+            core_utilities.scale_sequence_to_sum(weight_tuple, 1), dtype=np.float64
+        )
+        # Same checks as in 'numpy.random.Generator.choice'
+        if np.any(probability_array < 0):
+            raise ValueError("probabilities are not non-negative")
+        if abs(probability_array.sum() - 1) > np.sqrt(np.finfo(np.float64).eps):
+            raise ValueError("probabilities do not sum to 1")
+        cumulative_array = probability_array.cumsum()
+        cumulative_array /= cumulative_array[-1]
+        self._item_tuple = tuple(item_tuple)
+        self._cumulative_array = cumulative_array
+
+    def __len__(self) -> int:
+        return len(self._item_tuple)
+
+    @property
+    def item_tuple(self) -> tuple[T, ...]:
+        return self._item_tuple
+
+    def index(self, uniform: typing.Union[float, np.ndarray]):
+        """Find index (or indices) of item(s) for uniform sample(s) in [0, 1)."""
+        return self._cumulative_array.searchsorted(uniform, side="right")
+
+    def pick(self, random: np.random.Generator) -> T:
+        """Pick one item by drawing one sample from ``random``."""
+        return self._item_tuple[int(self.index(random.random()))]
+
+    def pick_many(self, random: np.random.Generator, count: int) -> tuple[T, ...]:
+        """Pick ``count`` items by drawing all samples at once.
+
+        The result is equal to calling :meth:`pick` ``count`` times.
+        """
+        return tuple(self._item_tuple[i] for i in self.index(random.random(count)))
@@ -3,33 +3,133 @@ from . import constants
 
 from .paths import *
 from .contexts import *
-from .entries import *
-from .queries import *
-from .utilities import *
+
+from . import paths as _paths, contexts as _contexts
 
 from contextlib import contextmanager
+import importlib as _importlib
+
+
+# All other modules depend on ZODB, BTrees or NumPy, so they are only
+# imported when one of their objects is used for the first time. The
+# names need to be equal to the '__all__' of the modules (which is
+# tested in 'tests/test_imports.py').
+_MODULE_NAME_TO_NAME_TUPLE = {
+    "entries": ("Entry", "DynamicEntry"),
+    "queries": ("qwrap",),
+    "sessions": ("Session", "fetch_session"),
+    "utilities": (
+        "Cache",
+        "CODE_CACHE",
+        "IS_SUPPORTED_CACHE",
+        "fetch_entry_tree",
+        "fetch_index_tree",
+        "fetch_wrapped_entry_tree",
+        "index_path",
+        "unindex_path",
+        "remove_entry",
+        "fetch_entry_size_tuple",
+        "fetch_namespace",
+        "fetch_function",
+        "fetch_keyword_set",
+        "execute",
+    ),
+    "dependencies": ("fetch_dependency_tree", "DependencyGraph", "prefetch"),
+    "catalogs": (
+        "CATALOG_CACHE",
+        "fetch_catalog_tree",
+        "catalog_entry",
+        "uncatalog_path",
+        "Catalog",
+    ),
+    "digests": (
+        "fetch_digest_tree",
+        "fetch_entry_digest_tree",
+        "fetch_digest",
+        "digest_entry",
+        "undigest_path",
+        "DigestDiff",
+        "diff_sessions",
+        "sync_sessions",
+    ),
+    "exports": ("export_diary", "import_diary"),
+    "bulks": ("BulkReport", "bulk"),
+    "sources": ("SyncReport", "sync_directory"),
+    "renders": ("RenderCache",),
+    "storages": ("create_storage", "start_zeo_server", "pack"),
+    "executors": ("ExecutionPool", "fetch_execution_pool"),
+    "states": ("ActivityLevel", "fetch_state", "restore_state"),
+}
+
+_NAME_TO_MODULE_NAME = {
+    name: module_name
+    for module_name, name_tuple in _MODULE_NAME_TO_NAME_TUPLE.items()
+    for name in name_tuple
+}
+
+
+def __getattr__(name: str):
+    if name in _MODULE_NAME_TO_NAME_TUPLE:
+        return _importlib.import_module(f"{__name__}.{name}")
+    try:
+        module_name = _NAME_TO_MODULE_NAME[name]
+    except KeyError:
+        raise AttributeError(f"module '{__name__}' has no attribute '{name}'")
+    value = getattr(_importlib.import_module(f"{__name__}.{module_name}"), name)
+    # Next time the attribute is found without calling '__getattr__'.
+    globals()[name] = value
+    return value
 
-from ZODB.DB import DB as _DB
-import transaction as _transaction
+
+def __dir__() -> list[str]:
+    return sorted(set(globals()) | set(_NAME_TO_MODULE_NAME))
+
+
+__all__ = (
+    ("configurations", "constants", "open")
+    + _paths.__all__
+    + _contexts.__all__
+    + tuple(_NAME_TO_MODULE_NAME)
+)
+
+del _paths, _contexts
 
 
 @contextmanager
-def open():
-    configurations.STORAGE = configurations.GET_STORAGE()
-    configurations.DATABASE = _DB(configurations.STORAGE)
-    configurations.CONNECTION = configurations.DATABASE.open()
-    configurations.ROOT = configurations.CONNECTION.root()
+def open(storage=None, read_only: bool = False):
+    import transaction
+    from ZODB.interfaces import IStorage
+
+    from .sessions import Session
+
+    if storage is None:
+        storage = configurations.DEFAULT_STORAGE_PATH
+    if IStorage.providedBy(storage):
+        storage_spec = None
+    else:
+        storage_spec, storage = storage, configurations.GET_STORAGE(
+            storage, read_only=read_only
+        )
+    session = configurations.SESSION = Session(
+        storage,
+        # Keep using the thread-local default transaction manager,
+        # so that 'transaction.commit()' still commits the diary.
+        transaction_manager=transaction.manager,
+        storage_spec=storage_spec,
+    )
+    configurations.STORAGE = session.storage
+    configurations.DATABASE = session.database
+    configurations.CONNECTION = session.connection
+    configurations.ROOT = session.root
     try:
         yield configurations.ROOT
     finally:
-        # Just in case
-        _transaction.abort()
-        configurations.CONNECTION.close()
-        configurations.DATABASE.close()
-        configurations.STORAGE.close()
+        session.close()
+        configurations.SESSION = None
         configurations.STORAGE = None
         configurations.DATABASE = None
         configurations.CONNECTION = None
+        configurations.ROOT = None
 
 
 del contextmanager
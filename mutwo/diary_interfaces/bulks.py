@@ -0,0 +1,80 @@
+"""Register many entries at once.
+
+"""
+
+import contextlib
+import dataclasses
+import typing
+
+from mutwo import diary_interfaces
+
+__all__ = ("BulkReport", "bulk")
+
+
+@dataclasses.dataclass
+class BulkReport(object):
+    """Counts how many entries have been registered in bulk mode"""
+
+    added_count: int = 0
+    changed_count: int = 0
+    unchanged_count: int = 0
+    commit_interval: typing.Optional[int] = dataclasses.field(
+        default=None, repr=False, compare=False
+    )
+
+    @property
+    def commit_count(self) -> int:
+        return self.added_count + self.changed_count
+
+    def count(self, state: typing.Literal["added", "changed", "unchanged"]):
+        attribute_name = f"{state}_count"
+        setattr(self, attribute_name, getattr(self, attribute_name) + 1)
+
+
+@contextlib.contextmanager
+def bulk(
+    session: typing.Optional[diary_interfaces.Session] = None,
+    commit_interval: typing.Optional[int] = None,
+) -> typing.Generator[BulkReport, None, None]:
+    """Commit all entries which are initialised inside one transaction.
+
+    :param session: The session of the database. Defaults to the session
+        opened by :func:`open`.
+    :param commit_interval: If set, the transaction is committed each
+        ``commit_interval`` entries instead of creating a savepoint, so
+        that large bulks don't keep all changes in one transaction.
+        Then an exception only aborts the entries which have been added
+        or changed since the last commit. Default to ``None``.
+
+    **Example:**
+
+    >>> with diary_interfaces.open():
+    ...     with diary_interfaces.bulk() as report:
+    ...         for name in ("a", "b", "c"):
+    ...             diary_interfaces.Entry(name, identifier, int, skip_check=False)
+    ...     print(report)
+    BulkReport(added_count=3, changed_count=0, unchanged_count=0)
+
+    Instead of committing a new transaction for each new or changed
+    entry, entries are added to the entry tree and only a savepoint
+    is created each :const:`configurations.BULK_SAVEPOINT_INTERVAL`
+    entries to keep memory low. When leaving the context all entries
+    are committed at once. If an exception is raised inside the context,
+    the transaction is aborted. Nested calls share the outer transaction
+    (and its commit interval).
+    Bulk mode is only active in the thread which entered the context.
+    """
+    session = diary_interfaces.fetch_session(session)
+    if (report := session.bulk_report) is not None:
+        yield report
+        return
+    report = session.bulk_report = BulkReport(commit_interval=commit_interval)
+    try:
+        yield report
+    except Exception:
+        session.abort()
+        raise
+    else:
+        session.commit()
+    finally:
+        session.bulk_report = None
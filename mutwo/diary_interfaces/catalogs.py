@@ -0,0 +1,214 @@
+"""Filter entries by their metadata without loading them.
+
+"""
+
+from __future__ import annotations
+
+import re
+import typing
+
+from BTrees.OOBTree import OOBTree
+import numpy as np
+
+from mutwo import diary_interfaces
+
+__all__ = (
+    "CATALOG_CACHE",
+    "fetch_catalog_tree",
+    "catalog_entry",
+    "uncatalog_path",
+    "Catalog",
+)
+
+CATALOG_CACHE = diary_interfaces.Cache(
+    diary_interfaces.configurations.CATALOG_CACHE_SIZE
+)
+"""Cache of catalogs of committed catalog trees (see :meth:`Catalog.from_tree`)."""
+
+
+def fetch_catalog_tree(
+    session: typing.Optional[diary_interfaces.Session] = None,
+) -> OOBTree:
+    """Fetch tree which maps each entry path to the metadata of the entry.
+
+    The metadata is a tuple of relevance, creation date and modification
+    date. The tree is updated by :meth:`Entry.commit`. If the database
+    doesn't have a catalog yet, it is build from all entries.
+    """
+    session = diary_interfaces.fetch_session(session)
+
+    def build() -> tuple[OOBTree]:
+        catalog_tree = OOBTree()
+        for entry in diary_interfaces.fetch_entry_tree(session).values():
+            catalog_tree[entry.path] = _fetch_metadata(entry)
+        return (catalog_tree,)
+
+    return diary_interfaces.utilities._fetch_tree_tuple(
+        session, ("catalog_tree",), build
+    )[0]
+
+
+def catalog_entry(
+    entry: diary_interfaces.Entry,
+    session: typing.Optional[diary_interfaces.Session] = None,
+):
+    """Add or update metadata of entry in the catalog."""
+    fetch_catalog_tree(session)[entry.path] = _fetch_metadata(entry)
+
+
+def _fetch_metadata(entry: diary_interfaces.Entry) -> tuple:
+    return (
+        float(entry.relevance),
+        # Entries which were committed with 'force_commit' don't
+        # know their creation date.
+        entry._creation_date,
+        entry._modification_date,
+    )
+
+
+def uncatalog_path(
+    path: diary_interfaces.EntryPath,
+    session: typing.Optional[diary_interfaces.Session] = None,
+):
+    """Remove metadata of entry at path from the catalog."""
+    fetch_catalog_tree(session).pop(path, None)
+
+
+class Catalog(object):
+    """Columns of entry metadata which can be filtered in vectorized form.
+
+    :param path_tuple: The paths of the entries.
+    :param relevance_array: The relevance of each entry.
+    :param creation_date_array: The creation date of each entry
+        (``NaT`` if unknown).
+    :param modification_date_array: The modification date of each entry.
+
+    Use :meth:`from_tree` to create the catalog of a catalog tree
+    and :meth:`qwrap.cquery` to load the entries of matching rows.
+
+    **Example:**
+
+    >>> week = np.datetime64(datetime.datetime.utcnow() - datetime.timedelta(7))
+    >>> catalog.filter(
+    ...     (catalog.modification_date >= week) & (catalog.relevance > 5)
+    ... )
+    """
+
+    # Path components which are stored as category codes.
+    _CATEGORY_COMPONENT_TUPLE = (
+        "context_identifier",
+        "entry_identifier",
+        "return_type",
+    )
+
+    def __init__(
+        self,
+        path_tuple: tuple[diary_interfaces.EntryPath, ...],
+        relevance_array: np.ndarray,
+        creation_date_array: np.ndarray,
+        modification_date_array: np.ndarray,
+    ):
+        self.path_tuple = path_tuple
+        self.relevance = np.asarray(relevance_array, dtype=float)
+        self.creation_date = np.asarray(creation_date_array, dtype="datetime64[us]")
+        self.modification_date = np.asarray(
+            modification_date_array, dtype="datetime64[us]"
+        )
+        self._component_to_category_tuple_and_code_array = {}
+
+    def __len__(self) -> int:
+        return len(self.path_tuple)
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({len(self)} entries)"
+
+    @classmethod
+    def from_tree(cls, catalog_tree: typing.Mapping) -> Catalog:
+        """Create catalog from a catalog tree (see :func:`fetch_catalog_tree`).
+
+        Catalogs of committed trees are kept in :const:`CATALOG_CACHE`
+        and shared by all wrappers whose connections see the same state
+        of the database, so that they don't need to build the columns again.
+        """
+        if (key := _fetch_cache_key(catalog_tree)) is None:
+            return cls._from_tree(catalog_tree)
+        return CATALOG_CACHE.fetch((cls,) + key, lambda: cls._from_tree(catalog_tree))
+
+    @classmethod
+    def _from_tree(cls, catalog_tree: typing.Mapping) -> Catalog:
+        path_tuple, metadata_tuple = tuple(catalog_tree.keys()), tuple(
+            catalog_tree.values()
+        )
+        if metadata_tuple:
+            relevance_tuple, creation_date_tuple, modification_date_tuple = zip(
+                *metadata_tuple
+            )
+        else:
+            relevance_tuple = creation_date_tuple = modification_date_tuple = ()
+        return cls(
+            path_tuple, relevance_tuple, creation_date_tuple, modification_date_tuple
+        )
+
+    def category_tuple_and_code_array(
+        self, component: str
+    ) -> tuple[tuple[str, ...], np.ndarray]:
+        """Unique values of path component and the code of each entry.
+
+        :param component: One of 'context_identifier', 'entry_identifier'
+            and 'return_type'.
+        """
+        try:
+            return self._component_to_category_tuple_and_code_array[component]
+        except KeyError:
+            if component not in self._CATEGORY_COMPONENT_TUPLE:
+                raise ValueError(f"Component '{component}' isn't categorical.")
+            category_array, code_array = np.unique(
+                np.array(
+                    [getattr(path, component) for path in self.path_tuple],
+                    dtype=object,
+                ),
+                return_inverse=True,
+            )
+            category_tuple_and_code_array = (
+                self._component_to_category_tuple_and_code_array[component]
+            ) = (tuple(category_array), code_array.reshape(-1))
+            return category_tuple_and_code_array
+
+    def is_matching(self, component: str, pattern: str) -> np.ndarray:
+        """Boolean mask of entries whose path component matches the regex.
+
+        The pattern is only applied once to each unique value.
+        """
+        category_tuple, code_array = self.category_tuple_and_code_array(component)
+        pattern = re.compile(pattern)
+        matching_code_list = [
+            code
+            for code, category in enumerate(category_tuple)
+            if pattern.match(category)
+        ]
+        return np.isin(code_array, matching_code_list)
+
+    def filter(self, mask: np.ndarray) -> tuple[diary_interfaces.EntryPath, ...]:
+        """Paths of entries which are selected by boolean mask"""
+        return tuple(self.path_tuple[index] for index in np.flatnonzero(mask))
+
+
+def _fetch_cache_key(catalog_tree: typing.Mapping) -> typing.Optional[tuple]:
+    try:
+        connection, oid = catalog_tree._p_jar, catalog_tree._p_oid
+    # Mapping isn't persistent.
+    except AttributeError:
+        return None
+    if connection is None or oid is None:
+        return None
+    # Inside bulk mode the tree can contain uncommitted changes.
+    if (
+        session := diary_interfaces.Session.from_connection(connection)
+    ) is not None and session.bulk_report is not None:
+        return None
+    # The serial of the tree itself doesn't change if only one of its
+    # buckets changed, so we use the snapshot of the connection (other
+    # connections may still see an older or already a newer state).
+    if (snapshot := diary_interfaces.utilities._fetch_snapshot(connection)) is None:
+        return None
+    return connection.db(), oid, snapshot
@@ -1,16 +1,76 @@
+from __future__ import annotations
+
 import typing
 
-from ZODB.FileStorage import FileStorage
-from ZODB.interfaces import IStorage, IConnection, IDatabase
+from mutwo import diary_interfaces
+
+if typing.TYPE_CHECKING:
+    from ZODB.interfaces import IStorage, IConnection, IDatabase
+
+SESSION: typing.Optional["diary_interfaces.Session"] = None
+"""Default session which is opened by :func:`diary_interfaces.open`."""
 
+# Storage, database, connection and root of the default session
+# (the connection and the root belong to the thread which opened it).
 STORAGE: typing.Optional[IStorage] = None
 DATABASE: typing.Optional[IDatabase] = None
 CONNECTION: typing.Optional[IConnection] = None
+ROOT = None
+
+POOL_SIZE: int = 7
+"""How many connections a :class:`diary_interfaces.Session` keeps open."""
+
+BULK_SAVEPOINT_INTERVAL: int = 1000
+"""After how many committed entries a savepoint is created in bulk mode."""
+
+IMPORT_COMMIT_INTERVAL: int = 10000
+"""After how many added or changed entries :func:`diary_interfaces.import_diary`
+commits the transaction."""
 
 DEFAULT_STORAGE_PATH: str = "diary.fs"
+"""Storage specification which is opened by :func:`diary_interfaces.open`
+if no other storage is given (see :func:`diary_interfaces.create_storage`)."""
+
+DEFAULT_RENDER_CACHE_PATH: str = "diary-render-cache.fs"
 
 DEFAULT_FUNCTION_NAME: str = "main"
 
+DEFAULT_MANIFEST_NAME: str = ".diary-manifest.json"
+"""File name of the manifest which :func:`diary_interfaces.sync_directory`
+writes into the synchronised directory if no other path is given."""
+
+
+def GET_STORAGE(
+    storage_path: typing.Optional[str] = None, read_only: bool = False
+) -> IStorage:
+    return diary_interfaces.create_storage(
+        storage_path or DEFAULT_STORAGE_PATH, read_only=read_only
+    )
+
+
+EXECUTION_PROCESS_COUNT: int = 4
+"""How many worker processes a :class:`diary_interfaces.ExecutionPool` starts."""
+
+CODE_CACHE_SIZE: int = 256
+"""How many namespaces of executed entry codes are cached.
+
+Set to ``None`` for an unbounded cache.
+"""
+
+IS_SUPPORTED_CACHE_SIZE: int = 100000
+"""How many results of :meth:`diary_interfaces.Entry.is_supported` are cached.
+
+Set to ``None`` for an unbounded cache.
+"""
+
+CATALOG_CACHE_SIZE: int = 16
+"""How many :class:`diary_interfaces.Catalog` objects are cached.
+
+Set to ``None`` for an unbounded cache.
+"""
+
+RENDER_CACHE_MAXSIZE: int = 512 * 1024**2
+"""How many bytes of entry outputs a :class:`diary_interfaces.RenderCache` keeps."""
 
-def GET_STORAGE(storage_path: typing.Optional[str] = None) -> FileStorage:
-    return FileStorage(storage_path or DEFAULT_STORAGE_PATH)
+RENDER_CACHE_COMMIT_INTERVAL: int = 100
+"""After how many new outputs a :class:`diary_interfaces.RenderCache` commits."""
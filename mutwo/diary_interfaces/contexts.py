@@ -1,35 +1,69 @@
 import dataclasses
 import functools
 import hashlib
+import threading
 import typing
 
 import persistent
 
 __all__ = (
+    "fetch_identifier_index",
     "ContextIdentifier",
     "Context",
     "EmptyContext",
 )
 
 
+_IDENTIFIER_TO_INDEX: dict[str, int] = {}
+_IDENTIFIER_LOCK = threading.Lock()
+
+
+def fetch_identifier_index(identifier: str) -> int:
+    """Intern context identifier string as small integer.
+
+    Equal identifiers get the same integer. The integers are only
+    valid in the current process and therefore never stored.
+    """
+    try:
+        return _IDENTIFIER_TO_INDEX[identifier]
+    except KeyError:
+        with _IDENTIFIER_LOCK:
+            return _IDENTIFIER_TO_INDEX.setdefault(
+                identifier, len(_IDENTIFIER_TO_INDEX)
+            )
+
+
 @functools.total_ordering
 class ContextIdentifier(persistent.Persistent):
     def __init__(self, name: str, version: int):
         self._identifier = f"{name}_{version}"
         self._name = name
         self._version = version
+        self._v_index = fetch_identifier_index(self._identifier)
 
     @functools.cached_property
     def hash(self) -> str:
         return hashlib.md5(self._identifier.encode()).hexdigest()
 
+    @property
+    def index(self) -> int:
+        """Interned integer of the identifier (see :func:`fetch_identifier_index`)"""
+        try:
+            return self._v_index
+        # Identifier has been loaded from a database.
+        except AttributeError:
+            self._v_index = fetch_identifier_index(self._identifier)
+            return self._v_index
+
     def __hash__(self) -> int:
-        return hash((self.hash,))
+        return self.index
 
     def __lt__(self, other: typing.Any) -> bool:
         return str(self) < str(other)
 
     def __eq__(self, other: typing.Any) -> bool:
+        if isinstance(other, ContextIdentifier):
+            return self.index == other.index
         try:
             return str(self) == str(other) and self.hash == other.hash
         except AttributeError:
@@ -63,6 +97,9 @@ class Context(object):
         cls.name = name
         cls.version = version
         cls.identifier = ContextIdentifier(cls.name, cls.version)
+        # Compare identifiers of contexts and entries without
+        # loading persistent identifiers.
+        cls.identifier_index = cls.identifier.index
 
 
 class EmptyContext(Context):
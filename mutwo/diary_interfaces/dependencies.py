@@ -0,0 +1,162 @@
+"""Resolve requirements between entries.
+
+"""
+
+from __future__ import annotations
+
+import typing
+
+from BTrees.OOBTree import OOBTree
+
+from mutwo import diary_interfaces
+from mutwo import diary_utilities
+
+__all__ = ("fetch_dependency_tree", "DependencyGraph", "prefetch")
+
+
+def fetch_dependency_tree(
+    session: typing.Optional[diary_interfaces.Session] = None,
+) -> OOBTree:
+    """Fetch tree which maps each entry path to the paths it requires.
+
+    The tree is updated by :meth:`Entry.commit`. If the database doesn't
+    have a dependency tree yet, it is build from all entries.
+    """
+    session = diary_interfaces.fetch_session(session)
+
+    def build() -> tuple[OOBTree]:
+        dependency_tree = OOBTree()
+        for path, entry in diary_interfaces.fetch_entry_tree(session).items():
+            dependency_tree[path] = tuple(entry.abbreviation_to_path_dict.values())
+        return (dependency_tree,)
+
+    return diary_interfaces.utilities._fetch_tree_tuple(
+        session, ("dependency_tree",), build
+    )[0]
+
+
+class DependencyGraph(object):
+    """Graph of requirements between entries.
+
+    :param path_to_dependency_tuple: Maps each entry path to the paths
+        of the entries it requires. Use :meth:`from_diary` to create the
+        graph of all entries in the diary.
+
+    Paths which aren't part of the mapping are treated as entries without
+    requirements.
+    """
+
+    def __init__(self, path_to_dependency_tuple: typing.Mapping[str, tuple[str, ...]]):
+        # Paths are looked up as strings: BTrees compare keys, but
+        # dictionaries would miss 'EntryPath' keys (their hashes differ).
+        if isinstance(path_to_dependency_tuple, dict):
+            path_to_dependency_tuple = {
+                str(path): dependency_tuple
+                for path, dependency_tuple in path_to_dependency_tuple.items()
+            }
+        self._path_to_dependency_tuple = path_to_dependency_tuple
+
+    @classmethod
+    def from_diary(
+        cls, session: typing.Optional[diary_interfaces.Session] = None
+    ) -> DependencyGraph:
+        return cls(fetch_dependency_tree(session))
+
+    def dependency_tuple(self, path: str) -> tuple[str, ...]:
+        """Paths which are directly required by entry at path"""
+        return tuple(map(str, self._path_to_dependency_tuple.get(path, ())))
+
+    def find_cycle(
+        self, path_iterable: typing.Optional[typing.Iterable[str]] = None
+    ) -> typing.Optional[tuple[str, ...]]:
+        """Find circular requirement.
+
+        :param path_iterable: Only search the requirements of these paths.
+            Defaults to all paths of the graph.
+        :return: The paths of the cycle (the first path is repeated at
+            the end) or ``None`` if no cycle exists.
+        """
+        try:
+            self.topological_sort(path_iterable)
+        except diary_utilities.DependencyCycleError as e:
+            return e.path_tuple
+        return None
+
+    def closure(self, path_iterable: typing.Iterable[str]) -> tuple[str, ...]:
+        """All paths which are (directly or indirectly) required by paths.
+
+        The given paths are part of the closure. Paths are topologically
+        sorted: each path is placed after all paths which it requires.
+
+        :raises diary_utilities.DependencyCycleError: If requirements are
+            circular.
+        """
+        return self.topological_sort(path_iterable)
+
+    def topological_sort(
+        self, path_iterable: typing.Optional[typing.Iterable[str]] = None
+    ) -> tuple[str, ...]:
+        """Sort paths so that requirements are placed before entries.
+
+        :param path_iterable: Paths to sort (together with all of their
+            requirements). Defaults to all paths of the graph.
+        :raises diary_utilities.DependencyCycleError: If requirements are
+            circular.
+        """
+        if path_iterable is None:
+            path_iterable = self._path_to_dependency_tuple.keys()
+        sorted_path_list = []
+        done_path_set = set([])
+        # 'EntryPath' objects are equal to plain strings, but their hashes
+        # differ, so all paths in sets are strings.
+        for start_path in map(str, path_iterable):
+            if start_path in done_path_set:
+                continue
+            # Iterative depth-first search, so that deep requirement chains
+            # don't exceed the recursion limit.
+            stack = [(start_path, iter(self.dependency_tuple(start_path)))]
+            active_path_list = [start_path]
+            active_path_set = set([start_path])
+            while stack:
+                path, dependency_iterator = stack[-1]
+                for dependency in dependency_iterator:
+                    if dependency in done_path_set:
+                        continue
+                    if dependency in active_path_set:
+                        cycle_start = active_path_list.index(dependency)
+                        raise diary_utilities.DependencyCycleError(
+                            tuple(active_path_list[cycle_start:]) + (dependency,)
+                        )
+                    stack.append((dependency, iter(self.dependency_tuple(dependency))))
+                    active_path_list.append(dependency)
+                    active_path_set.add(dependency)
+                    break
+                else:
+                    stack.pop()
+                    active_path_list.pop()
+                    active_path_set.remove(path)
+                    done_path_set.add(path)
+                    sorted_path_list.append(path)
+        return tuple(sorted_path_list)
+
+
+def prefetch(
+    path_iterable: typing.Iterable[str],
+    session: typing.Optional[diary_interfaces.Session] = None,
+):
+    """Prefetch entries and all of their requirements from the storage.
+
+    Storages which support prefetching (for instance ZEO) load all
+    records in one round trip into the cache of the connection. For
+    other storages this is a no-op.
+    """
+    session = diary_interfaces.fetch_session(session)
+    entry_tree = diary_interfaces.fetch_entry_tree(session)
+    entry_list = []
+    for path in DependencyGraph.from_diary(session).closure(path_iterable):
+        try:
+            entry_list.append(entry_tree[path])
+        except KeyError:
+            pass
+    if entry_list:
+        session.connection.prefetch(entry_list)
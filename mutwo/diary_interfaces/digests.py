@@ -0,0 +1,273 @@
+"""Compare and synchronise diaries by digests of their entries.
+
+"""
+
+from __future__ import annotations
+
+import dataclasses
+import datetime
+import hashlib
+import json
+import typing
+
+from BTrees.OOBTree import OOBTree
+
+from mutwo import diary_interfaces
+
+__all__ = (
+    "fetch_digest_tree",
+    "fetch_entry_digest_tree",
+    "fetch_digest",
+    "digest_entry",
+    "undigest_path",
+    "DigestDiff",
+    "diff_sessions",
+    "sync_sessions",
+)
+
+
+def fetch_entry_digest_tree(
+    session: typing.Optional[diary_interfaces.Session] = None,
+) -> OOBTree:
+    """Fetch tree which maps each entry path to the digest of the entry.
+
+    The digest of an entry covers its :attr:`Entry.hash` and all other
+    persisted arguments (for instance ``memoize``, ``state_count`` and
+    the dates), so that each change which is committed changes the digest.
+    """
+    return _fetch_digest_tree_tuple(session)[1]
+
+
+def fetch_digest_tree(
+    session: typing.Optional[diary_interfaces.Session] = None,
+) -> OOBTree:
+    """Fetch tree of aggregated digests.
+
+    The tree maps
+
+        - ``""`` to the digest of the complete diary
+        - ``"<context_identifier>"`` to the digest of all entries of a context
+        - ``"<context_identifier>/<return_type>"`` to the digest of all entries
+          of a context with the return type
+
+    Each digest is the XOR of the digests of its entries, so that it is
+    updated in constant time by :meth:`Entry.commit`. If the database
+    doesn't have digests yet, they are build from all entries.
+    """
+    return _fetch_digest_tree_tuple(session)[0]
+
+
+def _fetch_digest_tree_tuple(
+    session: typing.Optional[diary_interfaces.Session] = None,
+) -> tuple[OOBTree, OOBTree]:
+    session = diary_interfaces.fetch_session(session)
+
+    def build() -> tuple[OOBTree, OOBTree]:
+        digest_tree, entry_digest_tree = OOBTree(), OOBTree()
+        for entry in diary_interfaces.fetch_entry_tree(session).values():
+            _update_digest(
+                entry.path, _entry_to_digest(entry), digest_tree, entry_digest_tree
+            )
+        return digest_tree, entry_digest_tree
+
+    return diary_interfaces.utilities._fetch_tree_tuple(
+        session, ("digest_tree", "entry_digest_tree"), build
+    )
+
+
+def _entry_to_digest(entry: diary_interfaces.Entry) -> int:
+    argument_dict = entry._fetch_argument_dict()
+    # Both are already part of the path (and therefore of the hash).
+    del argument_dict["context_identifier"], argument_dict["return_type"]
+    return _record_to_digest(entry.hash, argument_dict)
+
+
+def _record_to_digest(hash_: str, argument_dict: dict[str, typing.Any]) -> int:
+    # Dates are encoded like in exported records (see 'export_diary'),
+    # so that records and their entries have equal digests.
+    return int(
+        hashlib.md5(
+            json.dumps(
+                [hash_, argument_dict],
+                sort_keys=True,
+                separators=(",", ":"),
+                default=datetime.datetime.isoformat,
+            ).encode()
+        ).hexdigest(),
+        16,
+    )
+
+
+def _key_tuple(path: diary_interfaces.EntryPath) -> tuple[str, str, str]:
+    return (
+        "",
+        path.context_identifier,
+        f"{path.context_identifier}/{path.return_type}",
+    )
+
+
+def _update_digest(
+    path: diary_interfaces.EntryPath,
+    digest: int,
+    digest_tree: OOBTree,
+    entry_digest_tree: OOBTree,
+):
+    if delta := entry_digest_tree.get(path, 0) ^ digest:
+        for key in _key_tuple(path):
+            if new_digest := digest_tree.get(key, 0) ^ delta:
+                digest_tree[key] = new_digest
+            else:
+                digest_tree.pop(key, None)
+    if digest:
+        entry_digest_tree[path] = digest
+    else:
+        entry_digest_tree.pop(path, None)
+
+
+def digest_entry(
+    entry: diary_interfaces.Entry,
+    session: typing.Optional[diary_interfaces.Session] = None,
+):
+    """Add or update digest of entry."""
+    _update_digest(
+        entry.path, _entry_to_digest(entry), *_fetch_digest_tree_tuple(session)
+    )
+
+
+def undigest_path(
+    path: diary_interfaces.EntryPath,
+    session: typing.Optional[diary_interfaces.Session] = None,
+):
+    """Remove digest of entry at path."""
+    _update_digest(path, 0, *_fetch_digest_tree_tuple(session))
+
+
+def fetch_digest(
+    key: str = "", session: typing.Optional[diary_interfaces.Session] = None
+) -> int:
+    """Digest of the diary, of a context or of a context and return type.
+
+    :param key: See :func:`fetch_digest_tree`. Defaults to the digest
+        of the complete diary.
+    """
+    return fetch_digest_tree(session).get(key, 0)
+
+
+@dataclasses.dataclass(frozen=True)
+class DigestDiff(object):
+    """Paths of entries which differ between two diaries.
+
+    Paths are described from the point of view of the target diary:
+    ``added_path_tuple`` contains entries which only exist in the source.
+    """
+
+    added_path_tuple: tuple[diary_interfaces.EntryPath, ...] = ()
+    changed_path_tuple: tuple[diary_interfaces.EntryPath, ...] = ()
+    removed_path_tuple: tuple[diary_interfaces.EntryPath, ...] = ()
+
+    def __bool__(self) -> bool:
+        return bool(
+            self.added_path_tuple or self.changed_path_tuple or self.removed_path_tuple
+        )
+
+
+def diff_sessions(
+    source: diary_interfaces.Session, target: diary_interfaces.Session
+) -> DigestDiff:
+    """Find entries which differ between two diaries.
+
+    Only contexts and return types with different digests are visited,
+    entries of equal subtrees are never compared (or loaded). The digests
+    of all contexts are compared as soon as the diaries differ, because
+    the contexts are found by iterating all keys of both digest trees.
+    Diffs therefore take time linear in the number of contexts and
+    return types, plus the entries of differing leaves.
+    """
+    source_digest_tree, source_entry_digest_tree = _fetch_digest_tree_tuple(source)
+    target_digest_tree, target_entry_digest_tree = _fetch_digest_tree_tuple(target)
+    added_path_list, changed_path_list, removed_path_list = [], [], []
+
+    def differ(key: str) -> bool:
+        return source_digest_tree.get(key, 0) != target_digest_tree.get(key, 0)
+
+    def child_key_set(key: str) -> set[str]:
+        # Children of the root are contexts, children of a context
+        # are '<context_identifier>/<return_type>'.
+        if key:
+            key_range = dict(min=f"{key}/", max=f"{key}/\uffff")
+        else:
+            key_range = {}
+        return {
+            child_key
+            for digest_tree in (source_digest_tree, target_digest_tree)
+            for child_key in digest_tree.keys(**key_range)
+            if child_key and (bool(key) or "/" not in child_key)
+        }
+
+    if not differ(""):
+        return DigestDiff()
+    for context_key in sorted(filter(differ, child_key_set(""))):
+        for leaf_key in sorted(filter(differ, child_key_set(context_key))):
+            context_identifier, _, return_type = leaf_key.rpartition("/")
+            source_path_set, target_path_set = (
+                set(
+                    _iter_leaf_path(
+                        diary_interfaces.fetch_index_tree(session),
+                        context_identifier,
+                        return_type,
+                    )
+                )
+                for session in (source, target)
+            )
+            added_path_list.extend(source_path_set - target_path_set)
+            removed_path_list.extend(target_path_set - source_path_set)
+            changed_path_list.extend(
+                path
+                for path in source_path_set & target_path_set
+                if source_entry_digest_tree[path] != target_entry_digest_tree[path]
+            )
+    return DigestDiff(
+        tuple(sorted(added_path_list)),
+        tuple(sorted(changed_path_list)),
+        tuple(sorted(removed_path_list)),
+    )
+
+
+def _iter_leaf_path(
+    index_tree, context_identifier: str, return_type: str
+) -> typing.Iterator[diary_interfaces.EntryPath]:
+    try:
+        entry_identifier_tree = index_tree[context_identifier][return_type]
+    except KeyError:
+        return
+    for path_set in entry_identifier_tree.values():
+        yield from path_set
+
+
+def sync_sessions(
+    source: diary_interfaces.Session,
+    target: diary_interfaces.Session,
+    remove: bool = False,
+) -> DigestDiff:
+    """Copy added and changed entries from source to target diary.
+
+    :param remove: If ``True``, entries which only exist in the target
+        diary are removed from it.
+    :return: The differences which have been synchronised.
+    """
+    digest_diff = diff_sessions(source, target)
+    source_entry_tree = diary_interfaces.fetch_entry_tree(source)
+    changed_path_set = set(digest_diff.changed_path_tuple)
+    with diary_interfaces.bulk(target):
+        for path in digest_diff.added_path_tuple + digest_diff.changed_path_tuple:
+            entry = source_entry_tree[path]
+            copied_entry = type(entry).__new__(type(entry))
+            copied_entry.__setstate__(entry.__getstate__())
+            copied_entry._v_session = target
+            copied_entry._report("changed" if path in changed_path_set else "added")
+            # Also copies the context identifier into the target database.
+            copied_entry.commit()
+        if remove:
+            for path in digest_diff.removed_path_tuple:
+                diary_interfaces.remove_entry(path, target)
+    return digest_diff
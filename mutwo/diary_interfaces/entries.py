@@ -5,18 +5,23 @@
 from __future__ import annotations
 
 import abc
+import collections
 import datetime
 import functools
 import hashlib
 import typing
 
-import numpy as np
 import persistent
-import transaction
 
-from mutwo import common_generators
 from mutwo import diary_interfaces
 
+# NumPy and 'common_generators' take long to import, so they are
+# only imported when a dynamic entry creates its states.
+if typing.TYPE_CHECKING:
+    import numpy as np
+
+    from mutwo import common_generators
+
 
 __all__ = ("Entry", "DynamicEntry")
 
@@ -24,6 +29,11 @@ T = typing.TypeVar("T")
 
 
 class Entry(persistent.Persistent):
+    # Fallback for entries which were stored before 'memoize' was added.
+    _memoize = True
+    # Values which older versions stored, but which are created on demand now.
+    _legacy_state_name_tuple: tuple[str, ...] = ()
+
     def __init__(
         self,
         # Stable path
@@ -37,6 +47,10 @@ class Entry(persistent.Persistent):
         # Tweak behaviour of auto-commit.
         force_commit: bool = False,
         skip_check: bool = True,  # Set to True for faster load from database.
+        # Database to commit to (defaults to the session of 'open').
+        session: typing.Optional[diary_interfaces.Session] = None,
+        # Set to False if 'is_supported' isn't deterministic.
+        memoize: bool = True,
         # Auto created by Entry.
         _creation_date: typing.Optional[datetime.datetime] = None,
         _modification_date: typing.Optional[datetime.datetime] = None,
@@ -47,8 +61,12 @@ class Entry(persistent.Persistent):
         self._comment = comment
         self._relevance = relevance
         self._abbreviation_to_path_dict = abbreviation_to_path_dict
+        self._memoize = memoize
         self._creation_date = _creation_date
         self._modification_date = _modification_date
+        # Volatile attributes aren't stored in the database.
+        self._v_session = session
+        old_self = None
         if (not skip_check) and (not force_commit):
             try:
                 old_self = self._fetch_self_from_db()
@@ -58,18 +76,50 @@ class Entry(persistent.Persistent):
             else:
                 self._creation_date = old_self.creation_date
                 self._modification_date = old_self.modification_date
-        if force_commit or self.hash != old_self.hash:
+        # Dates are equal here, so digests differ if any other
+        # persisted argument (not only the instable path) changed.
+        if force_commit or (
+            old_self is not None
+            and diary_interfaces.digests._entry_to_digest(self)
+            != diary_interfaces.digests._entry_to_digest(old_self)
+        ):
+            self._report("changed" if self.path in self._entry_tree else "added")
             self._modification_date = datetime.datetime.utcnow()
             self.commit()
+        elif old_self is not None:
+            self._report("unchanged")
 
         # Sanity check
         assert (
-            self.path not in self.abbreviation_to_path_dict.items()
+            self.path not in self.abbreviation_to_path_dict.values()
         ), "Can't call itself"
 
     def __str__(self) -> str:
         return repr(self)
 
+    def __getstate__(self) -> dict[str, typing.Any]:
+        # Derived values are rebuilt after loading: they would only
+        # enlarge the stored state (and could even reference other
+        # entries or random generators).
+        cached_property_name_set = _fetch_cached_property_name_set(type(self))
+        return {
+            name: value
+            for name, value in super().__getstate__().items()
+            if name not in cached_property_name_set
+        }
+
+    def __setstate__(self, state: dict[str, typing.Any]):
+        # Entries which were stored before their derived values
+        # were excluded could still contain them.
+        cached_property_name_set = _fetch_cached_property_name_set(type(self))
+        super().__setstate__(
+            {
+                name: value
+                for name, value in state.items()
+                if name not in cached_property_name_set
+            }
+        )
+
     def __repr__(self) -> str:
         return f"{self.identifier}({self.path})"
 
@@ -81,6 +131,15 @@ class Entry(persistent.Persistent):
     def context_identifier(self) -> diary_interfaces.ContextIdentifier:
         return self._context_identifier
 
+    @property
+    def context_identifier_index(self) -> int:
+        """Interned integer of the context identifier of the entry"""
+        try:
+            return self._v_context_identifier_index
+        except AttributeError:
+            self._v_context_identifier_index = self._context_identifier.index
+            return self._v_context_identifier_index
+
     @classmethod
     @property
     def identifier(cls) -> str:
@@ -94,6 +153,16 @@ class Entry(persistent.Persistent):
     def abbreviation_to_path_dict(self) -> AbbreviationToPathDict:
         return self._abbreviation_to_path_dict
 
+    @property
+    def memoize(self) -> bool:
+        """If ``True``, results of :meth:`is_supported` are cached.
+
+        Results are stored in :const:`diary_interfaces.IS_SUPPORTED_CACHE`
+        and they are keyed by the hash of the entry, the hashes of its
+        requirements and the context.
+        """
+        return self._memoize
+
     @property
     def relevance(self) -> int:
         return self._relevance
@@ -148,19 +217,65 @@ class Entry(persistent.Persistent):
 
     @functools.cached_property
     def abbreviation_to_entry_dict(self) -> AbbreviationToEntryDict:
-        root = diary_interfaces.fetch_entry_tree()
+        root = self._entry_tree
         return {
             abbreviation: root[path]
             for abbreviation, path in self.abbreviation_to_path_dict.items()
         }
 
+    @property
+    def session(self) -> diary_interfaces.Session:
+        """Session of the database to which the entry belongs"""
+        if (session := getattr(self, "_v_session", None)) is None:
+            # Entry has been loaded from a database.
+            if self._p_jar is not None:
+                session = diary_interfaces.Session.from_connection(self._p_jar)
+            session = self._v_session = diary_interfaces.fetch_session(session)
+        return session
+
+    @property
+    def _entry_tree(self):
+        return diary_interfaces.fetch_entry_tree(self.session)
+
     def _fetch_self_from_db(self):
-        return diary_interfaces.fetch_entry_tree()[self.path]
+        return self._entry_tree[self.path]
+
+    def _report(self, state: str):
+        if (bulk_report := self.session.bulk_report) is not None:
+            bulk_report.count(state)
 
     def commit(self):
-        entry_tree = diary_interfaces.fetch_entry_tree()
+        session = self.session
+        entry_tree = diary_interfaces.fetch_entry_tree(session)
+        # Context identifiers are shared class attributes: if the
+        # identifier is already stored in a different database (or a
+        # previously opened connection to it), we need a new copy.
+        if self._context_identifier._p_jar not in (None, entry_tree._p_jar):
+            self._context_identifier = diary_interfaces.ContextIdentifier(
+                self._context_identifier.name, self._context_identifier._version
+            )
+        dependency_tree = diary_interfaces.fetch_dependency_tree(session)
+        dependency_tuple = tuple(self.abbreviation_to_path_dict.values())
+        # Raises exception for circular requirements
+        diary_interfaces.DependencyGraph(
+            collections.ChainMap({str(self.path): dependency_tuple}, dependency_tree)
+        ).topological_sort((self.path,))
         entry_tree[self.path] = self
-        transaction.commit()
+        dependency_tree[self.path] = dependency_tuple
+        diary_interfaces.index_path(self.path, session)
+        diary_interfaces.catalog_entry(self, session)
+        diary_interfaces.digest_entry(self, session)
+        if (bulk_report := session.bulk_report) is None or (
+            bulk_report.commit_interval
+            and bulk_report.commit_count % bulk_report.commit_interval == 0
+        ):
+            session.commit()
+        elif (
+            bulk_report.commit_count
+            % diary_interfaces.configurations.BULK_SAVEPOINT_INTERVAL
+            == 0
+        ):
+            session.transaction_manager.savepoint(optimistic=True)
 
     def _is_supported(
         self,
@@ -170,19 +285,78 @@ class Entry(persistent.Persistent):
         return True
 
     def is_supported(self, context: diary_interfaces.Context, **kwargs):
-        return self._is_supported(
-            context, **dict(self.abbreviation_to_entry_dict, **kwargs)
+        def is_supported() -> bool:
+            return self._is_supported(
+                context, **dict(self.abbreviation_to_entry_dict, **kwargs)
+            )
+
+        # Extra keyword arguments could change the result.
+        if kwargs or not self.memoize:
+            return is_supported()
+        key = (
+            self.hash,
+            tuple(entry.hash for entry in self.abbreviation_to_entry_dict.values()),
+            context,
         )
+        try:
+            hash(key)
+        # Context isn't hashable
+        except TypeError:
+            return is_supported()
+        return diary_interfaces.IS_SUPPORTED_CACHE.fetch(key, is_supported)
 
     def __call__(self, context: diary_interfaces.Context, **kwargs):
-        id_self, id_passed = self._context_identifier, context.identifier
-        assert id_self == id_passed, f"Expected {id_self}, got {id_passed}"
+        assert (
+            self.context_identifier_index == context.identifier_index
+        ), f"Expected {self._context_identifier}, got {context.identifier}"
         assert self.is_supported(context, **kwargs), "Not supported!"
         keyword_argument_dict = dict(self.abbreviation_to_entry_dict)
         keyword_argument_dict.update(kwargs)
         object_ = self._context_to_data(context, **keyword_argument_dict)
         return object_
 
+    def _fetch_argument_dict(self) -> dict[str, typing.Any]:
+        """Get keyword arguments which recreate the entry.
+
+        Used by :func:`export_diary`: all values except the context
+        identifier, the return type and the dates need to be JSON
+        serialisable.
+        """
+        return dict(
+            name=self.name,
+            context_identifier=self.context_identifier,
+            return_type=self.return_type,
+            comment=self.comment,
+            relevance=self.relevance,
+            abbreviation_to_path_dict=dict(self.abbreviation_to_path_dict),
+            memoize=self.memoize,
+            _creation_date=self._creation_date,
+            _modification_date=self._modification_date,
+        )
+
+    def _fetch_state(self) -> typing.Any:
+        """Get picklable mutable state which influences calls.
+
+        Used by :class:`RenderCache` to key outputs and to restore the
+        state after a cache hit.
+        """
+        return None
+
+    def _restore_state(self, state: typing.Any):
+        ...
+
+    def _fetch_call_state(self) -> dict[str, typing.Any]:
+        """Get picklable states which calls use by their keyword arguments.
+
+        Used by :class:`diary_converters.ContextTupleToEventPlacementTuple`
+        to only send the states to its workers which calls change. Empty
+        if calls don't use any state.
+        """
+        return {}
+
+    def _restore_call_state(self, keyword_to_state: dict[str, typing.Any]):
+        ...
+
     @abc.abstractmethod
     def _context_to_data(
         self, context: diary_interfaces.Context, **kwargs
@@ -193,6 +367,16 @@ class Entry(persistent.Persistent):
         return hash((self.hash,))
 
 
+@functools.cache
+def _fetch_cached_property_name_set(cls: typing.Type[Entry]) -> frozenset[str]:
+    return frozenset(
+        name
+        for base in cls.__mro__
+        for name, value in vars(base).items()
+        if isinstance(value, functools.cached_property)
+    ) | frozenset(cls._legacy_state_name_tuple)
+
+
 EntryAbbreviation: typing.TypeAlias = str
 """User defined abbreviation for a specific entry.
 
@@ -207,6 +391,9 @@ AbbreviationToPathDict: typing.TypeAlias = dict[
 
 
 class DynamicEntry(Entry):
+    # Generators were cached properties before they were created lazily.
+    _legacy_state_name_tuple = ("random_tuple", "activity_level_tuple")
+
     def __init__(
         self,
         *args,
@@ -243,17 +430,66 @@ class DynamicEntry(Entry):
     def random_seed(self):
         return self._random_seed
 
+    @property
+    def state_count(self) -> int:
+        return self._state_count
+
     @functools.cached_property
-    def random_tuple(self) -> tuple[np.random.default_rng, ...]:
-        return tuple(
-            np.random.default_rng(self._random_seed) for _ in range(self._state_count)
+    def _seed_sequence_tuple(
+        self,
+    ) -> tuple[typing.Optional[np.random.SeedSequence], ...]:
+        import numpy as np
+
+        # The first generator keeps the seed of the entry, so that
+        # 'random' returns the same values as before generators were
+        # spawned. All others get independent streams.
+        return (None,) + tuple(
+            np.random.SeedSequence(self._random_seed).spawn(
+                max(self._state_count - 1, 0)
+            )
         )
 
     @functools.cached_property
-    def activity_level_tuple(self) -> common_generators.ActivityLevel:
-        return tuple(
-            common_generators.ActivityLevel() for _ in range(self._state_count)
-        )
+    def _index_to_random(self) -> dict[int, np.random.Generator]:
+        return {}
+
+    @functools.cached_property
+    def _index_to_activity_level(self) -> dict[int, common_generators.ActivityLevel]:
+        return {}
+
+    def fetch_random(self, index: int = 0) -> np.random.Generator:
+        """Get random generator of state ``index``, create it on first use."""
+        try:
+            return self._index_to_random[index]
+        except KeyError:
+            if not 0 <= index < self._state_count:
+                raise IndexError(f"Entry has only {self._state_count} states.")
+            import numpy as np
+
+            random = self._index_to_random[index] = np.random.default_rng(
+                self._seed_sequence_tuple[index] if index else self._random_seed
+            )
+            return random
+
+    def fetch_activity_level(self, index: int = 0) -> common_generators.ActivityLevel:
+        """Get activity level of state ``index``, create it on first use."""
+        try:
+            return self._index_to_activity_level[index]
+        except KeyError:
+            if not 0 <= index < self._state_count:
+                raise IndexError(f"Entry has only {self._state_count} states.")
+            activity_level = self._index_to_activity_level[
+                index
+            ] = diary_interfaces.ActivityLevel()
+            return activity_level
+
+    @property
+    def random_tuple(self) -> tuple[np.random.Generator, ...]:
+        return tuple(map(self.fetch_random, range(self._state_count)))
+
+    @property
+    def activity_level_tuple(self) -> tuple[common_generators.ActivityLevel, ...]:
+        return tuple(map(self.fetch_activity_level, range(self._state_count)))
 
     @functools.cached_property
     def instable_path_arg_tuple(self) -> tuple[str, ...]:
@@ -267,6 +503,74 @@ class DynamicEntry(Entry):
     def instable_path(self) -> diary_interfaces.InstableDynamicEntryPath:
         return diary_interfaces.InstableDynamicEntryPath(*self.instable_path_arg_tuple)
 
+    def _fetch_argument_dict(self) -> dict[str, typing.Any]:
+        return dict(
+            super()._fetch_argument_dict(),
+            code=self.code,
+            function_name=self.function_name,
+            random_seed=self.random_seed,
+            state_count=self.state_count,
+        )
+
+    def _fetch_state(self) -> typing.Any:
+        # Creates all states: otherwise equal states could differ
+        # depending on which generators have already been used.
+        return tuple(
+            tuple(map(diary_interfaces.fetch_state, object_tuple))
+            for object_tuple in (self.random_tuple, self.activity_level_tuple)
+        )
+
+    def _restore_state(self, state: typing.Any):
+        for object_tuple, state_tuple in zip(
+            (self.random_tuple, self.activity_level_tuple), state
+        ):
+            for object_, object_state in zip(object_tuple, state_tuple):
+                diary_interfaces.restore_state(object_, object_state)
+
+    def _fetch_call_state(self) -> dict[str, typing.Any]:
+        return {
+            keyword: diary_interfaces.fetch_state(fetch(self, index))
+            for keyword, fetch, index in self._used_state_keyword_tuple
+        }
+
+    def _restore_call_state(self, keyword_to_state: dict[str, typing.Any]):
+        for keyword, fetch, index in self._used_state_keyword_tuple:
+            if (state := keyword_to_state.get(keyword)) is not None:
+                diary_interfaces.restore_state(fetch(self, index), state)
+
+    @functools.cached_property
+    def _state_keyword_tuple(
+        self,
+    ) -> tuple[tuple[str, typing.Callable[[DynamicEntry, int], typing.Any], int], ...]:
+        keyword_list = []
+        for prefix, fetch in (
+            ("random", DynamicEntry.fetch_random),
+            ("activity_level", DynamicEntry.fetch_activity_level),
+        ):
+            keyword_list.append((prefix, fetch, 0))
+            keyword_list.extend(
+                (f"{prefix}{index}", fetch, index) for index in range(self._state_count)
+            )
+        return tuple(keyword_list)
+
+    @functools.cached_property
+    def _used_state_keyword_tuple(
+        self,
+    ) -> tuple[tuple[str, typing.Callable[[DynamicEntry, int], typing.Any], int], ...]:
+        # States are only created and passed if the function asks
+        # for them (or accepts any keyword argument).
+        try:
+            keyword_set = diary_interfaces.fetch_keyword_set(
+                self.name, self._code, self._function_name
+            )
+        except NameError:
+            keyword_set = None
+        return tuple(
+            state_keyword
+            for state_keyword in self._state_keyword_tuple
+            if keyword_set is None or state_keyword[0] in keyword_set
+        )
+
     def _is_supported(
         self,
         context: diary_interfaces.Context,
@@ -288,15 +592,9 @@ class DynamicEntry(Entry):
         # of the entry which calls the other entry. This is
         # impossible if we hard code them (because then 'random'
         # would be provided twice).
-        random_tuple = self.random_tuple
-        kwargs.setdefault("random", self.random_tuple[0])
-        for i, r in enumerate(random_tuple):
-            kwargs.setdefault(f"random{i}", r)
-
-        activity_level_tuple = self.activity_level_tuple
-        kwargs.setdefault("activity_level", self.activity_level_tuple[0])
-        for i, a in enumerate(activity_level_tuple):
-            kwargs.setdefault(f"activity_level{i}", a)
+        for keyword, fetch, index in self._used_state_keyword_tuple:
+            if keyword not in kwargs:
+                kwargs[keyword] = fetch(self, index)
 
         try:
             return diary_interfaces.execute(
@@ -0,0 +1,298 @@
+"""Execute entry code in worker processes with time and memory limits.
+
+"""
+
+from __future__ import annotations
+
+import contextlib
+import contextvars
+import hashlib
+import multiprocessing
+import queue
+import threading
+import typing
+
+from mutwo import diary_interfaces
+from mutwo import diary_utilities
+
+__all__ = ("ExecutionPool", "fetch_execution_pool")
+
+_EXECUTION_POOL: contextvars.ContextVar[
+    typing.Optional[ExecutionPool]
+] = contextvars.ContextVar("execution_pool", default=None)
+
+
+def fetch_execution_pool() -> typing.Optional[ExecutionPool]:
+    """Pool which has been activated with :meth:`ExecutionPool.activate`"""
+    return _EXECUTION_POOL.get()
+
+
+class ExecutionPool(object):
+    """Pool of warm worker processes which execute entry code.
+
+    :param process_count: How many entry functions can be executed at
+        the same time. Defaults to :const:`configurations.EXECUTION_PROCESS_COUNT`.
+    :param timeout: How many seconds one call can take. If ``None``,
+        calls aren't limited.
+    :param memory_limit: How many bytes of (virtual) memory each worker
+        process can allocate. If ``None``, the memory isn't limited.
+        Requires the module :mod:`resource` (Unix only).
+    :param storage_spec: If set, each worker opens this storage in
+        read-only mode (see :func:`open`), so that entries which are
+        passed to entry functions can fetch their requirements.
+
+    **Example:**
+
+    >>> with diary_interfaces.ExecutionPool(timeout=5) as pool, pool.activate():
+    ...     entry(context)
+
+    While the pool is activated, :func:`execute` runs entry functions
+    (and therefore calls and :meth:`Entry.is_supported` of dynamic entries)
+    in the worker processes. Entry code is never executed in the main
+    process: even signatures of entry functions are inspected by the
+    workers (see :func:`fetch_keyword_set`). Each worker keeps its own
+    :const:`CODE_CACHE`, so code is only compiled once per worker.
+    Arguments, results and exceptions need to be picklable. States of
+    random generators and activity levels which are passed to a function
+    are copied back after the call, so that results are equal to
+    in-process execution.
+    If a call exceeds the time limit or a worker dies (for instance
+    because it exceeded the memory limit), the worker is replaced by a
+    new one and :class:`diary_utilities.ExecutionError` is raised.
+
+    Workers are spawned (not forked), so they neither share open
+    storages nor threads with the main process.
+    """
+
+    def __init__(
+        self,
+        process_count: typing.Optional[int] = None,
+        timeout: typing.Optional[float] = None,
+        memory_limit: typing.Optional[int] = None,
+        storage_spec: typing.Optional[str] = None,
+    ):
+        if memory_limit is not None:
+            try:
+                import resource  # noqa: F401
+            except ImportError:
+                raise ValueError("Memory limits are only supported on Unix.")
+        self.timeout = timeout
+        self._memory_limit = memory_limit
+        self._storage_spec = storage_spec
+        self._worker_queue = queue.Queue()
+        self._worker_list = []
+        self._keyword_set_cache = diary_interfaces.Cache(
+            diary_interfaces.configurations.CODE_CACHE_SIZE
+        )
+        # Workers are replaced by the threads which use them.
+        self._lock = threading.Lock()
+        for _ in range(
+            process_count
+            or diary_interfaces.configurations.EXECUTION_PROCESS_COUNT
+        ):
+            self._worker_queue.put(self._start_worker())
+
+    def __repr__(self) -> str:
+        return (
+            f"{type(self).__name__}(process_count={len(self._worker_list)}, "
+            f"timeout={self.timeout})"
+        )
+
+    def __enter__(self) -> ExecutionPool:
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    @contextlib.contextmanager
+    def activate(self) -> typing.Generator[ExecutionPool, None, None]:
+        """Run all entry functions in this pool while the context is active."""
+        token = _EXECUTION_POOL.set(self)
+        try:
+            yield self
+        finally:
+            _EXECUTION_POOL.reset(token)
+
+    def _start_worker(self) -> tuple[multiprocessing.Process, typing.Any]:
+        context = multiprocessing.get_context("spawn")
+        connection, worker_connection = context.Pipe()
+        process = context.Process(
+            target=_work,
+            args=(worker_connection, self._memory_limit, self._storage_spec),
+            daemon=True,
+        )
+        process.start()
+        worker_connection.close()
+        # Time limits shouldn't include the start of the worker.
+        try:
+            connection.recv()
+        except EOFError:
+            process.join()
+            raise diary_utilities.ExecutionError(
+                f"Worker couldn't be started (exit code {process.exitcode})."
+            )
+        worker = (process, connection)
+        with self._lock:
+            self._worker_list.append(worker)
+        return worker
+
+    def _stop_worker(self, worker: tuple[multiprocessing.Process, typing.Any]):
+        process, connection = worker
+        connection.close()
+        process.kill()
+        process.join()
+        with self._lock:
+            self._worker_list.remove(worker)
+
+    def _replace_worker(
+        self, worker: tuple[multiprocessing.Process, typing.Any]
+    ) -> tuple[multiprocessing.Process, typing.Any]:
+        self._stop_worker(worker)
+        return self._start_worker()
+
+    def execute(self, name: str, code: str, function_name: str, *args, **kwargs):
+        """Execute entry function in a worker (see :func:`execute`).
+
+        :raises diary_utilities.ExecutionError: If the function raised an
+            exception, exceeded a limit or if its arguments or its result
+            can't be pickled.
+        """
+        value, key_to_state = self._request(
+            name, ("execute", name, code, function_name, args, kwargs)
+        )
+        _restore_state(kwargs, key_to_state)
+        return value
+
+    def fetch_keyword_set(
+        self, name: str, code: str, function_name: str
+    ) -> typing.Optional[frozenset[str]]:
+        """Inspect entry function in a worker (see :func:`fetch_keyword_set`).
+
+        Results are cached by the pool, so that the signature of each
+        code version is only requested once.
+
+        :raises diary_utilities.ExecutionError: If the code raised an
+            exception or exceeded a limit.
+        """
+
+        def fetch_keyword_set() -> typing.Optional[frozenset[str]]:
+            return self._request(
+                name, ("signature", name, code, function_name, (), {})
+            )[0]
+
+        return self._keyword_set_cache.fetch(
+            (hashlib.md5(code.encode()).hexdigest(), function_name),
+            fetch_keyword_set,
+        )
+
+    def _request(self, name: str, task: tuple) -> tuple[typing.Any, typing.Any]:
+        worker = self._worker_queue.get()
+        _, connection = worker
+        try:
+            try:
+                connection.send(task)
+            except Exception as e:
+                raise diary_utilities.ExecutionError(
+                    f"Can't send arguments of {name} to worker:\n{e}"
+                )
+            if not connection.poll(self.timeout):
+                worker = self._replace_worker(worker)
+                raise diary_utilities.ExecutionError(
+                    f"Execution of {name} exceeded {self.timeout} seconds."
+                )
+            try:
+                state, value, key_to_state = connection.recv()
+            except EOFError:
+                exitcode = worker[0].exitcode
+                worker = self._replace_worker(worker)
+                raise diary_utilities.ExecutionError(
+                    f"Worker died when executing {name} (exit code {exitcode})."
+                )
+            except Exception as e:
+                raise diary_utilities.ExecutionError(
+                    f"Can't receive result of {name} from worker:\n{e}"
+                )
+        finally:
+            self._worker_queue.put(worker)
+        if state == "error":
+            raise value
+        return value, key_to_state
+
+    def close(self):
+        """Stop all worker processes."""
+        with self._lock:
+            worker_tuple = tuple(self._worker_list)
+        for worker in worker_tuple:
+            process, connection = worker
+            try:
+                connection.send(None)
+            except OSError:
+                pass
+            else:
+                process.join(1)
+            self._stop_worker(worker)
+
+
+def _fetch_state(kwargs: dict[str, typing.Any]) -> dict[str, typing.Any]:
+    key_to_state = {}
+    for key, value in kwargs.items():
+        try:
+            key_to_state[key] = diary_interfaces.fetch_state(value)
+        except TypeError:
+            pass
+    return key_to_state
+
+
+def _restore_state(kwargs: dict[str, typing.Any], key_to_state: dict[str, typing.Any]):
+    for key, state in key_to_state.items():
+        diary_interfaces.restore_state(kwargs[key], state)
+
+
+def _work(connection, memory_limit: typing.Optional[int], storage_spec):
+    # Without storage specification entries of the worker must not
+    # use any storage (they would otherwise fail with NoSessionError).
+    diary_interfaces.configurations.SESSION = None
+    # States are fetched after each call: import them before
+    # the worker is ready, so that calls aren't slowed down.
+    from mutwo.diary_interfaces import states  # noqa: F401
+
+    if memory_limit is not None:
+        import resource
+
+        resource.setrlimit(resource.RLIMIT_AS, (memory_limit, memory_limit))
+    with contextlib.ExitStack() as exit_stack:
+        if storage_spec is not None:
+            exit_stack.enter_context(diary_interfaces.open(storage_spec, read_only=True))
+        connection.send("ready")
+        while (task := connection.recv()) is not None:
+            operation, name, code, function_name, args, kwargs = task
+            try:
+                if operation == "signature":
+                    response = (
+                        "ok",
+                        diary_interfaces.fetch_keyword_set(name, code, function_name),
+                        None,
+                    )
+                else:
+                    response = (
+                        "ok",
+                        diary_interfaces.execute(
+                            name, code, function_name, *args, **kwargs
+                        ),
+                        _fetch_state(kwargs),
+                    )
+            # 'NameError' of missing functions is raised as it is.
+            except Exception as e:
+                response = ("error", e, None)
+            try:
+                connection.send(response)
+            except Exception as e:
+                connection.send(
+                    (
+                        "error",
+                        diary_utilities.ExecutionError(
+                            f"Can't send result of {name} from worker:\n{e}"
+                        ),
+                        None,
+                    )
+                )
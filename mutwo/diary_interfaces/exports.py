@@ -0,0 +1,207 @@
+"""Export and import all entries of a diary as a portable file.
+
+"""
+
+from __future__ import annotations
+
+import datetime
+import importlib
+import json
+import typing
+
+from mutwo import diary_interfaces
+from mutwo import diary_utilities
+
+__all__ = ("export_diary", "import_diary")
+
+_FORMAT = "mutwo.diary"
+_FORMAT_VERSION = 0
+
+
+def export_diary(
+    file_path: str, session: typing.Optional[diary_interfaces.Session] = None
+) -> int:
+    """Write all entries of a diary into a file.
+
+    :param file_path: The file to which the entries are written.
+    :param session: The session of the database. Defaults to the session
+        opened by :func:`open`.
+    :return: How many entries have been exported.
+
+    The file contains one JSON object per line: a header followed by
+    one line per entry with the keyword arguments which recreate the
+    entry (including code and dates) and its hash. Entry classes and
+    return types are stored by their names, so the file neither depends
+    on pickles nor on the storage. Entries are turned into ghosts again
+    after they have been written, so the export runs in constant memory.
+    Use :func:`import_diary` to load the file into a diary.
+    """
+    session = diary_interfaces.fetch_session(session)
+    entry_count = 0
+    with open(file_path, "w") as file:
+        _write_line(file, dict(format=_FORMAT, version=_FORMAT_VERSION))
+        for entry in diary_interfaces.fetch_entry_tree(session).values():
+            _write_line(file, _entry_to_record(entry))
+            # Unmodified entries can be unloaded again.
+            entry._p_deactivate()
+            entry_count += 1
+    return entry_count
+
+
+def import_diary(
+    file_path: str,
+    verify: bool = True,
+    commit_interval: typing.Optional[int] = None,
+    session: typing.Optional[diary_interfaces.Session] = None,
+) -> diary_interfaces.BulkReport:
+    """Add or update entries of a file written by :func:`export_diary`.
+
+    :param file_path: The exported file.
+    :param verify: If ``True``, the hash of each imported entry is compared
+        with the hash of the exported entry.
+    :param commit_interval: After how many added or changed entries the
+        transaction is committed (see :func:`bulk`). If ``None``,
+        :const:`configurations.IMPORT_COMMIT_INTERVAL` is used.
+    :param session: The session of the database. Defaults to the session
+        opened by :func:`open`.
+    :raises diary_utilities.EntryHashError: If ``verify`` is ``True`` and
+        an imported entry has a different hash than the exported entry.
+    :return: How many entries have been added, changed and skipped.
+
+    The file is read line by line and entries are committed in bulk mode
+    (see :func:`bulk`) each ``commit_interval`` entries, so the import
+    runs in constant memory. Entries whose hash equals the hash of the
+    entry in the diary are skipped without loading them (see
+    :func:`fetch_entry_digest_tree`), therefore an interrupted import can
+    simply be restarted. Entry classes and return types need to be
+    importable. If an exception is raised, only the entries since the
+    last commit are discarded.
+    """
+    session = diary_interfaces.fetch_session(session)
+    entry_digest_tree = diary_interfaces.fetch_entry_digest_tree(session)
+    entry_tree = diary_interfaces.fetch_entry_tree(session)
+    identifier_to_context_identifier = {}
+    if commit_interval is None:
+        commit_interval = diary_interfaces.configurations.IMPORT_COMMIT_INTERVAL
+    with open(file_path, "r") as file, diary_interfaces.bulk(
+        session, commit_interval
+    ) as report:
+        header = json.loads(next(file, "{}"))
+        if (header.get("format"), header.get("version")) != (
+            _FORMAT,
+            _FORMAT_VERSION,
+        ):
+            raise ValueError(f"'{file_path}' isn't an exported diary.")
+        for line in file:
+            record = json.loads(line)
+            if entry_digest_tree.get(
+                record["path"]
+            ) == diary_interfaces.digests._record_to_digest(
+                record["hash"], record["argument_dict"]
+            ):
+                report.count("unchanged")
+                continue
+            entry = _record_to_entry(record, identifier_to_context_identifier, session)
+            if verify and entry.hash != record["hash"]:
+                raise diary_utilities.EntryHashError(
+                    entry.path, record["hash"], entry.hash
+                )
+            entry._report("changed" if entry.path in entry_tree else "added")
+            entry.commit()
+    return report
+
+
+def _write_line(file: typing.TextIO, object_: dict[str, typing.Any]):
+    file.write(json.dumps(object_, separators=(",", ":")))
+    file.write("\n")
+
+
+def _entry_to_record(entry: diary_interfaces.Entry) -> dict[str, typing.Any]:
+    argument_dict = entry._fetch_argument_dict()
+    context_identifier = argument_dict.pop("context_identifier")
+    return_type = argument_dict.pop("return_type")
+    for key in ("_creation_date", "_modification_date"):
+        if (date := argument_dict[key]) is not None:
+            argument_dict[key] = date.isoformat()
+    return dict(
+        path=str(entry.path),
+        hash=entry.hash,
+        entry_class=entry.identifier,
+        context=[context_identifier.name, int(context_identifier.version)],
+        return_type=f"{return_type.__module__}:{return_type.__qualname__}",
+        argument_dict=argument_dict,
+    )
+
+
+def _record_to_entry(
+    record: dict[str, typing.Any],
+    identifier_to_context_identifier: dict[
+        str, diary_interfaces.ContextIdentifier
+    ],
+    session: diary_interfaces.Session,
+) -> diary_interfaces.Entry:
+    argument_dict = record["argument_dict"]
+    for key in ("_creation_date", "_modification_date"):
+        if (date := argument_dict[key]) is not None:
+            argument_dict[key] = datetime.datetime.fromisoformat(date)
+    argument_dict["abbreviation_to_path_dict"] = {
+        abbreviation: _string_to_entry_path(path)
+        for abbreviation, path in argument_dict["abbreviation_to_path_dict"].items()
+    }
+    name, version = record["context"]
+    identifier = f"{name}_{version}"
+    try:
+        context_identifier = identifier_to_context_identifier[identifier]
+    except KeyError:
+        # Imported entries of the same context share one identifier
+        # (and 'Entry.commit' copies it if it belongs to another database).
+        context_identifier = identifier_to_context_identifier[identifier] = next(
+            (
+                context.identifier
+                for context in _iter_subclass(diary_interfaces.Context)
+                if str(context.identifier) == identifier
+            ),
+            None,
+        ) or diary_interfaces.ContextIdentifier(name, version)
+    return _fetch_entry_class(record["entry_class"])(
+        context_identifier=context_identifier,
+        return_type=_fetch_object(record["return_type"]),
+        # Neither fetch old entry nor commit: 'import_diary' commits.
+        skip_check=True,
+        force_commit=False,
+        session=session,
+        **argument_dict,
+    )
+
+
+def _string_to_entry_path(path: str) -> diary_interfaces.EntryPath:
+    # Only the name (the last component) could contain the separator.
+    return diary_interfaces.EntryPath(
+        *path.split(
+            diary_interfaces.constants.PATH_SEPARATOR,
+            len(diary_interfaces.EntryPath.__dataclass_fields__) - 1,
+        )
+    )
+
+
+def _iter_subclass(cls: typing.Type) -> typing.Iterator[typing.Type]:
+    for subclass in cls.__subclasses__():
+        yield subclass
+        yield from _iter_subclass(subclass)
+
+
+def _fetch_entry_class(identifier: str) -> typing.Type[diary_interfaces.Entry]:
+    if identifier == diary_interfaces.Entry.identifier:
+        return diary_interfaces.Entry
+    for entry_class in _iter_subclass(diary_interfaces.Entry):
+        if entry_class.identifier == identifier:
+            return entry_class
+    raise ValueError(f"Unknown entry class '{identifier}'.")
+
+
+def _fetch_object(name: str) -> typing.Any:
+    module_name, _, qualname = name.partition(":")
+    object_ = importlib.import_module(module_name)
+    for attribute_name in qualname.split("."):
+        object_ = getattr(object_, attribute_name)
+    return object_
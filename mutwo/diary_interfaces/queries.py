@@ -1,7 +1,17 @@
-import functools
+from __future__ import annotations
+
+import itertools
 import re
 import typing
 
+try:
+    from re import _parser as sre_parse  # Python >= 3.11
+except ImportError:
+    import sre_parse
+
+from BTrees.Interfaces import IKeyed
+import numpy as np
+
 from mutwo import diary_interfaces
 
 
@@ -9,12 +19,39 @@ __all__ = ("qwrap",)
 
 
 class qwrap(object):
-    """Create wrapper of database to query database"""
+    """Create wrapper of database to query database
+
+    :param mapping: The entry tree which shall be queried.
+    :param index_tree: Optional secondary index of the entry tree
+        (see :func:`fetch_index_tree`). If provided, :meth:`rquery`
+        only visits paths which belong to the matching context
+        identifiers, return types and entry identifiers.
+    :param catalog_tree: Optional tree of entry metadata (see
+        :func:`fetch_catalog_tree`) which is required by :meth:`cquery`.
+    :param lazy: If ``True``, queries iterate directly over the keys
+        of the mapping instead of copying all keys into
+        :attr:`path_tuple` first. Don't change the mapping while
+        consuming the results of a lazy query.
+    :param live: If ``True``, the cached :attr:`path_tuple` is
+        refreshed as soon as the connection of the mapping sees a new
+        transaction (connections see transactions of other connections
+        after their next commit or abort). Useful for long-lived wrappers.
+    """
 
     def __init__(
-        self, mapping: typing.Mapping[diary_interfaces.Path, diary_interfaces.Entry]
+        self,
+        mapping: typing.Mapping[diary_interfaces.Path, diary_interfaces.Entry],
+        index_tree: typing.Optional[typing.Mapping] = None,
+        catalog_tree: typing.Optional[typing.Mapping] = None,
+        lazy: bool = False,
+        live: bool = False,
     ):
         self._mapping = mapping
+        self._index_tree = index_tree
+        self._catalog_tree = catalog_tree
+        self._lazy = lazy
+        self._live = live
+        self._serial = self._fetch_serial()
 
     def __str__(self) -> str:
         return f"wrapped({str(self._mapping)})"
@@ -25,9 +62,73 @@ class qwrap(object):
     def __getitem__(self, key: diary_interfaces.Path) -> diary_interfaces.Entry:
         return self._mapping[key]
 
-    @functools.cached_property
+    def _fetch_serial(self) -> typing.Optional[bytes]:
+        # The connection only sees transactions which have been committed
+        # before its snapshot, so refreshing earlier wouldn't find them.
+        try:
+            return diary_interfaces.utilities._fetch_snapshot(self._mapping._p_jar)
+        # Mapping isn't stored in a database.
+        except AttributeError:
+            return None
+
+    @property
+    def is_outdated(self) -> bool:
+        """``True`` if the connection sees a newer state since the last refresh"""
+        return self._serial != self._fetch_serial()
+
+    def refresh(self):
+        """Drop cached paths, so that they are fetched again."""
+        self.__dict__.pop("_path_tuple", None)
+        self.__dict__.pop("_catalog", None)
+        self._serial = self._fetch_serial()
+
+    @property
     def path_tuple(self) -> tuple[diary_interfaces.Path, ...]:
-        return tuple(self._mapping.keys())
+        if self._live and self.is_outdated:
+            self.refresh()
+        try:
+            return self._path_tuple
+        except AttributeError:
+            self._path_tuple = tuple(self._mapping.keys())
+            return self._path_tuple
+
+    @property
+    def catalog(self) -> diary_interfaces.Catalog:
+        """Columns of entry metadata (see :class:`Catalog`)"""
+        if self._live and self.is_outdated:
+            self.refresh()
+        try:
+            return self._catalog
+        except AttributeError:
+            if self._catalog_tree is None:
+                raise ValueError("Wrapper has no catalog tree.")
+            self._catalog = diary_interfaces.Catalog.from_tree(self._catalog_tree)
+            return self._catalog
+
+    def _iter_path(self) -> typing.Iterable[diary_interfaces.Path]:
+        if self._lazy:
+            return iter(self._mapping.keys())
+        return self.path_tuple
+
+    def _indexed_path_tuple(
+        self, pattern_dict: dict[str, re.Pattern]
+    ) -> tuple[diary_interfaces.Path, ...]:
+        def iter_path(tree, component_index: int):
+            component = _INDEX_COMPONENT_TUPLE[component_index]
+            for key in _iter_matching_key(tree, pattern_dict.get(component)):
+                if component_index + 1 == len(_INDEX_COMPONENT_TUPLE):
+                    yield from tree[key]
+                else:
+                    yield from iter_path(tree[key], component_index + 1)
+
+        # Keep the order of a query which doesn't use the index.
+        return tuple(sorted(iter_path(self._index_tree, 0)))
+
+    def _iter_prefixed_path(
+        self, prefix_tuple: tuple[str, ...]
+    ) -> typing.Iterator[diary_interfaces.Path]:
+        for prefix in prefix_tuple:
+            yield from _iter_prefix_key(self._mapping, prefix)
 
     def rquery(
         self,
@@ -72,7 +173,19 @@ class qwrap(object):
         else:
             query = query_base
 
-        for path in self.path_tuple:
+        if self._index_tree is not None and any(
+            component in pattern_dict for component in _INDEX_COMPONENT_TUPLE
+        ):
+            path_iterable = self._indexed_path_tuple(pattern_dict)
+        elif IKeyed.providedBy(self._mapping) and (
+            prefix_tuple := _path_prefix_tuple(pattern_dict, full)
+        ) != ("",):
+            # Only scan key range(s) of paths which start with the prefix.
+            path_iterable = self._iter_prefixed_path(prefix_tuple)
+        else:
+            path_iterable = self._iter_path()
+
+        for path in path_iterable:
             if query(path):
                 yield self[path]
 
@@ -86,3 +199,169 @@ class qwrap(object):
         for entry in self._mapping.values():
             if function(entry):
                 yield entry
+
+    def cquery(
+        self, function: typing.Callable[[diary_interfaces.Catalog], np.ndarray]
+    ) -> typing.Generator:
+        """Catalog based query
+
+        Fast and rich, but limited to the columns of :class:`Catalog`.
+        The function gets the catalog and returns a boolean mask. Only
+        matching entries are loaded from the database:
+
+        >>> wrapped.cquery(
+        ...     lambda catalog: (catalog.relevance > 5)
+        ...     & catalog.is_matching("context_identifier", "my_context")
+        ... )
+        """
+        catalog = self.catalog
+        for path in catalog.filter(function(catalog)):
+            yield self[path]
+
+
+_INDEX_COMPONENT_TUPLE = ("context_identifier", "return_type", "entry_identifier")
+"""Path components in the order in which they are nested in the index"""
+
+_MAX_PREFIX_COUNT = 64
+
+
+def _parsed_pattern_to_prefix_tuple(
+    parsed_pattern,
+) -> tuple[tuple[str, ...], bool]:
+    prefix_tuple = ("",)
+    operation_count = len(parsed_pattern)
+    for operation_index, (operation, argument) in enumerate(parsed_pattern):
+        if operation is sre_parse.LITERAL:
+            prefix_tuple = tuple(prefix + chr(argument) for prefix in prefix_tuple)
+            continue
+        elif operation is sre_parse.AT and argument is sre_parse.AT_BEGINNING:
+            continue
+        elif (
+            operation is sre_parse.AT
+            and argument is sre_parse.AT_END
+            and operation_index + 1 == operation_count
+        ):
+            return prefix_tuple, True
+        elif operation is sre_parse.IN and all(
+            sub_operation is sre_parse.LITERAL for sub_operation, _ in argument
+        ):
+            suffix_tuple = tuple(chr(sub_argument) for _, sub_argument in argument)
+            if len(prefix_tuple) * len(suffix_tuple) <= _MAX_PREFIX_COUNT:
+                prefix_tuple = tuple(
+                    prefix + suffix
+                    for prefix, suffix in itertools.product(prefix_tuple, suffix_tuple)
+                )
+                continue
+        elif operation is sre_parse.BRANCH:
+            suffix_tuple = tuple(
+                itertools.chain.from_iterable(
+                    _parsed_pattern_to_prefix_tuple(branch)[0] for branch in argument[1]
+                )
+            )
+            if len(prefix_tuple) * len(suffix_tuple) <= _MAX_PREFIX_COUNT:
+                prefix_tuple = tuple(
+                    prefix + suffix
+                    for prefix, suffix in itertools.product(prefix_tuple, suffix_tuple)
+                )
+        break
+    return prefix_tuple, False
+
+
+def _pattern_to_prefix_tuple_and_is_exact(
+    pattern: str,
+) -> tuple[tuple[str, ...], bool]:
+    """Find literal prefixes of a regular expression.
+
+    Each string which is matched by the pattern (with :func:`re.match`)
+    starts with one of the returned prefixes. If no such prefixes can be
+    found, ``("",)`` is returned. The returned boolean is ``True`` if the
+    pattern only matches exactly the returned strings.
+    """
+    try:
+        parsed_pattern = sre_parse.parse(pattern)
+    except re.error:
+        return ("",), False
+    if parsed_pattern.state.flags & (re.IGNORECASE | re.VERBOSE):
+        return ("",), False
+    prefix_tuple, is_exact = _parsed_pattern_to_prefix_tuple(parsed_pattern)
+    if is_exact:
+        return tuple(sorted(set(prefix_tuple))), True
+    return _reduce_prefix_tuple(prefix_tuple), False
+
+
+def _pattern_to_prefix_tuple(pattern: str) -> tuple[str, ...]:
+    return _pattern_to_prefix_tuple_and_is_exact(pattern)[0]
+
+
+def _reduce_prefix_tuple(prefix_tuple: tuple[str, ...]) -> tuple[str, ...]:
+    """Sort prefixes and drop prefixes covered by shorter prefixes."""
+    prefix_list = []
+    for prefix in sorted(set(prefix_tuple)):
+        if not (prefix_list and prefix.startswith(prefix_list[-1])):
+            prefix_list.append(prefix)
+    return tuple(prefix_list)
+
+
+def _path_prefix_tuple(
+    pattern_dict: dict[str, re.Pattern], full: typing.Optional[re.Pattern]
+) -> tuple[str, ...]:
+    """Find literal prefixes of all paths which can be matched by a query.
+
+    Leading path components which are pinned to exact values
+    (e.g. ``context_identifier="my_context_0$"``) are joined with the
+    prefix of the first not exactly pinned component.
+    """
+    prefix_tuple = ("",)
+    for component in diary_interfaces.EntryPath.component_tuple:
+        try:
+            pattern = pattern_dict[component]
+        except KeyError:
+            break
+        (
+            component_prefix_tuple,
+            is_exact,
+        ) = _pattern_to_prefix_tuple_and_is_exact(pattern.pattern)
+        if len(prefix_tuple) * len(component_prefix_tuple) > _MAX_PREFIX_COUNT:
+            break
+        if is_exact:
+            component_prefix_tuple = tuple(
+                component_prefix + diary_interfaces.constants.PATH_SEPARATOR
+                for component_prefix in component_prefix_tuple
+            )
+        prefix_tuple = tuple(
+            prefix + component_prefix
+            for prefix, component_prefix in itertools.product(
+                prefix_tuple, component_prefix_tuple
+            )
+        )
+        if not is_exact:
+            break
+    prefix_tuple = _reduce_prefix_tuple(prefix_tuple)
+    if full is not None:
+        full_prefix_tuple = _pattern_to_prefix_tuple(full.pattern)
+        if min(map(len, full_prefix_tuple)) > min(map(len, prefix_tuple)):
+            prefix_tuple = full_prefix_tuple
+    return prefix_tuple
+
+
+def _iter_prefix_key(tree, prefix: str) -> typing.Iterator[str]:
+    """Iterate over all keys of a BTree which start with prefix."""
+    if not prefix:
+        yield from tree.keys()
+        return
+    for key in tree.keys(min=prefix):
+        if not key.startswith(prefix):
+            break
+        yield key
+
+
+def _iter_matching_key(
+    tree, pattern: typing.Optional[re.Pattern]
+) -> typing.Iterator[str]:
+    if pattern is None:
+        yield from tree.keys()
+        return
+    for prefix in _pattern_to_prefix_tuple(pattern.pattern):
+        for key in _iter_prefix_key(tree, prefix):
+            if pattern.match(key):
+                yield key
@@ -0,0 +1,197 @@
+"""Cache outputs of entries on disk.
+
+"""
+
+from __future__ import annotations
+
+import hashlib
+import pickle
+import typing
+
+from BTrees.IOBTree import IOBTree
+from BTrees.OOBTree import OOBTree
+from ZODB.DB import DB
+import persistent
+import transaction
+
+from mutwo import diary_interfaces
+
+__all__ = ("RenderCache",)
+
+
+class RenderCacheItem(persistent.Persistent):
+    def __init__(self, data: bytes, state: bytes, access: int):
+        self.data = data
+        self.state = state
+        self.access = access
+
+    @property
+    def size(self) -> int:
+        return len(self.data) + len(self.state)
+
+
+class RenderCache(object):
+    """Persistent cache of entry outputs.
+
+    :param storage_path: Path of the database file in which the outputs are
+        stored. It has to be different from the path of the diary itself.
+        Defaults to :const:`configurations.DEFAULT_RENDER_CACHE_PATH`.
+    :param maxsize: How many bytes of pickled outputs are kept. If the cache
+        grows bigger, the least recently used outputs are evicted. Defaults to
+        :const:`configurations.RENDER_CACHE_MAXSIZE`.
+    :param commit_interval: After how many new outputs the cache is
+        committed to its storage. Defaults to
+        :const:`configurations.RENDER_CACHE_COMMIT_INTERVAL`. Outputs
+        which haven't been committed yet are committed by :meth:`commit`
+        and :meth:`close`.
+
+    **Example:**
+
+    >>> with diary_interfaces.open(), diary_interfaces.RenderCache() as cache:
+    ...     event_placement = cache.call(entry, context)
+
+    The outputs are keyed by the hash of the entry, the hashes of all of its
+    (nested) requirements, the context and the random state of the entry.
+    So if an entry or any of its requirements change, its old outputs aren't
+    used anymore (and are evicted over time). After a cache hit, the random
+    state of the entry is set to the state it would have after calling it.
+    Only calls without extra keyword arguments and with picklable contexts
+    and outputs are cached.
+    """
+
+    def __init__(
+        self,
+        storage_path: typing.Optional[str] = None,
+        maxsize: typing.Optional[int] = None,
+        commit_interval: typing.Optional[int] = None,
+    ):
+        self.maxsize = maxsize or diary_interfaces.configurations.RENDER_CACHE_MAXSIZE
+        self.commit_interval = (
+            commit_interval
+            or diary_interfaces.configurations.RENDER_CACHE_COMMIT_INTERVAL
+        )
+        self._uncommitted_count = 0
+        self._transaction_manager = transaction.TransactionManager()
+        self._database = DB(
+            diary_interfaces.configurations.GET_STORAGE(
+                storage_path
+                or diary_interfaces.configurations.DEFAULT_RENDER_CACHE_PATH
+            )
+        )
+        self._connection = self._database.open(
+            transaction_manager=self._transaction_manager
+        )
+        self._root = self._connection.root()
+        if not hasattr(self._root, "item_tree"):
+            self._root.item_tree = OOBTree()  # key -> RenderCacheItem
+            self._root.access_tree = IOBTree()  # access -> key
+            self._root.size = 0
+            self._root.access = 0
+            self._transaction_manager.commit()
+        self.hit_count = 0
+        self.miss_count = 0
+
+    def __enter__(self) -> RenderCache:
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __len__(self) -> int:
+        return len(self._root.item_tree)
+
+    @property
+    def size(self) -> int:
+        """How many bytes the cached outputs take"""
+        return self._root.size
+
+    def commit(self):
+        """Write all new outputs to the storage."""
+        self._transaction_manager.commit()
+        self._uncommitted_count = 0
+
+    def close(self):
+        self.commit()
+        self._connection.close()
+        self._database.close()
+
+    def clear(self):
+        self._root.item_tree.clear()
+        self._root.access_tree.clear()
+        self._root.size = 0
+        self.commit()
+
+    def _touch(self, key: str, item: RenderCacheItem):
+        root = self._root
+        del root.access_tree[item.access]
+        root.access += 1
+        item.access = root.access
+        root.access_tree[item.access] = key
+
+    def _store(self, key: str, item: RenderCacheItem):
+        root = self._root
+        root.item_tree[key] = item
+        root.access_tree[item.access] = key
+        root.size += item.size
+        while root.size > self.maxsize and root.access_tree:
+            access = root.access_tree.minKey()
+            old_key = root.access_tree.pop(access)
+            root.size -= root.item_tree.pop(old_key).size
+        # Committing each output would be slower than calling the entry.
+        self._uncommitted_count += 1
+        if self._uncommitted_count >= self.commit_interval:
+            self.commit()
+
+    def call(
+        self,
+        entry: diary_interfaces.Entry,
+        context: diary_interfaces.Context,
+        **kwargs,
+    ) -> typing.Any:
+        """Call entry or fetch its output from the cache."""
+        if kwargs:
+            return entry(context, **kwargs)
+        try:
+            key = hashlib.md5(
+                pickle.dumps((_entry_to_digest(entry), context, entry._fetch_state()))
+            ).hexdigest()
+        except (pickle.PicklingError, TypeError, AttributeError):
+            return entry(context)
+
+        try:
+            item = self._root.item_tree[key]
+        except KeyError:
+            pass
+        else:
+            self.hit_count += 1
+            self._touch(key, item)
+            entry._restore_state(pickle.loads(item.state))
+            return pickle.loads(item.data)
+
+        self.miss_count += 1
+        data = entry(context)
+        try:
+            data_bytes = pickle.dumps(data)
+            state_bytes = pickle.dumps(entry._fetch_state())
+        except (pickle.PicklingError, TypeError, AttributeError):
+            return data
+        self._root.access += 1
+        self._store(key, RenderCacheItem(data_bytes, state_bytes, self._root.access))
+        return data
+
+
+def _entry_to_digest(
+    entry: diary_interfaces.Entry,
+    visited_path_set: typing.Optional[set[diary_interfaces.EntryPath]] = None,
+) -> str:
+    """Hash of an entry and all of its (nested) requirements"""
+    if visited_path_set is None:
+        visited_path_set = set([])
+    visited_path_set.add(entry.path)
+    hash_list = [entry.hash]
+    for abbreviation, dependency in sorted(entry.abbreviation_to_entry_dict.items()):
+        if dependency.path not in visited_path_set:
+            hash_list.append(
+                f"{abbreviation}={_entry_to_digest(dependency, visited_path_set)}"
+            )
+    return hashlib.md5(";".join(hash_list).encode()).hexdigest()
@@ -0,0 +1,170 @@
+"""Share one database between threads.
+
+"""
+
+from __future__ import annotations
+
+import threading
+import typing
+import weakref
+
+from ZODB.DB import DB
+from ZODB.interfaces import IConnection, IStorage
+from ZODB.POSException import ConnectionStateError
+import transaction
+
+from mutwo import diary_interfaces
+from mutwo import diary_utilities
+
+__all__ = ("Session", "fetch_session")
+
+
+class Session(object):
+    """Database which gives each thread its own connection.
+
+    :param storage: The storage of the diary.
+    :param pool_size: How many connections the database keeps open
+        without warning. Defaults to :const:`configurations.POOL_SIZE`.
+    :param transaction_manager: The transaction manager used by all
+        connections. By default each connection gets its own manager,
+        so that transactions of different sessions are independent.
+    :param storage_spec: The specification from which the storage has been
+        created (see :func:`diary_interfaces.create_storage`). Other processes
+        use it to open the same storage, for instance the workers of
+        ``ContextTupleToEventPlacementTuple(process_count=...)``.
+
+    **Example:**
+
+    >>> session = diary_interfaces.Session(diary_interfaces.configurations.GET_STORAGE())
+    >>> def render():
+    ...     converter = diary_converters.ContextTupleToEventPlacementTuple(
+    ...         session=session
+    ...     )
+    ...     return converter.convert(context_tuple)
+    >>> threading.Thread(target=render).start()
+
+    Objects loaded in one thread must not be used in another thread.
+    :func:`diary_interfaces.open` creates the default session which is used
+    by all functions if no explicit session is passed.
+    """
+
+    def __init__(
+        self,
+        storage: IStorage,
+        pool_size: typing.Optional[int] = None,
+        transaction_manager: typing.Optional[transaction.TransactionManager] = None,
+        storage_spec: typing.Optional[str] = None,
+    ):
+        self.storage = storage
+        self.storage_spec = storage_spec
+        self.database = DB(
+            storage, pool_size=pool_size or diary_interfaces.configurations.POOL_SIZE
+        )
+        self._transaction_manager = transaction_manager
+        self._local = threading.local()
+        self._connection_set = set([])
+        self._lock = threading.Lock()
+        # Trees which are missing in a read-only database are only kept
+        # in memory (see 'utilities._fetch_tree_tuple').
+        self._volatile_tree_dict = {}
+        _DATABASE_TO_SESSION[self.database] = self
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({self.database})"
+
+    @classmethod
+    def from_connection(cls, connection: IConnection) -> typing.Optional[Session]:
+        """Find session to which the connection belongs."""
+        return _DATABASE_TO_SESSION.get(connection.db())
+
+    @property
+    def connection(self) -> IConnection:
+        """Connection of the current thread"""
+        try:
+            return self._local.connection
+        except AttributeError:
+            connection = self.database.open(
+                transaction_manager=self._transaction_manager
+                or transaction.TransactionManager()
+            )
+            with self._lock:
+                self._connection_set.add(connection)
+            self._local.connection = connection
+            return connection
+
+    @property
+    def read_only(self) -> bool:
+        """``True`` if the storage can't be written"""
+        return self.storage.isReadOnly()
+
+    @property
+    def root(self):
+        """Root object of the current thread's connection"""
+        return self.connection.root()
+
+    @property
+    def transaction_manager(self) -> transaction.TransactionManager:
+        return self.connection.transaction_manager
+
+    @property
+    def bulk_report(self) -> typing.Optional[diary_interfaces.BulkReport]:
+        """Report of the active :func:`bulk` context of the current thread"""
+        return getattr(self._local, "bulk_report", None)
+
+    @bulk_report.setter
+    def bulk_report(self, bulk_report: typing.Optional[diary_interfaces.BulkReport]):
+        self._local.bulk_report = bulk_report
+
+    def commit(self):
+        self.transaction_manager.commit()
+
+    def abort(self):
+        self.transaction_manager.abort()
+
+    def release(self):
+        """Abort and close connection of the current thread.
+
+        Threads which don't need the session anymore should release
+        their connection, so that it is returned to the pool.
+        """
+        try:
+            connection = self._local.connection
+        except AttributeError:
+            return
+        del self._local.connection
+        connection.transaction_manager.abort()
+        connection.close()
+        with self._lock:
+            self._connection_set.discard(connection)
+
+    def close(self):
+        """Close all connections, the database and the storage."""
+        self.release()
+        with self._lock:
+            connection_tuple = tuple(self._connection_set)
+            self._connection_set.clear()
+        for connection in connection_tuple:
+            try:
+                connection.transaction_manager.abort()
+                connection.close()
+            # Connection still joined a transaction of a different thread.
+            except ConnectionStateError:
+                pass
+        self.database.close()
+        self.storage.close()
+
+
+_DATABASE_TO_SESSION: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+
+
+def fetch_session(session: typing.Optional[Session] = None) -> Session:
+    """Return given session or the default session.
+
+    :raises diary_utilities.NoSessionError: If no session is given and
+        no default session has been opened with :func:`open`.
+    """
+    if session is not None:
+        return session
+    if (session := diary_interfaces.configurations.SESSION) is None:
+        raise diary_utilities.NoSessionError()
+    return session
@@ -0,0 +1,148 @@
+"""Synchronise entries with a directory of entry source files.
+
+"""
+
+import dataclasses
+import hashlib
+import json
+import os
+import pathlib
+import typing
+
+from mutwo import diary_interfaces
+
+__all__ = ("SyncReport", "sync_directory")
+
+
+@dataclasses.dataclass
+class SyncReport(object):
+    """Summary of :func:`sync_directory`
+
+    File paths are relative to the synchronised directory.
+    """
+
+    registered_file_list: list[str] = dataclasses.field(default_factory=list)
+    unchanged_file_list: list[str] = dataclasses.field(default_factory=list)
+    deleted_file_list: list[str] = dataclasses.field(default_factory=list)
+    orphan_path_list: list[str] = dataclasses.field(default_factory=list)
+    """Paths of entries whose source file has been deleted"""
+    removed_path_list: list[str] = dataclasses.field(default_factory=list)
+    """Paths of orphan entries which have been removed from the database"""
+
+
+def sync_directory(
+    directory_path: str,
+    register: typing.Callable[
+        [str],
+        typing.Union[diary_interfaces.Entry, typing.Sequence[diary_interfaces.Entry]],
+    ],
+    manifest_path: typing.Optional[str] = None,
+    remove: bool = False,
+    suffix: str = ".py",
+    session: typing.Optional[diary_interfaces.Session] = None,
+) -> SyncReport:
+    """Register entries of new or changed source files in a directory.
+
+    :param directory_path: Directory which is recursively searched for
+        entry source files.
+    :param register: Function which is called with the path of each new
+        or changed source file. It needs to initialise the entries of
+        the file (for instance with :meth:`DynamicEntry.from_file`) and
+        return them.
+    :param manifest_path: JSON file in which the state of each source file
+        (modification time, size, content hash and entry paths) is stored.
+        Defaults to :const:`configurations.DEFAULT_MANIFEST_NAME` inside
+        the synchronised directory.
+    :param remove: If ``True``, entries whose source file has been deleted
+        are removed from the database. Otherwise they are only reported
+        (also by later calls, until they are removed).
+    :param suffix: Only files with this suffix are synchronised.
+    :param session: The session of the database. Defaults to the session
+        opened by :func:`open`. ``register`` needs to initialise the entries
+        with the same session.
+
+    A file is skipped without being read if its modification time and size
+    didn't change since the last synchronisation. If only its modification
+    time changed, it is hashed and skipped if its content is still the same.
+    Files whose entries are missing in the database are always registered.
+    All entries are committed in one transaction (see :func:`bulk`).
+    """
+    directory = pathlib.Path(directory_path)
+    manifest_path = manifest_path or str(
+        directory / diary_interfaces.configurations.DEFAULT_MANIFEST_NAME
+    )
+    try:
+        with open(manifest_path, "r") as manifest_file:
+            old_file_to_record = json.load(manifest_file)
+    except FileNotFoundError:
+        old_file_to_record = {}
+
+    entry_tree = diary_interfaces.fetch_entry_tree(session)
+
+    def is_registered(record: dict) -> bool:
+        return all(path in entry_tree for path in record["path_list"])
+
+    report = SyncReport()
+    file_to_record = {}
+    with diary_interfaces.bulk(session):
+        for file_path in sorted(directory.rglob(f"*{suffix}")):
+            file = str(file_path.relative_to(directory))
+            stat = file_path.stat()
+            record = old_file_to_record.get(file)
+            if record is not None and is_registered(record):
+                if (record["mtime_ns"], record["size"]) == (
+                    stat.st_mtime_ns,
+                    stat.st_size,
+                ):
+                    file_to_record[file] = record
+                    report.unchanged_file_list.append(file)
+                    continue
+                content_hash = hashlib.md5(file_path.read_bytes()).hexdigest()
+                if record["hash"] == content_hash:
+                    file_to_record[file] = dict(
+                        record, mtime_ns=stat.st_mtime_ns, size=stat.st_size
+                    )
+                    report.unchanged_file_list.append(file)
+                    continue
+            else:
+                content_hash = hashlib.md5(file_path.read_bytes()).hexdigest()
+
+            entry_or_entry_sequence = register(str(file_path))
+            if isinstance(entry_or_entry_sequence, diary_interfaces.Entry):
+                entry_or_entry_sequence = (entry_or_entry_sequence,)
+            file_to_record[file] = dict(
+                mtime_ns=stat.st_mtime_ns,
+                size=stat.st_size,
+                hash=content_hash,
+                path_list=[str(entry.path) for entry in entry_or_entry_sequence],
+            )
+            report.registered_file_list.append(file)
+
+        registered_path_set = set(
+            path for record in file_to_record.values() for path in record["path_list"]
+        )
+        for file, record in old_file_to_record.items():
+            if file in file_to_record:
+                continue
+            report.deleted_file_list.append(file)
+            orphan_path_list = []
+            for path in record["path_list"]:
+                if path in registered_path_set or path not in entry_tree:
+                    continue
+                report.orphan_path_list.append(path)
+                if remove:
+                    diary_interfaces.remove_entry(path, session)
+                    report.removed_path_list.append(path)
+                else:
+                    orphan_path_list.append(path)
+            # Keep deleted files in the manifest until their orphans are
+            # removed, so that a later call with 'remove=True' finds them.
+            if orphan_path_list:
+                file_to_record[file] = dict(record, path_list=orphan_path_list)
+
+    # Write manifest only after the entries have been committed.
+    temporary_manifest_path = f"{manifest_path}.tmp"
+    with open(temporary_manifest_path, "w") as manifest_file:
+        json.dump(file_to_record, manifest_file, indent=1, sort_keys=True)
+    os.replace(temporary_manifest_path, manifest_path)
+    return report
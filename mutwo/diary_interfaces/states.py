@@ -0,0 +1,81 @@
+"""Fetch and restore the states which dynamic entries pass to their code.
+
+"""
+
+from __future__ import annotations
+
+import typing
+
+import numpy as np
+
+from mutwo import common_generators
+
+__all__ = ("ActivityLevel", "fetch_state", "restore_state")
+
+
+class ActivityLevel(common_generators.ActivityLevel):
+    """Activity level whose state can be fetched and restored.
+
+    :param start_at: See :class:`common_generators.ActivityLevel`.
+
+    The state is the position of each level in its cycle, so it is
+    a plain tuple of integers which can be pickled and compared.
+    """
+
+    _period_tuple = tuple(
+        sum(map(len, level_tuple))
+        for level_tuple in common_generators.constants.ACTIVITY_LEVEL_TUPLE
+    )
+
+    def __init__(self, start_at: int = 0):
+        super().__init__(start_at)
+        self._start_at = start_at
+        self._position_list = [0] * len(self._period_tuple)
+
+    def __call__(self, level: int) -> bool:
+        is_active = super().__call__(level)
+        self._position_list[level] = (
+            self._position_list[level] + 1
+        ) % self._period_tuple[level]
+        return is_active
+
+    def __getstate__(self) -> tuple[int, tuple[int, ...]]:
+        return self._start_at, self.state
+
+    def __setstate__(self, state: tuple[int, tuple[int, ...]]):
+        start_at, position_tuple = state
+        self.__init__(start_at)
+        self.state = position_tuple
+
+    @property
+    def state(self) -> tuple[int, ...]:
+        """Position of each level in its cycle"""
+        return tuple(self._position_list)
+
+    @state.setter
+    def state(self, state: tuple[int, ...]):
+        self.__init__(self._start_at)
+        for level, position in enumerate(state):
+            for _ in range(position):
+                self(level)
+
+
+def fetch_state(object_: typing.Union[np.random.Generator, ActivityLevel]) -> typing.Any:
+    """Get picklable state of a random generator or an activity level."""
+    if isinstance(object_, np.random.Generator):
+        return object_.bit_generator.state
+    elif isinstance(object_, ActivityLevel):
+        return object_.state
+    raise TypeError(f"Can't fetch state of '{object_}'.")
+
+
+def restore_state(
+    object_: typing.Union[np.random.Generator, ActivityLevel], state: typing.Any
+):
+    """Set state of a random generator or an activity level."""
+    if isinstance(object_, np.random.Generator):
+        object_.bit_generator.state = state
+    elif isinstance(object_, ActivityLevel):
+        object_.state = state
+    else:
+        raise TypeError(f"Can't restore state of '{object_}'.")
@@ -0,0 +1,105 @@
+"""Create storages of a diary.
+
+"""
+
+import typing
+
+from ZODB.FileStorage import FileStorage
+from ZODB.interfaces import IStorage
+from ZODB.MappingStorage import MappingStorage
+
+from mutwo import diary_interfaces
+
+__all__ = ("create_storage", "start_zeo_server", "pack")
+
+
+def create_storage(storage_spec: str, read_only: bool = False) -> IStorage:
+    """Create storage from a storage specification.
+
+    :param storage_spec: Specifies the storage. Can be
+
+        - ``"memory://"``: a new in-memory storage (useful for tests and
+          benchmarks), which is lost when the storage is closed.
+          ``read_only`` is ignored.
+        - ``"zeo://host:port"`` or ``"zeo:///path/to/socket"``: a client
+          of a ZEO server. Many processes can write to the same diary via
+          ZEO (see :func:`start_zeo_server`). Requires the package ``ZEO``.
+        - ``"file://path/to/diary.fs"`` or ``"path/to/diary.fs"``: a file
+          storage.
+
+    :param read_only: Open storage in read-only mode. Many processes can
+        open the same file storage in read-only mode (while at most one
+        process opened it in read-write mode). A read-only file storage
+        doesn't write its index file when it's closed.
+    """
+    scheme, separator, location = storage_spec.partition("://")
+    if not separator:
+        scheme, location = "file", storage_spec
+    match scheme:
+        case "memory":
+            # A new memory storage is always empty, so 'read_only'
+            # doesn't make sense here.
+            return MappingStorage(location or "memory")
+        case "zeo":
+            try:
+                from ZEO.ClientStorage import ClientStorage
+            except ImportError:
+                raise ImportError(
+                    "Please install 'ZEO' to connect to a ZEO server: "
+                    "pip install mutwo.diary[zeo]"
+                )
+            if location.startswith("/"):
+                address = location
+            else:
+                host, _, port = location.rpartition(":")
+                address = (host or "localhost", int(port))
+            return ClientStorage(address, read_only=read_only)
+        case "file":
+            return FileStorage(location, read_only=read_only)
+        case _:
+            raise ValueError(f"Unknown storage scheme '{scheme}'.")
+
+
+def start_zeo_server(
+    storage_path: typing.Optional[str] = None,
+    address: typing.Optional[typing.Union[str, tuple[str, int]]] = None,
+) -> tuple[str, typing.Callable[[], None]]:
+    """Start local ZEO server for a file storage in a background thread.
+
+    :param storage_path: Path of the file storage which is served.
+        Defaults to :const:`configurations.DEFAULT_STORAGE_PATH`.
+    :param address: Path of a unix socket or a (host, port) tuple.
+        Defaults to a free port on localhost.
+    :return: The storage specification which can be passed to
+        :func:`open` by clients and a function to stop the server.
+
+    Use this to let many processes write to the same diary. For
+    long-living servers rather use the ``runzeo`` script of ``ZEO``.
+    """
+    try:
+        import ZEO
+    except ImportError:
+        raise ImportError(
+            "Please install 'ZEO' to start a ZEO server: "
+            "pip install mutwo.diary[zeo]"
+        )
+    address, stop = ZEO.server(
+        path=storage_path or diary_interfaces.configurations.DEFAULT_STORAGE_PATH,
+        port=address,
+    )
+    if isinstance(address, str):
+        storage_spec = f"zeo://{address}"
+    else:
+        storage_spec = f"zeo://{address[0]}:{address[1]}"
+    return storage_spec, stop
+
+
+def pack(days: float = 0, session: typing.Optional[diary_interfaces.Session] = None):
+    """Remove old revisions of objects from the storage.
+
+    :param days: Keep revisions which are younger than ``days``.
+
+    Each time an entry is committed again, its old revision stays in
+    the storage. Packing regularly keeps the storage small.
+    """
+    diary_interfaces.fetch_session(session).database.pack(days=days)
@@ -1,40 +1,346 @@
+import collections
+import functools
+import hashlib
+import inspect
+import threading
+import typing
+
 from BTrees.OOBTree import OOBTree
-import transaction
+from BTrees.OOBTree import OOTreeSet
 
 from mutwo import diary_interfaces
 from mutwo import diary_utilities
 
 
 __all__ = (
+    "Cache",
+    "CODE_CACHE",
+    "IS_SUPPORTED_CACHE",
     "fetch_entry_tree",
+    "fetch_index_tree",
     "fetch_wrapped_entry_tree",
+    "index_path",
+    "unindex_path",
+    "remove_entry",
+    "fetch_entry_size_tuple",
+    "fetch_namespace",
+    "fetch_function",
+    "fetch_keyword_set",
     "execute",
 )
 
 
-def fetch_entry_tree() -> OOBTree:
+class Cache(object):
+    """Process-wide least recently used cache with hit/miss counters
+
+    :param maxsize: How many items the cache keeps before it starts
+        to evict the least recently used items. If ``None`` the cache
+        is unbounded.
+    """
+
+    def __init__(self, maxsize: typing.Optional[int] = 128):
+        self.maxsize = maxsize
+        self._key_to_value = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self.hit_count = 0
+        self.miss_count = 0
+
+    def __repr__(self) -> str:
+        return (
+            f"{type(self).__name__}(size={len(self)}, maxsize={self.maxsize}, "
+            f"hit_count={self.hit_count}, miss_count={self.miss_count})"
+        )
+
+    def __len__(self) -> int:
+        return len(self._key_to_value)
+
+    def __contains__(self, key: typing.Hashable) -> bool:
+        return key in self._key_to_value
+
+    def fetch(
+        self, key: typing.Hashable, create: typing.Callable[[], typing.Any]
+    ) -> typing.Any:
+        """Get value of key or create (and store) it if it is missing."""
+        with self._lock:
+            try:
+                value = self._key_to_value[key]
+            except KeyError:
+                pass
+            else:
+                self.hit_count += 1
+                self._key_to_value.move_to_end(key)
+                return value
+        # Don't block other threads while creating the value.
+        value = create()
+        with self._lock:
+            self.miss_count += 1
+            self._key_to_value[key] = value
+            if self.maxsize is not None:
+                while len(self._key_to_value) > self.maxsize:
+                    self._key_to_value.popitem(last=False)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._key_to_value.clear()
+        self.hit_count = 0
+        self.miss_count = 0
+
+
+CODE_CACHE = Cache(diary_interfaces.configurations.CODE_CACHE_SIZE)
+"""Cache of namespaces of already executed entry code."""
+
+IS_SUPPORTED_CACHE = Cache(diary_interfaces.configurations.IS_SUPPORTED_CACHE_SIZE)
+"""Cache of results of :meth:`Entry.is_supported`."""
+
+
+def _fetch_snapshot(connection) -> typing.Optional[bytes]:
+    # Objects are loaded from the state of the database before this
+    # transaction id. It changes when the connection starts a new
+    # transaction, while 'DB.lastTransaction' may already be newer than
+    # the state which the connection sees. ZODB doesn't expose it publicly.
+    return getattr(connection._storage, "_start", None)
+
+
+def _commit_new_tree(session: diary_interfaces.Session):
+    # Inside bulk mode the new tree is committed together with the entries.
+    if session.bulk_report is None:
+        session.commit()
+
+
+def _fetch_tree_tuple(
+    session: diary_interfaces.Session,
+    name_tuple: tuple[str, ...],
+    build: typing.Callable[[], tuple[typing.Any, ...]],
+) -> tuple[typing.Any, ...]:
+    # Fetch trees from the root of the database or build and store
+    # them if they are missing.
+    root = session.root
     try:
-        return diary_interfaces.configurations.ROOT.entry_tree
-    except AttributeError as e:
-        if diary_interfaces.configurations.ROOT is not None:
-            diary_interfaces.configurations.ROOT.entry_tree = OOBTree()
-            transaction.commit()
-        else:
-            raise e
-        return fetch_entry_tree()
+        return tuple(getattr(root, name) for name in name_tuple)
+    except AttributeError:
+        pass
+    if session.read_only:
+        # Read-only databases can't store the trees, so they are only
+        # kept in memory for the snapshot of the connection which built
+        # them (the database can still change, e.g. via ZEO).
+        snapshot = _fetch_snapshot(session.connection)
+        key = (name_tuple, snapshot)
+        with session._lock:
+            try:
+                return session._volatile_tree_dict[key]
+            except KeyError:
+                pass
+        tree_tuple = build()
+        if snapshot is not None:
+            with session._lock:
+                # Connections with older snapshots build their own trees.
+                for other_key in tuple(session._volatile_tree_dict):
+                    if other_key[0] == name_tuple and other_key[1] < snapshot:
+                        del session._volatile_tree_dict[other_key]
+                session._volatile_tree_dict[key] = tree_tuple
+        return tree_tuple
+    tree_tuple = build()
+    for name, tree in zip(name_tuple, tree_tuple):
+        setattr(root, name, tree)
+    _commit_new_tree(session)
+    return tree_tuple
 
 
-def fetch_wrapped_entry_tree() -> diary_interfaces.qwrap:
-    return diary_interfaces.qwrap(fetch_entry_tree())
+def fetch_entry_tree(
+    session: typing.Optional[diary_interfaces.Session] = None,
+) -> OOBTree:
+    session = diary_interfaces.fetch_session(session)
+    return _fetch_tree_tuple(session, ("entry_tree",), lambda: (OOBTree(),))[0]
 
 
-def execute(name: str, code: str, function_name: str, *args, **kwargs):
-    exec(code, locals())
+def fetch_index_tree(
+    session: typing.Optional[diary_interfaces.Session] = None,
+) -> OOBTree:
+    """Fetch secondary index of the entry tree.
+
+    The index is a nested tree with the structure
+
+        context_identifier -> return_type -> entry_identifier -> paths
+
+    It is updated by :meth:`Entry.commit`. If the database doesn't
+    have an index yet, it is build from the paths of the entry tree.
+    """
+    session = diary_interfaces.fetch_session(session)
+
+    def build() -> tuple[OOBTree]:
+        index_tree = OOBTree()
+        for path in fetch_entry_tree(session).keys():
+            _index_path(index_tree, path)
+        return (index_tree,)
+
+    return _fetch_tree_tuple(session, ("index_tree",), build)[0]
+
+
+def index_path(
+    path: diary_interfaces.EntryPath,
+    session: typing.Optional[diary_interfaces.Session] = None,
+):
+    """Add path to secondary index of the entry tree."""
+    _index_path(fetch_index_tree(session), path)
+
+
+def _index_path(tree: OOBTree, path: diary_interfaces.EntryPath):
+    for key in (path.context_identifier, path.return_type):
+        try:
+            tree = tree[key]
+        except KeyError:
+            tree[key] = tree = OOBTree()
     try:
-        function = locals()[function_name]
+        path_set = tree[path.entry_identifier]
+    except KeyError:
+        tree[path.entry_identifier] = path_set = OOTreeSet()
+    path_set.insert(path)
+
+
+def unindex_path(
+    path: diary_interfaces.EntryPath,
+    session: typing.Optional[diary_interfaces.Session] = None,
+):
+    """Remove path from secondary index of the entry tree."""
+    tree_list = [fetch_index_tree(session)]
+    try:
+        for key in (path.context_identifier, path.return_type):
+            tree_list.append(tree_list[-1][key])
+        path_set = tree_list[-1][path.entry_identifier]
+        path_set.remove(path)
+    except KeyError:
+        return
+    # Cleanup empty branches
+    key_list = [path.context_identifier, path.return_type, path.entry_identifier]
+    tree_list.append(path_set)
+    while len(tree_list) > 1 and not tree_list[-1]:
+        tree_list.pop()
+        del tree_list[-1][key_list.pop()]
+
+
+def remove_entry(
+    path: diary_interfaces.EntryPath,
+    session: typing.Optional[diary_interfaces.Session] = None,
+):
+    """Remove entry from the database.
+
+    :param path: The path of the entry. Can also be a plain string.
+    :raises KeyError: If no entry with the given path exists.
+    """
+    session = diary_interfaces.fetch_session(session)
+    entry_tree = fetch_entry_tree(session)
+    # Use stored key, because plain strings lack the path components.
+    try:
+        path = next(iter(entry_tree.keys(min=path, max=path)))
+    except StopIteration:
+        raise KeyError(path)
+    del entry_tree[path]
+    diary_interfaces.fetch_dependency_tree(session).pop(path, None)
+    unindex_path(path, session)
+    diary_interfaces.uncatalog_path(path, session)
+    diary_interfaces.undigest_path(path, session)
+    if session.bulk_report is None:
+        session.commit()
+
+
+def fetch_entry_size_tuple(
+    session: typing.Optional[diary_interfaces.Session] = None,
+) -> tuple[tuple[diary_interfaces.EntryPath, int], ...]:
+    """Find how many bytes each entry needs in the storage.
+
+    :return: Pairs of entry path and size of the stored state of
+        the entry, sorted from the largest to the smallest entry.
+
+    Entries aren't loaded, only their stored records are read.
+    """
+    session = diary_interfaces.fetch_session(session)
+    path_and_size_list = []
+    for path, entry in fetch_entry_tree(session).items():
+        if (oid := entry._p_oid) is None:  # Not committed yet
+            continue
+        data, _ = session.storage.load(oid)
+        path_and_size_list.append((path, len(data)))
+    return tuple(sorted(path_and_size_list, key=lambda item: item[1], reverse=True))
+
+
+def fetch_wrapped_entry_tree(
+    lazy: bool = True,
+    live: bool = False,
+    session: typing.Optional[diary_interfaces.Session] = None,
+) -> diary_interfaces.qwrap:
+    """Wrap entry tree to query entries.
+
+    :param lazy: Iterate over the entry tree without copying all
+        paths first (see :class:`qwrap`).
+    :param live: Create long-lived wrapper which refreshes its cached
+        paths if the database changed (see :class:`qwrap`).
+    :param session: The session of the database. Defaults to the
+        session opened by :func:`open`.
+    """
+    return diary_interfaces.qwrap(
+        fetch_entry_tree(session),
+        index_tree=fetch_index_tree(session),
+        catalog_tree=diary_interfaces.fetch_catalog_tree(session),
+        lazy=lazy,
+        live=live,
+    )
+
+
+def fetch_namespace(code: str) -> dict[str, typing.Any]:
+    """Get namespace which is created when executing code.
+
+    The code is only compiled and executed once for each code version,
+    afterwards the namespace is fetched from :const:`CODE_CACHE`.
+    """
+
+    def create() -> dict[str, typing.Any]:
+        namespace = {}
+        exec(compile(code, "<diary-entry>", "exec"), namespace)
+        return namespace
+
+    return CODE_CACHE.fetch(hashlib.md5(code.encode()).hexdigest(), create)
+
+
+def fetch_function(code: str, function_name: str) -> typing.Callable:
+    try:
+        return fetch_namespace(code)[function_name]
     # Imitate builtin error message
     except KeyError:
         raise NameError(f"name '{function_name}' is not defined")
+
+
+def fetch_keyword_set(
+    name: str, code: str, function_name: str
+) -> typing.Optional[frozenset[str]]:
+    """Get names of keyword arguments which an entry function accepts.
+
+    Returns ``None`` if the function accepts any keyword argument. Like
+    :func:`execute`, the code is only executed in a worker if an
+    :class:`ExecutionPool` is active.
+
+    :raises NameError: If the function isn't defined.
+    """
+    if (execution_pool := diary_interfaces.fetch_execution_pool()) is not None:
+        return execution_pool.fetch_keyword_set(name, code, function_name)
+    return _fetch_keyword_set(fetch_function(code, function_name))
+
+
+@functools.lru_cache(maxsize=diary_interfaces.configurations.CODE_CACHE_SIZE)
+def _fetch_keyword_set(function: typing.Callable) -> typing.Optional[frozenset[str]]:
+    keyword_list = []
+    for parameter in inspect.signature(function).parameters.values():
+        if parameter.kind is inspect.Parameter.VAR_KEYWORD:
+            return None
+        elif parameter.kind is not inspect.Parameter.POSITIONAL_ONLY:
+            keyword_list.append(parameter.name)
+    return frozenset(keyword_list)
+
+
+def execute(name: str, code: str, function_name: str, *args, **kwargs):
+    if (execution_pool := diary_interfaces.fetch_execution_pool()) is not None:
+        return execution_pool.execute(name, code, function_name, *args, **kwargs)
+    function = fetch_function(code, function_name)
     try:
         return function(*args, **kwargs)
     except Exception as e:
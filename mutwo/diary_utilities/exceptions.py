@@ -1,5 +1,40 @@
-__all__ = ("ExecutionError",)
+__all__ = (
+    "ExecutionError",
+    "DependencyCycleError",
+    "NoSessionError",
+    "EntryHashError",
+    "DaemonError",
+)
 
 
 class ExecutionError(Exception):
     ...
+
+
+class DependencyCycleError(Exception):
+    def __init__(self, path_tuple: tuple[str, ...]):
+        self.path_tuple = path_tuple
+        super().__init__(
+            f"Found circular requirements between entries: {' -> '.join(path_tuple)}"
+        )
+
+
+class NoSessionError(Exception):
+    def __init__(self):
+        super().__init__(
+            "No diary is open. Use 'diary_interfaces.open()' or pass a session."
+        )
+
+
+class EntryHashError(Exception):
+    def __init__(self, path: str, expected_hash: str, hash: str):
+        self.path = path
+        self.expected_hash = expected_hash
+        self.hash = hash
+        super().__init__(
+            f"Entry '{path}' has hash '{hash}', but expected '{expected_hash}'."
+        )
+
+
+class DaemonError(Exception):
+    ...
@@ -10,7 +10,7 @@ VERSION = version["VERSION"]
 with open("README.md", "r", encoding="utf-8") as fh:
     long_description = fh.read()
 
-extras_require = {"testing": ["pytest>=7.1.1"]}
+extras_require = {"testing": ["pytest>=7.1.1"], "zeo": ["ZEO>=5.2.0, <7.0.0"]}
 
 setuptools.setup(
     name="mutwo.diary",
@@ -35,5 +35,10 @@ setuptools.setup(
         "numpy>=1.18, <2.00",
     ],
     extras_require=extras_require,
+    entry_points={
+        "console_scripts": [
+            "mutwo-diary-daemon = mutwo.diary_converters.daemons:main"
+        ]
+    },
     python_requires=">=3.10, <4",
 )
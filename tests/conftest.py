@@ -0,0 +1,18 @@
+import pytest
+
+from mutwo import diary_interfaces
+
+
+def get_entry_tree_values():
+    with diary_interfaces.open():
+        return diary_interfaces.fetch_entry_tree().values()
+
+
+@pytest.fixture
+def entry_tree_fixture(tmpdir):
+    storage_path = f"{tmpdir}/test.fs"
+    default_storage_path = diary_interfaces.configurations.DEFAULT_STORAGE_PATH
+    diary_interfaces.configurations.DEFAULT_STORAGE_PATH = storage_path
+    get_entry_tree_values()
+    yield None
+    diary_interfaces.configurations.DEFAULT_STORAGE_PATH = default_storage_path
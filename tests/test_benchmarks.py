@@ -0,0 +1,23 @@
+import importlib.util
+import os
+
+BENCHMARK_PATH = os.path.join(
+    os.path.dirname(__file__), os.pardir, "benchmarks", "benchmark_diary.py"
+)
+
+
+def test_benchmark_diary():
+    spec = importlib.util.spec_from_file_location("benchmark_diary", BENCHMARK_PATH)
+    benchmark_diary = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(benchmark_diary)
+    result_list = benchmark_diary.run(20, trace_memory=False, context_count=2)
+    assert [result.benchmark for result in result_list] == [
+        "commit",
+        "rquery_index",
+        "rquery_scan",
+        "fquery",
+        "cquery",
+        "execute",
+        "convert",
+    ]
+    assert all(result.operations_per_second > 0 for result in result_list)
@@ -9,3 +9,18 @@ def test_context():
     assert NewContext.name == "new"
     assert NewContext.version == 0
     assert NewContext.identifier == diary_interfaces.ContextIdentifier("new", 0)
+
+
+def test_identifier_index():
+    class IndexContext(diary_interfaces.Context, name="index", version=0):
+        ...
+
+    identifier = diary_interfaces.ContextIdentifier("index", 0)
+    assert identifier.index == IndexContext.identifier_index
+    assert identifier.index == diary_interfaces.fetch_identifier_index("index_0")
+    assert identifier.index != diary_interfaces.ContextIdentifier("index", 1).index
+    assert {identifier: 1}[IndexContext.identifier] == 1
+
+    # Loaded identifiers lost their volatile index.
+    del identifier._v_index
+    assert identifier == IndexContext.identifier
@@ -0,0 +1,343 @@
+import dataclasses
+import itertools
+import os
+import stat
+import threading
+
+import numpy as np
+import pytest
+
+from mutwo import core_utilities
+from mutwo import diary_converters
+from mutwo import diary_interfaces
+from mutwo import diary_utilities
+from mutwo import timeline_interfaces
+
+
+@dataclasses.dataclass(frozen=True)
+class CContext(diary_interfaces.Context, name="converter", version=0):
+    start: int
+
+
+CODE = """
+from mutwo import core_events
+from mutwo import timeline_interfaces
+
+def is_supported(context, **kwargs):
+    return context.start % {modulo} == 0
+
+def main(context, **kwargs):
+    return timeline_interfaces.EventPlacement(
+        core_events.Concurrence([core_events.Chronon({duration})]),
+        context.start,
+        context.start + {duration},
+    )
+"""
+
+
+def add_entries():
+    for index, (modulo, relevance) in enumerate(((1, 1), (2, 3), (3, 10))):
+        diary_interfaces.DynamicEntry(
+            f"e{index}",
+            CContext.identifier,
+            timeline_interfaces.EventPlacement,
+            relevance=relevance,
+            code=CODE.format(modulo=modulo, duration=index + 1),
+            skip_check=False,
+        )
+
+
+def convert(**kwargs):
+    context_tuple = tuple(CContext(start) for start in range(60))
+    event_placement_tuple = diary_converters.ContextTupleToEventPlacementTuple(
+        **kwargs
+    ).convert(context_tuple)
+    return tuple(
+        (
+            float(event_placement.start_or_start_range),
+            float(event_placement.end_or_end_range),
+        )
+        for event_placement in event_placement_tuple
+    )
+
+
+def test_convert(entry_tree_fixture):
+    with diary_interfaces.open():
+        add_entries()
+        sequential = convert(random_seed=3)
+        assert len(sequential) == 60
+        # Different entries are picked
+        assert len(set(end - start for start, end in sequential)) == 3
+        assert convert(random_seed=3) == sequential
+        assert convert(random_seed=3, process_count=2) == sequential
+
+
+RANDOM_CODE = """
+from mutwo import core_events
+from mutwo import timeline_interfaces
+
+def main(context, {argument}random):
+    duration = int(random.integers(1, 100)){addition}
+    return timeline_interfaces.EventPlacement(
+        core_events.Concurrence([core_events.Chronon(duration)]),
+        context.start,
+        context.start + duration,
+    )
+"""
+
+
+def test_convert_state(entry_tree_fixture):
+    with diary_interfaces.open():
+        r0 = diary_interfaces.DynamicEntry(
+            "r0",
+            CContext.identifier,
+            timeline_interfaces.EventPlacement,
+            code=RANDOM_CODE.format(argument="", addition=""),
+            skip_check=False,
+        )
+        r1, r2 = (
+            diary_interfaces.DynamicEntry(
+                f"r{random_seed}",
+                CContext.identifier,
+                timeline_interfaces.EventPlacement,
+                abbreviation_to_path_dict=abbreviation_to_path_dict,
+                code=RANDOM_CODE.format(argument=argument, addition=addition),
+                random_seed=random_seed,
+                skip_check=False,
+            )
+            for random_seed, abbreviation_to_path_dict, argument, addition in (
+                # Calls of 'r1' change the random generator of 'r0'.
+                (1, {"r0": r0.path}, "r0, ", " + int(r0(context).duration)"),
+                (2, {}, "", ""),
+            )
+        )
+        sequential = convert(random_seed=3)
+        assert len(set(sequential)) > 50
+    # Start with new states in both modes.
+    with diary_interfaces.open():
+        assert convert(random_seed=3, process_count=2) == sequential
+
+        # Only states which are used are sent to workers.
+        assert tuple(r0._fetch_call_state()) == ("random",)
+        # Only calls of entries with states are grouped.
+        s = diary_interfaces.DynamicEntry(
+            "s",
+            CContext.identifier,
+            timeline_interfaces.EventPlacement,
+            code="def main(context): ...",
+            skip_check=False,
+        )
+        assert not s._fetch_call_state()
+        path_and_context_list = [
+            (path, CContext(index))
+            for index, path in enumerate((r1.path, r2.path, s.path, r0.path, s.path))
+        ]
+        assert [
+            (path_tuple, [index for index, _ in index_and_context_list])
+            for path_tuple, index_and_context_list in (
+                diary_converters.ContextTupleToEventPlacementTuple()._group_call(
+                    path_and_context_list, diary_interfaces.fetch_entry_tree()
+                )
+            )
+        ] == [
+            (tuple(sorted((r0.path, r1.path))), [0, 3]),
+            ((r2.path,), [1]),
+            ((), [2]),
+            ((), [4]),
+        ]
+
+
+def test_convert_iter(entry_tree_fixture, monkeypatch):
+    def to_float_tuple(event_placement_iterable):
+        return tuple(
+            (
+                float(event_placement.start_or_start_range),
+                float(event_placement.end_or_end_range),
+            )
+            for event_placement in event_placement_iterable
+        )
+
+    with diary_interfaces.open():
+        add_entries()
+        sequential = convert(random_seed=3)
+        event_placement_iterator = diary_converters.ContextTupleToEventPlacementTuple(
+            random_seed=3
+        ).convert_iter(CContext(start) for start in range(60))
+        assert to_float_tuple(itertools.islice(event_placement_iterator, 5)) == (
+            sequential[:5]
+        )
+        assert to_float_tuple(event_placement_iterator) == sequential[5:]
+
+        # Samples of chunks are equal to samples of the complete tuple.
+        monkeypatch.setattr(diary_converters.configurations, "STREAM_CHUNK_SIZE", 7)
+        assert convert(random_seed=3, process_count=2) == sequential
+
+
+def test_render_cache(entry_tree_fixture, tmpdir):
+    with diary_interfaces.open(), diary_interfaces.RenderCache(
+        f"{tmpdir}/render-cache.fs", commit_interval=100
+    ) as render_cache:
+        add_entries()
+        sequential = convert(random_seed=3)
+        last_transaction = render_cache._database.lastTransaction()
+        assert convert(random_seed=3, render_cache=render_cache) == sequential
+        assert render_cache.miss_count == 60
+        # Outputs are committed in batches
+        assert render_cache._database.lastTransaction() == last_transaction
+        assert convert(random_seed=3, render_cache=render_cache) == sequential
+        assert render_cache.hit_count == 60
+        assert render_cache.size > 0
+
+        render_cache.maxsize = render_cache.size // 2
+        convert(random_seed=4, render_cache=render_cache)
+        assert render_cache.size <= render_cache.maxsize
+
+
+def test_render_cache_state(entry_tree_fixture, tmpdir):
+    code = "def main(context, random, **kwargs): return random.random()"
+    with diary_interfaces.open(), diary_interfaces.RenderCache(
+        f"{tmpdir}/render-cache.fs"
+    ) as render_cache:
+        entry = diary_interfaces.DynamicEntry(
+            "r", CContext.identifier, float, code=code, skip_check=False
+        )
+        context = CContext(0)
+        state = entry._fetch_state()
+        value_tuple = tuple(render_cache.call(entry, context) for _ in range(3))
+        assert len(set(value_tuple)) == 3
+        entry._restore_state(state)
+        assert tuple(render_cache.call(entry, context) for _ in range(3)) == value_tuple
+        assert render_cache.hit_count == 3
+        # State is also restored after cache hit
+        assert entry(context) not in value_tuple
+
+
+def test_stats(entry_tree_fixture, tmpdir):
+    stats = diary_converters.StatsCollector(profile=True)
+    with diary_interfaces.open():
+        add_entries()
+        assert convert(stats=stats) == convert()
+    (rquery_stat,) = stats.stat_tuple("rquery")
+    assert rquery_stat.count == 1
+    assert len(stats.stat_tuple("is_supported")) == 3
+    assert all(stat.count == 60 for stat in stats.stat_tuple("is_supported"))
+    assert stats.stat_tuple("pick")[0].count == 60
+    assert sum(stat.count for stat in stats.stat_tuple("call")) == 60
+    assert len(stats.summary()) == 4
+    assert stats.summary(by="context_identifier")[0][2] == 1 + 3 * 60 + 60 + 60
+    assert "is_supported" in stats.format_summary()
+    assert stats.profile.getstats()
+
+    with pytest.raises(ZeroDivisionError):
+        with stats.measure("call", "c", "p"):
+            1 / 0
+    (stat,) = (stat for stat in stats.stat_tuple("call") if stat.path == "p")
+    assert (stat.path, stat.exception_count) == ("p", 1)
+
+    path = f"{tmpdir}/stacks.txt"
+    stats.write_collapsed_stacks(path)
+    with open(path) as file:
+        line_tuple = tuple(file)
+    assert len(line_tuple) == len(stats)
+    assert any(line.startswith("c;call;p ") for line in line_tuple)
+
+    with pytest.raises(ValueError):
+        diary_converters.ContextTupleToEventPlacementTuple(process_count=2, stats=stats)
+
+
+def test_daemon(entry_tree_fixture, tmpdir):
+    with diary_interfaces.open():
+        add_entries()
+        sequential = convert(random_seed=3)
+    socket_path = f"{tmpdir}/diary.sock"
+    session = diary_interfaces.Session(
+        diary_interfaces.create_storage(
+            diary_interfaces.configurations.DEFAULT_STORAGE_PATH
+        )
+    )
+    # Other files aren't replaced by the socket.
+    file_path = tmpdir.join("diary.txt")
+    file_path.write("")
+    with pytest.raises(diary_utilities.DaemonError):
+        diary_converters.DiaryServer(session, str(file_path)).run()
+    assert file_path.exists()
+    server = diary_converters.DiaryServer(session, socket_path, thread_count=2)
+    thread = threading.Thread(target=server.run)
+    thread.start()
+    assert server.ready.wait(5)
+    try:
+        assert stat.S_IMODE(os.stat(socket_path).st_mode) == 0o600
+        with diary_converters.DiaryClient(socket_path) as client:
+            assert client.ping() == "pong"
+            assert len(client.rquery(context_identifier="converter")) == 3
+            context_tuple = tuple(CContext(start) for start in range(60))
+            for _ in range(2):
+                event_placement_tuple = client.convert(context_tuple, random_seed=3)
+                assert len(event_placement_tuple) == len(sequential)
+                assert tuple(
+                    float(event_placement.end_or_end_range)
+                    for event_placement in event_placement_tuple
+                ) == tuple(end for _, end in sequential)
+            with pytest.raises(TypeError):
+                client.convert(context_tuple, unknown=1)
+            # Connection is still usable after errors
+            client.shutdown()
+        thread.join(5)
+        assert not thread.is_alive()
+    finally:
+        server.stop()
+        thread.join()
+        session.close()
+
+
+def test_execution_pool(entry_tree_fixture):
+    code = """
+def is_supported(context, **kwargs):
+    while context.start == 0:
+        pass
+    return True
+
+def main(context, **kwargs):
+    raise ValueError()
+"""
+    with diary_interfaces.open():
+        add_entries()
+        diary_interfaces.DynamicEntry(
+            "broken",
+            CContext.identifier,
+            timeline_interfaces.EventPlacement,
+            relevance=1000,
+            code=code,
+            skip_check=False,
+        )
+        with diary_interfaces.ExecutionPool(process_count=2, timeout=3) as pool:
+            # Broken entry is picked nearly always and skipped
+            assert len(convert(execution_pool=pool)) < 10
+            assert diary_interfaces.fetch_execution_pool() is None
+        with pytest.raises(ValueError):
+            diary_converters.ContextTupleToEventPlacementTuple(
+                process_count=2, execution_pool=pool
+            )
+
+
+def test_weighted_sampler():
+    weight_random = np.random.default_rng(1)
+    for weight_tuple in (
+        (1,),
+        (0, 0, 0),
+        (1, 0, 3),
+        tuple(weight_random.integers(0, 10, 50)),
+        tuple(weight_random.random(7)),
+    ):
+        item_tuple = tuple(range(len(weight_tuple)))
+        sampler = diary_converters.WeightedSampler(item_tuple, weight_tuple)
+        choice_random, pick_random, pick_many_random = (
+            np.random.default_rng(5) for _ in range(3)
+        )
+        p = core_utilities.scale_sequence_to_sum(weight_tuple, 1)
+        choice_tuple = tuple(choice_random.choice(item_tuple, p=p) for _ in range(100))
+        assert tuple(sampler.pick(pick_random) for _ in range(100)) == choice_tuple
+        assert sampler.pick_many(pick_many_random, 100) == choice_tuple
+
+    with pytest.raises(ValueError):
+        diary_converters.WeightedSampler((1, 2), (-1, 3))
@@ -0,0 +1,82 @@
+import dataclasses
+
+import pytest
+
+from mutwo import diary_interfaces
+from mutwo import diary_utilities
+
+
+@dataclasses.dataclass(frozen=True)
+class DContext(diary_interfaces.Context, name="dependency", version=0):
+    ...
+
+
+def add_entry(name: str, **abbreviation_to_name):
+    return diary_interfaces.DynamicEntry(
+        name,
+        DContext.identifier,
+        int,
+        code="def main(context, **kwargs): 1",
+        abbreviation_to_path_dict={
+            abbreviation: diary_interfaces.EntryPath(
+                str(DContext.identifier), "DynamicEntry", "int", dependency_name
+            )
+            for abbreviation, dependency_name in abbreviation_to_name.items()
+        },
+        skip_check=False,
+    )
+
+
+def test_topological_sort():
+    graph = diary_interfaces.DependencyGraph(
+        {"a": ("b", "c"), "b": ("c",), "c": (), "d": ("a",)}
+    )
+    assert graph.topological_sort() == ("c", "b", "a", "d")
+    assert graph.closure(("b",)) == ("c", "b")
+    assert graph.find_cycle() is None
+
+    # Entry paths of the dependency tree and plain strings are the same paths.
+    a, b, c = (
+        diary_interfaces.EntryPath("dependency_0", "Entry", "int", name)
+        for name in "abc"
+    )
+    graph = diary_interfaces.DependencyGraph({a: (b, str(c)), b: (c,), c: ()})
+    assert graph.closure((str(a),)) == (str(c), str(b), str(a))
+    assert all(type(path) is str for path in graph.closure((a,)))
+    assert graph.find_cycle() is None
+
+    graph = diary_interfaces.DependencyGraph({"a": ("b",), "b": ("c",), "c": ("a",)})
+    assert graph.find_cycle() == ("a", "b", "c", "a")
+    with pytest.raises(diary_utilities.DependencyCycleError):
+        graph.closure(("b",))
+
+
+def test_dependency_tree(entry_tree_fixture, monkeypatch):
+    with diary_interfaces.open():
+        c = add_entry("c")
+        b = add_entry("b", c="c")
+        a = add_entry("a", b="b", c="c")
+        dependency_tree = diary_interfaces.fetch_dependency_tree()
+        assert dependency_tree[a.path] == (b.path, c.path)
+        assert diary_interfaces.DependencyGraph.from_diary().closure((a.path,)) == (
+            c.path,
+            b.path,
+            a.path,
+        )
+
+        # File storages can't prefetch, so we record which records
+        # would be loaded.
+        prefetched_oid_list = []
+        monkeypatch.setattr(
+            diary_interfaces.configurations.STORAGE,
+            "prefetch",
+            lambda oid_iterable, tid: prefetched_oid_list.extend(oid_iterable),
+            raising=False,
+        )
+        diary_interfaces.prefetch((a.path,))
+        assert prefetched_oid_list == [entry._p_oid for entry in (c, b, a)]
+
+        # 'c' can't require 'a', because 'a' already requires 'c'.
+        with pytest.raises(diary_utilities.DependencyCycleError):
+            add_entry("c", a="a")
+        assert dependency_tree[c.path] == ()
@@ -0,0 +1,92 @@
+import dataclasses
+
+from ZODB.MappingStorage import MappingStorage
+
+from mutwo import diary_interfaces
+
+
+@dataclasses.dataclass(frozen=True)
+class DContext(diary_interfaces.Context, name="digest", version=0):
+    ...
+
+
+@dataclasses.dataclass(frozen=True)
+class D2Context(diary_interfaces.Context, name="digest2", version=0):
+    ...
+
+
+def add_entry(session, name, context=DContext, return_type=int, **kwargs):
+    kwargs.setdefault("skip_check", False)
+    return diary_interfaces.DynamicEntry(
+        name,
+        context.identifier,
+        return_type,
+        code="def main(context): ...",
+        session=session,
+        **kwargs,
+    )
+
+
+def test_digest():
+    session = diary_interfaces.Session(MappingStorage())
+    assert diary_interfaces.fetch_digest(session=session) == 0
+    a = add_entry(session, "a")
+    b = add_entry(session, "b", return_type=str)
+    entry_digest_tree = diary_interfaces.fetch_entry_digest_tree(session)
+    a_digest, b_digest = entry_digest_tree[a.path], entry_digest_tree[b.path]
+    assert diary_interfaces.fetch_digest(session=session) == a_digest ^ b_digest
+    assert diary_interfaces.fetch_digest("digest_0/int", session) == a_digest
+    # Arguments which aren't part of the hash change the digest, too.
+    for kwargs in (dict(memoize=False), dict(state_count=3)):
+        changed_a = add_entry(session, "a", **kwargs)
+        assert changed_a.hash == a.hash
+        assert entry_digest_tree[a.path] != a_digest
+    diary_interfaces.remove_entry(a.path, session)
+    assert diary_interfaces.fetch_digest("digest_0", session) == b_digest
+    assert "digest_0/int" not in diary_interfaces.fetch_digest_tree(session)
+    session.close()
+
+
+def test_sync_sessions():
+    source, target = (diary_interfaces.Session(MappingStorage()) for _ in range(2))
+    for name in "abc":
+        for context in (DContext, D2Context):
+            add_entry(source, name, context)
+    add_entry(target, "a", relevance=2)
+    add_entry(target, "z", D2Context)
+
+    digest_diff = diary_interfaces.diff_sessions(source, target)
+    assert [path.name for path in digest_diff.added_path_tuple] == list("abcbc")
+    assert [path.name for path in digest_diff.changed_path_tuple] == ["a"]
+    assert [path.name for path in digest_diff.removed_path_tuple] == ["z"]
+
+    assert diary_interfaces.sync_sessions(source, target) == digest_diff
+    digest_diff = diary_interfaces.diff_sessions(source, target)
+    assert not digest_diff.added_path_tuple and not digest_diff.changed_path_tuple
+    diary_interfaces.sync_sessions(source, target, remove=True)
+    assert not diary_interfaces.diff_sessions(source, target)
+    add_entry(target, "b", state_count=3)
+    digest_diff = diary_interfaces.diff_sessions(source, target)
+    assert [path.name for path in digest_diff.changed_path_tuple] == ["b"]
+    diary_interfaces.sync_sessions(source, target)
+    assert not diary_interfaces.diff_sessions(source, target)
+    assert diary_interfaces.fetch_digest(session=source) == (
+        diary_interfaces.fetch_digest(session=target)
+    )
+    # Copied entries are complete and indexed
+    assert (
+        len(
+            tuple(
+                diary_interfaces.fetch_wrapped_entry_tree(session=target).rquery(
+                    context_identifier="digest2"
+                )
+            )
+        )
+        == 3
+    )
+    entry = diary_interfaces.fetch_entry_tree(target)[
+        add_entry(source, "a", skip_check=True).path
+    ]
+    assert entry.relevance == 0 and entry.code == "def main(context): ..."
+    for session in (source, target):
+        session.close()
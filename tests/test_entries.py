@@ -1,30 +1,19 @@
 import dataclasses
+import pickle
 
+import numpy as np
 import pytest
 
 from mutwo import diary_interfaces
 
+from .conftest import get_entry_tree_values
+
 
 @dataclasses.dataclass(frozen=True)
 class TContext(diary_interfaces.Context, name="test", version=0):
     data: int
 
 
-def get_entry_tree_values():
-    with diary_interfaces.open():
-        return diary_interfaces.fetch_entry_tree().values()
-
-
-@pytest.fixture
-def entry_tree_fixture(tmpdir):
-    storage_path = f"{tmpdir}/test.fs"
-    default_storage_path = diary_interfaces.configurations.DEFAULT_STORAGE_PATH
-    diary_interfaces.configurations.DEFAULT_STORAGE_PATH = storage_path
-    get_entry_tree_values()
-    yield None
-    diary_interfaces.configurations.DEFAULT_STORAGE_PATH = default_storage_path
-
-
 def test_persistent_entry(entry_tree_fixture):
     """Ensure new entry is commited to db
     + reinitialsing object doesn't create new entry in db
@@ -45,3 +34,131 @@ def test_persistent_entry(entry_tree_fixture):
 
 def test_apply_change_to_entry(entry_tree_fixture):
     ...
+
+
+def test_bulk(entry_tree_fixture):
+    def initialise_entries(code: str = "def main(context): 100"):
+        with diary_interfaces.open():
+            with diary_interfaces.bulk() as report:
+                diary_interfaces.DynamicEntry(
+                    "a", TContext.identifier, int, code=code, skip_check=False
+                )
+                diary_interfaces.DynamicEntry(
+                    "b", TContext.identifier, int, code="", skip_check=False
+                )
+        return report
+
+    assert initialise_entries() == diary_interfaces.BulkReport(2, 0, 0)
+    assert len(get_entry_tree_values()) == 2
+    assert initialise_entries() == diary_interfaces.BulkReport(0, 0, 2)
+    assert initialise_entries("def main(context): 1") == diary_interfaces.BulkReport(
+        0, 1, 1
+    )
+    assert len(get_entry_tree_values()) == 2
+
+
+def test_bulk_abort(entry_tree_fixture):
+    with diary_interfaces.open():
+        try:
+            with diary_interfaces.bulk():
+                diary_interfaces.DynamicEntry(
+                    "a", TContext.identifier, int, code="", skip_check=False
+                )
+                raise ValueError()
+        except ValueError:
+            pass
+    assert len(get_entry_tree_values()) == 0
+
+
+def test_memoize_is_supported(entry_tree_fixture):
+    code = "import itertools\nc = itertools.count()\ndef is_supported(context): return next(c) < 1"
+    with diary_interfaces.open():
+        memoized, not_memoized = (
+            diary_interfaces.DynamicEntry(
+                name,
+                TContext.identifier,
+                int,
+                code=code + f"  # {name}",
+                memoize=memoize,
+                skip_check=False,
+            )
+            for name, memoize in (("m", True), ("n", False))
+        )
+        assert memoized.is_supported(TContext(1))
+        assert memoized.is_supported(TContext(1))
+        assert not memoized.is_supported(TContext(2))
+        assert not_memoized.is_supported(TContext(1))
+        assert not not_memoized.is_supported(TContext(1))
+
+
+def test_cached_properties_not_stored(entry_tree_fixture):
+    with diary_interfaces.open():
+        entry = diary_interfaces.DynamicEntry(
+            "c",
+            TContext.identifier,
+            int,
+            code="def main(context, random): return random.random()",
+            skip_check=False,
+        )
+        entry.random_tuple, entry.activity_level_tuple, entry.hash
+        assert "_index_to_random" in entry.__dict__
+        state = entry.__getstate__()
+        assert "_code" in state
+        for name in ("_index_to_random", "_index_to_activity_level", "hash", "path"):
+            assert name not in state
+
+        ((path, size),) = diary_interfaces.fetch_entry_size_tuple()
+        assert path == entry.path
+        assert 0 < size < 1000
+
+        # State of entries which were stored by older versions
+        legacy_state = dict(
+            state,
+            random_tuple=tuple(np.random.default_rng(i) for i in range(3)),
+            activity_level_tuple=(diary_interfaces.ActivityLevel(),),
+            hash=entry.hash,
+            path=entry.path,
+        )
+        legacy_entry = diary_interfaces.DynamicEntry.__new__(
+            diary_interfaces.DynamicEntry
+        )
+        legacy_entry.__setstate__(legacy_state)
+        assert legacy_entry.__getstate__() == state
+        assert legacy_entry.random_tuple[0] is legacy_entry.fetch_random(0)
+
+
+def test_lazy_random(entry_tree_fixture):
+    with diary_interfaces.open():
+        entry = diary_interfaces.DynamicEntry(
+            "l",
+            TContext.identifier,
+            float,
+            code="def main(context, random, random2): return random.random()",
+            skip_check=False,
+        )
+        assert entry(TContext(0)) == np.random.default_rng(entry.random_seed).random()
+        # Only requested states are created.
+        assert sorted(entry._index_to_random) == [0, 2]
+        assert not entry._index_to_activity_level
+        # Spawned generators have independent streams.
+        assert len(set(random.random() for random in entry.random_tuple)) == (
+            entry.state_count
+        )
+        with pytest.raises(IndexError):
+            entry.fetch_random(entry.state_count)
+
+
+def test_activity_level_state():
+    activity_level = diary_interfaces.ActivityLevel()
+    for level in (3, 3, 7, 0):
+        activity_level(level)
+    state = activity_level.state
+    assert all(isinstance(position, int) for position in state)
+    value_tuple = tuple(activity_level(level) for level in range(11) for _ in range(40))
+    activity_level.state = state
+    assert value_tuple == tuple(
+        activity_level(level) for level in range(11) for _ in range(40)
+    )
+    copied_activity_level = pickle.loads(pickle.dumps(activity_level))
+    assert copied_activity_level.state == activity_level.state
+    assert copied_activity_level(5) == activity_level(5)
@@ -0,0 +1,90 @@
+import dataclasses
+import hashlib
+
+import pytest
+from ZODB.MappingStorage import MappingStorage
+
+from mutwo import diary_interfaces
+from mutwo import diary_utilities
+
+
+@dataclasses.dataclass(frozen=True)
+class XContext(diary_interfaces.Context, name="executor", version=0):
+    ...
+
+
+CODE = """
+def main(x, **kwargs):
+    if x == "loop":
+        while True:
+            pass
+    elif x == "memory":
+        return bytearray(8 * 1024**3)
+    elif x == "error":
+        raise ValueError()
+    return x + 1
+"""
+
+
+def test_execution_pool():
+    with diary_interfaces.ExecutionPool(
+        process_count=1, timeout=2, memory_limit=4 * 1024**3
+    ) as pool:
+        assert pool.execute("t", CODE, "main", 1) == 2
+        with pytest.raises(NameError):
+            pool.execute("t", CODE, "is_supported", 1)
+        for x in ("loop", "memory", "error"):
+            with pytest.raises(diary_utilities.ExecutionError):
+                pool.execute("t", CODE, "main", x)
+            # Broken workers are replaced
+            assert pool.execute("t", CODE, "main", 2) == 3
+
+        assert diary_interfaces.fetch_execution_pool() is None
+        with pool.activate():
+            assert diary_interfaces.fetch_execution_pool() is pool
+            with pytest.raises(diary_utilities.ExecutionError):
+                diary_interfaces.execute("t", CODE, "main", "loop")
+        assert diary_interfaces.fetch_execution_pool() is None
+
+
+def test_execution_pool_state():
+    code = (
+        "def main(context, random, random1, activity_level):\n"
+        "    return random.random() + random1.random() + activity_level(5)"
+    )
+    session = diary_interfaces.Session(MappingStorage())
+    entry, pooled_entry = (
+        diary_interfaces.DynamicEntry(
+            "r", XContext.identifier, float, code=code, session=session
+        )
+        for _ in range(2)
+    )
+    with diary_interfaces.ExecutionPool(process_count=2) as pool, pool.activate():
+        value_tuple = tuple(pooled_entry(XContext()) for _ in range(10))
+    # Random generators and activity levels advance like in-process
+    assert value_tuple == tuple(entry(XContext()) for _ in range(10))
+    session.close()
+
+
+@pytest.mark.parametrize(
+    ("module_code", "error_type"),
+    (
+        ("import time\ntime.sleep(60)\n", diary_utilities.ExecutionError),
+        ("raise ValueError()\n", ValueError),
+    ),
+)
+def test_execution_pool_module_code(module_code, error_type):
+    code = module_code + "def main(context, random): return random.random()"
+    session = diary_interfaces.Session(MappingStorage())
+    entry = diary_interfaces.DynamicEntry(
+        "m", XContext.identifier, float, code=code, session=session
+    )
+    with diary_interfaces.ExecutionPool(
+        process_count=1, timeout=1
+    ) as pool, pool.activate():
+        with pytest.raises(error_type):
+            entry(XContext())
+    # Code (and the signature of its function) is only inspected by workers.
+    assert hashlib.md5(code.encode()).hexdigest() not in diary_interfaces.CODE_CACHE
+    assert not entry._index_to_random
+    session.close()
@@ -0,0 +1,74 @@
+import dataclasses
+import json
+
+import pytest
+from ZODB.MappingStorage import MappingStorage
+
+from mutwo import diary_interfaces
+from mutwo import diary_utilities
+
+
+@dataclasses.dataclass(frozen=True)
+class EContext(diary_interfaces.Context, name="export", version=0):
+    ...
+
+
+def test_export_import(tmpdir):
+    file_path = str(tmpdir.join("diary.jsonl"))
+    source, target = (diary_interfaces.Session(MappingStorage()) for _ in range(2))
+    a = diary_interfaces.Entry(
+        "a", EContext.identifier, int, comment="x", skip_check=False, session=source
+    )
+    b = diary_interfaces.DynamicEntry(
+        "b",
+        EContext.identifier,
+        str,
+        abbreviation_to_path_dict={"a": a.path},
+        code="def main(context, a): ...",
+        random_seed=3,
+        skip_check=False,
+        session=source,
+    )
+    assert diary_interfaces.export_diary(file_path, source) == 2
+
+    report = diary_interfaces.import_diary(file_path, session=target)
+    assert (report.added_count, report.unchanged_count) == (2, 0)
+    assert not diary_interfaces.diff_sessions(source, target)
+    entry_tree = diary_interfaces.fetch_entry_tree(target)
+    imported_b = entry_tree[b.path]
+    assert type(imported_b) is diary_interfaces.DynamicEntry
+    assert imported_b.code == b.code and imported_b.random_seed == 3
+    assert imported_b.modification_date == b.modification_date
+    assert imported_b.abbreviation_to_entry_dict["a"].comment == "x"
+    assert diary_interfaces.DependencyGraph.from_diary(target).closure(
+        (b.path,)
+    ) == (a.path, b.path)
+
+    # Unchanged entries are skipped
+    report = diary_interfaces.import_diary(file_path, session=target)
+    assert (report.added_count, report.unchanged_count) == (0, 2)
+
+    # Corrupted files are rejected
+    with open(file_path) as file:
+        line_list = file.readlines()
+    record = json.loads(line_list[1])
+    record["argument_dict"]["comment"] = "y"
+    line_list[1] = json.dumps(record) + "\n"
+    with open(file_path, "w") as file:
+        file.writelines(line_list)
+    for session in (source, target):
+        session.close()
+    target = diary_interfaces.Session(MappingStorage())
+    with pytest.raises(diary_utilities.EntryHashError):
+        diary_interfaces.import_diary(file_path, session=target)
+    assert not diary_interfaces.fetch_entry_tree(target)
+
+    # Entries of previous commit intervals are kept
+    line_list[1], line_list[2] = line_list[2], line_list[1]
+    with open(file_path, "w") as file:
+        file.writelines(line_list)
+    with pytest.raises(diary_utilities.EntryHashError):
+        diary_interfaces.import_diary(file_path, commit_interval=1, session=target)
+    target.abort()
+    assert len(diary_interfaces.fetch_entry_tree(target)) == 1
+    target.close()
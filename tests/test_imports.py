@@ -0,0 +1,58 @@
+import importlib
+import json
+import subprocess
+import sys
+
+from mutwo import diary_interfaces
+
+HEAVY_MODULE_TUPLE = (
+    "ZODB",
+    "BTrees",
+    "transaction",
+    "numpy",
+    "mutwo.common_generators",
+)
+
+IMPORT_CODE = f"""
+import dataclasses, json, sys
+from mutwo import diary_interfaces
+imported_module_list = [m for m in {HEAVY_MODULE_TUPLE} if m in sys.modules]
+
+@dataclasses.dataclass(frozen=True)
+class IContext(diary_interfaces.Context, name="import", version=0):
+    ...
+
+diary_interfaces.EntryPath("import_0", "Entry", "int", "a")
+diary_interfaces.DynamicEntry
+print(json.dumps(dict(
+    imported_module_list=imported_module_list,
+    module_list=[m for m in {HEAVY_MODULE_TUPLE} if m in sys.modules],
+)))
+"""
+
+
+def test_lazy_names():
+    for (
+        module_name,
+        name_tuple,
+    ) in diary_interfaces._MODULE_NAME_TO_NAME_TUPLE.items():
+        module = importlib.import_module(f"mutwo.diary_interfaces.{module_name}")
+        assert name_tuple == module.__all__
+        for name in name_tuple:
+            assert getattr(diary_interfaces, name) is getattr(module, name)
+        assert getattr(diary_interfaces, module_name) is module
+
+
+def test_lazy_import():
+    result = json.loads(
+        subprocess.run(
+            [sys.executable, "-c", IMPORT_CODE],
+            capture_output=True,
+            check=True,
+            text=True,
+        ).stdout
+    )
+    # Neither the import nor contexts, paths and entry classes
+    # import the heavy dependencies.
+    assert not result["imported_module_list"]
+    assert not result["module_list"]
@@ -0,0 +1,213 @@
+import dataclasses
+import datetime
+import re
+
+import numpy as np
+import transaction
+
+from mutwo import diary_interfaces
+
+
+def add_entries():
+    # Contexts are defined locally, because their identifiers
+    # are bound to the database in which they are stored first.
+    @dataclasses.dataclass(frozen=True)
+    class AContext(diary_interfaces.Context, name="a", version=0):
+        ...
+
+    @dataclasses.dataclass(frozen=True)
+    class ABContext(diary_interfaces.Context, name="ab", version=0):
+        ...
+
+    @dataclasses.dataclass(frozen=True)
+    class BContext(diary_interfaces.Context, name="b", version=1):
+        ...
+
+    for context in (AContext, ABContext, BContext):
+        for return_type in (int, str):
+            for name in ("x", "y"):
+                diary_interfaces.DynamicEntry(
+                    name,
+                    context.identifier,
+                    return_type,
+                    code="def main(context): ...",
+                    skip_check=False,
+                )
+
+
+def name_tuple(entry_iterable):
+    return tuple(str(entry.path) for entry in entry_iterable)
+
+
+def test_index_tree(entry_tree_fixture):
+    with diary_interfaces.open():
+        add_entries()
+        index_tree = diary_interfaces.fetch_index_tree()
+        assert tuple(index_tree.keys()) == ("a_0", "ab_0", "b_1")
+        assert tuple(index_tree["a_0"].keys()) == ("int", "str")
+        assert len(index_tree["a_0"]["int"]["DynamicEntry"]) == 2
+
+        path = next(iter(index_tree["b_1"]["str"]["DynamicEntry"]))
+        assert isinstance(path, diary_interfaces.EntryPath)
+        diary_interfaces.unindex_path(path)
+        assert len(index_tree["b_1"]["str"]["DynamicEntry"]) == 1
+        diary_interfaces.unindex_path(path)
+        assert len(index_tree["b_1"]["str"]["DynamicEntry"]) == 1
+
+
+def test_rquery(entry_tree_fixture):
+    with diary_interfaces.open():
+        add_entries()
+        indexed = diary_interfaces.fetch_wrapped_entry_tree()
+        unindexed = diary_interfaces.qwrap(diary_interfaces.fetch_entry_tree())
+        for kwargs in (
+            dict(context_identifier="a"),
+            dict(context_identifier="a_0$"),
+            dict(context_identifier="a_0|b", return_type="str"),
+            dict(context_identifier="a.*", name="x"),
+            dict(return_type="in", entry_identifier="Entry|DynamicEntry"),
+            dict(full="b_1/Dyn", return_type="i[n]t"),
+            dict(context_identifier="(?i)A"),
+            dict(name="y"),
+        ):
+            assert name_tuple(indexed.rquery(**kwargs)) == name_tuple(
+                unindexed.rquery(**kwargs)
+            ), kwargs
+        prefixed = diary_interfaces.qwrap(diary_interfaces.fetch_entry_tree())
+        scanned = diary_interfaces.qwrap(dict(diary_interfaces.fetch_entry_tree()))
+        for kwargs in (
+            dict(context_identifier="ab"),
+            dict(context_identifier="a_0$", entry_identifier="Dyn"),
+            dict(context_identifier="a_0$", entry_identifier="DynamicEntry$"),
+            dict(full="b_1/DynamicEntry/i", name="x"),
+            dict(full="b", context_identifier="b_1$", entry_identifier="Dynamic"),
+            dict(context_identifier="a_0|b_1$"),
+        ):
+            assert name_tuple(prefixed.rquery(**kwargs)) == name_tuple(
+                scanned.rquery(**kwargs)
+            ), kwargs
+        assert len(tuple(indexed.rquery(context_identifier="a"))) == 8
+        assert len(tuple(indexed.rquery(context_identifier="a_0$"))) == 4
+
+
+def test_pattern_to_prefix_tuple():
+    from mutwo.diary_interfaces.queries import _pattern_to_prefix_tuple
+
+    assert _pattern_to_prefix_tuple("abc") == ("abc",)
+    assert _pattern_to_prefix_tuple("^ab$") == ("ab",)
+    assert _pattern_to_prefix_tuple("ab*") == ("a",)
+    assert _pattern_to_prefix_tuple("Entry|DynamicEntry") == ("DynamicEntry", "Entry")
+    assert _pattern_to_prefix_tuple("a|ab") == ("a",)
+    assert _pattern_to_prefix_tuple("a[bc]d.") == ("abd", "acd")
+    assert _pattern_to_prefix_tuple(".*") == ("",)
+    assert _pattern_to_prefix_tuple("(?i)ab") == ("",)
+
+
+def test_path_prefix_tuple():
+    from mutwo.diary_interfaces.queries import _path_prefix_tuple
+
+    def prefix_tuple(full=None, **kwargs):
+        return _path_prefix_tuple(
+            {key: re.compile(value) for key, value in kwargs.items()},
+            re.compile(full) if full else None,
+        )
+
+    assert prefix_tuple(context_identifier="a") == ("a",)
+    assert prefix_tuple(context_identifier="a$", entry_identifier="E") == ("a/E",)
+    assert prefix_tuple(context_identifier="a$|b$") == ("a", "b")
+    assert prefix_tuple(context_identifier="a$", return_type="int") == ("a/",)
+    assert prefix_tuple(entry_identifier="Entry") == ("",)
+    assert prefix_tuple(full="a_0/Entry", context_identifier="a") == ("a_0/Entry",)
+
+
+def test_live_and_lazy_qwrap(entry_tree_fixture):
+    with diary_interfaces.open():
+        entry_tree = diary_interfaces.fetch_entry_tree()
+        static = diary_interfaces.qwrap(entry_tree)
+        live = diary_interfaces.qwrap(entry_tree, live=True)
+        lazy = diary_interfaces.qwrap(entry_tree, lazy=True)
+        for wrapper in (static, live, lazy):
+            assert not tuple(wrapper.rquery(name="x"))
+        add_entries()
+        assert live.is_outdated
+        assert not tuple(static.rquery(name="x"))
+        assert len(tuple(live.rquery(name="x"))) == 6
+        assert not live.is_outdated
+        assert len(tuple(lazy.rquery(name="x"))) == 6
+        static.refresh()
+        assert len(tuple(static.rquery(name="x"))) == 6
+
+        # Wrapper of a connection which doesn't see the new state yet
+        reader = diary_interfaces.fetch_session().database.open(
+            transaction_manager=transaction.TransactionManager()
+        )
+        try:
+            reader_live = diary_interfaces.qwrap(reader.root().entry_tree, live=True)
+            diary_interfaces.remove_entry(static.path_tuple[0])
+            assert len(reader_live.path_tuple) == 12
+            assert not reader_live.is_outdated
+            reader.transaction_manager.begin()
+            assert reader_live.is_outdated
+            assert len(reader_live.path_tuple) == 11
+        finally:
+            reader.close()
+
+
+def test_cquery(entry_tree_fixture):
+    with diary_interfaces.open():
+        add_entries()
+        wrapped = diary_interfaces.fetch_wrapped_entry_tree()
+        catalog = wrapped.catalog
+        assert len(catalog) == 12
+        assert not np.isnat(catalog.modification_date).any()
+        # New wrappers share the catalog until the next commit.
+        assert diary_interfaces.fetch_wrapped_entry_tree().catalog is catalog
+
+        path = str(next(iter(wrapped.rquery(context_identifier="b", name="x"))).path)
+        diary_interfaces.remove_entry(path)
+        wrapped.refresh()
+        assert len(wrapped.catalog) == 11
+
+        def function(catalog):
+            return (catalog.relevance == 0) & catalog.is_matching(
+                "context_identifier", "a"
+            )
+
+        assert name_tuple(wrapped.cquery(function)) == name_tuple(
+            wrapped.fquery(lambda entry: entry.context_identifier.name.startswith("a"))
+        )
+        assert name_tuple(
+            wrapped.cquery(lambda catalog: catalog.is_matching("return_type", "int"))
+        ) == name_tuple(wrapped.rquery(return_type="int"))
+        assert not tuple(
+            wrapped.cquery(
+                lambda catalog: catalog.modification_date
+                > np.datetime64(datetime.datetime.utcnow())
+            )
+        )
+
+
+def test_cquery_snapshot(entry_tree_fixture):
+    with diary_interfaces.open():
+        add_entries()
+        session = diary_interfaces.fetch_session()
+        # Connection of another thread which still sees the old state
+        reader = session.database.open(
+            transaction_manager=transaction.TransactionManager()
+        )
+        try:
+            path = next(iter(diary_interfaces.fetch_entry_tree().keys()))
+            diary_interfaces.remove_entry(path)
+            root = reader.root()
+            assert (
+                len(
+                    diary_interfaces.qwrap(
+                        root.entry_tree, catalog_tree=root.catalog_tree
+                    ).catalog
+                )
+                == 12
+            )
+            # Catalog of the old state isn't used by newer connections.
+            assert len(diary_interfaces.fetch_wrapped_entry_tree().catalog) == 11
+        finally:
+            reader.close()
@@ -0,0 +1,51 @@
+import concurrent.futures
+import dataclasses
+
+import pytest
+from ZODB.MappingStorage import MappingStorage
+
+from mutwo import diary_interfaces
+from mutwo import diary_utilities
+
+
+@dataclasses.dataclass(frozen=True)
+class SeContext(diary_interfaces.Context, name="session", version=0):
+    ...
+
+
+def test_session():
+    session = diary_interfaces.Session(MappingStorage())
+    for name in "abc":
+        diary_interfaces.DynamicEntry(
+            name,
+            SeContext.identifier,
+            int,
+            code="def main(context): 1",
+            skip_check=False,
+            session=session,
+        )
+
+    def query(_):
+        name_tuple = tuple(
+            entry.name
+            for entry in diary_interfaces.fetch_wrapped_entry_tree(
+                session=session
+            ).rquery(context_identifier="session")
+        )
+        session.release()
+        return name_tuple
+
+    with concurrent.futures.ThreadPoolExecutor(2) as executor:
+        result_tuple = tuple(executor.map(query, range(4)))
+    assert all(name_tuple == ("a", "b", "c") for name_tuple in result_tuple)
+
+    # Loaded entries know their session
+    entry = next(iter(diary_interfaces.fetch_entry_tree(session).values()))
+    entry._v_session = None
+    assert entry.session is session
+    session.close()
+
+
+def test_no_session():
+    with pytest.raises(diary_utilities.NoSessionError):
+        diary_interfaces.fetch_entry_tree()
@@ -0,0 +1,78 @@
+import dataclasses
+import os
+
+from mutwo import diary_interfaces
+
+
+@dataclasses.dataclass(frozen=True)
+class SContext(diary_interfaces.Context, name="source", version=0):
+    ...
+
+
+def test_sync_directory(entry_tree_fixture, tmpdir):
+    source_directory = tmpdir.mkdir("entries")
+    for name in ("a", "b"):
+        source_directory.join(f"{name}.py").write("def main(context): 1")
+
+    registered_file_list = []
+
+    def register(file_path: str):
+        registered_file_list.append(os.path.basename(file_path))
+        return diary_interfaces.DynamicEntry.from_file(
+            os.path.basename(file_path)[:-3],
+            SContext.identifier,
+            int,
+            file_path=file_path,
+            skip_check=False,
+        )
+
+    def sync(**kwargs):
+        registered_file_list.clear()
+        with diary_interfaces.open():
+            report = diary_interfaces.sync_directory(
+                str(source_directory), register, **kwargs
+            )
+            path_tuple = tuple(diary_interfaces.fetch_entry_tree().keys())
+        return report, path_tuple
+
+    report, path_tuple = sync()
+    assert report.registered_file_list == registered_file_list == ["a.py", "b.py"]
+    assert len(path_tuple) == 2
+
+    report, _ = sync()
+    assert not registered_file_list
+    assert report.unchanged_file_list == ["a.py", "b.py"]
+
+    # Only modification time changes
+    os.utime(str(source_directory.join("a.py")), ns=(0, 0))
+    report, _ = sync()
+    assert not registered_file_list
+    assert report.unchanged_file_list == ["a.py", "b.py"]
+
+    source_directory.join("a.py").write("def main(context): 20")
+    source_directory.join("b.py").remove()
+    report, path_tuple = sync()
+    assert registered_file_list == ["a.py"]
+    assert report.deleted_file_list == ["b.py"]
+    assert len(report.orphan_path_list) == 1
+    assert not report.removed_path_list
+    assert len(path_tuple) == 2
+
+    source_directory.join("c.py").write("def main(context): 20")
+    report, path_tuple = sync()
+    assert registered_file_list == ["c.py"]
+    # Orphans are reported until they are removed.
+    assert report.deleted_file_list == ["b.py"]
+    assert len(report.orphan_path_list) == 1
+    assert len(path_tuple) == 3
+
+    source_directory.join("c.py").remove()
+    report, path_tuple = sync(remove=True)
+    assert report.deleted_file_list == ["b.py", "c.py"]
+    assert len(report.removed_path_list) == 2
+    assert len(path_tuple) == 1
+
+    report, path_tuple = sync(remove=True)
+    assert not report.deleted_file_list
+    assert not report.removed_path_list
+    assert len(path_tuple) == 1
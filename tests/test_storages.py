@@ -0,0 +1,142 @@
+import dataclasses
+import os
+
+import pytest
+from ZODB.FileStorage import FileStorage
+from ZODB.MappingStorage import MappingStorage
+from ZODB.POSException import ReadOnlyError
+import transaction
+
+from mutwo import diary_interfaces
+
+
+@dataclasses.dataclass(frozen=True)
+class StContext(diary_interfaces.Context, name="storage", version=0):
+    ...
+
+
+def test_create_storage(tmpdir):
+    path = str(tmpdir.join("d.fs"))
+    storage = diary_interfaces.create_storage("memory://")
+    assert isinstance(storage, MappingStorage)
+    storage.close()
+    for spec in (path, f"file://{path}"):
+        storage = diary_interfaces.create_storage(spec)
+        assert isinstance(storage, FileStorage)
+        assert storage.getName() == path
+        storage.close()
+    with pytest.raises(ValueError):
+        diary_interfaces.create_storage("unknown://abc")
+
+
+def test_open_memory():
+    with diary_interfaces.open("memory://"):
+        diary_interfaces.Entry("a", StContext.identifier, int, skip_check=False)
+        assert len(diary_interfaces.fetch_entry_tree()) == 1
+    with diary_interfaces.open(MappingStorage()):
+        assert len(diary_interfaces.fetch_entry_tree()) == 0
+
+
+def test_open_read_only(tmpdir):
+    path = str(tmpdir.join("d.fs"))
+    with diary_interfaces.open(path):
+        diary_interfaces.Entry("a", StContext.identifier, int, skip_check=False)
+        # Readers can open the storage while the writer still holds it.
+        session = diary_interfaces.Session(
+            diary_interfaces.create_storage(path, read_only=True)
+        )
+        assert len(diary_interfaces.fetch_entry_tree(session)) == 1
+        session.close()
+    with diary_interfaces.open(path, read_only=True):
+        with pytest.raises(ReadOnlyError):
+            diary_interfaces.Entry("b", StContext.identifier, int, skip_check=False)
+
+
+def test_open_read_only_without_trees(tmpdir):
+    storage_path = str(tmpdir.join("d.fs"))
+    with diary_interfaces.open(storage_path) as root:
+        path = diary_interfaces.Entry(
+            "a", StContext.identifier, int, skip_check=False
+        ).path
+        digest = diary_interfaces.fetch_digest()
+        # Diaries of older versions only have an entry tree.
+        for name in (
+            "index_tree",
+            "catalog_tree",
+            "dependency_tree",
+            "digest_tree",
+            "entry_digest_tree",
+        ):
+            delattr(root, name)
+        transaction.commit()
+    with diary_interfaces.open(storage_path, read_only=True) as root:
+        assert tuple(
+            entry.path
+            for entry in diary_interfaces.fetch_wrapped_entry_tree().rquery(
+                context_identifier=str(StContext.identifier)
+            )
+        ) == (path,)
+        assert len(diary_interfaces.fetch_wrapped_entry_tree().catalog) == 1
+        assert diary_interfaces.fetch_digest() == digest
+        assert diary_interfaces.fetch_dependency_tree()[path] == ()
+        # Missing trees are only kept in memory.
+        assert not hasattr(root, "index_tree")
+        assert (
+            diary_interfaces.fetch_index_tree() is diary_interfaces.fetch_index_tree()
+        )
+        transaction.commit()
+
+
+def test_zeo(tmpdir):
+    pytest.importorskip("ZEO")
+    storage_spec, stop = diary_interfaces.start_zeo_server(str(tmpdir.join("d.fs")))
+    try:
+        assert storage_spec.startswith("zeo://")
+        with diary_interfaces.open(storage_spec) as root:
+            reader = diary_interfaces.Session(
+                diary_interfaces.create_storage(storage_spec, read_only=True)
+            )
+            try:
+                assert reader.read_only
+                for count, name in enumerate("ab", 1):
+                    diary_interfaces.Entry(
+                        name, StContext.identifier, int, skip_check=False
+                    )
+                    # Reader builds index in memory.
+                    del root.index_tree
+                    transaction.commit()
+                    reader.abort()
+                    assert (
+                        len(
+                            tuple(
+                                diary_interfaces.fetch_wrapped_entry_tree(
+                                    session=reader
+                                ).rquery(context_identifier=str(StContext.identifier))
+                            )
+                        )
+                        == count
+                    )
+            finally:
+                reader.close()
+    finally:
+        stop()
+
+
+def test_pack(tmpdir):
+    path = str(tmpdir.join("d.fs"))
+    with diary_interfaces.open(path):
+        for relevance in range(50):
+            diary_interfaces.Entry(
+                "a", StContext.identifier, int, relevance=relevance, skip_check=False
+            )
+        size = os.path.getsize(path)
+        diary_interfaces.pack()
+        assert os.path.getsize(path) < size
+        assert (
+            diary_interfaces.fetch_entry_tree()[
+                diary_interfaces.Entry(
+                    "a", StContext.identifier, int, relevance=49, skip_check=True
+                ).path
+            ].relevance
+            == 49
+        )
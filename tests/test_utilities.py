@@ -0,0 +1,35 @@
+import pytest
+
+from mutwo import diary_interfaces
+from mutwo import diary_utilities
+
+
+def test_cache():
+    cache = diary_interfaces.Cache(maxsize=2)
+    assert cache.fetch("a", lambda: 1) == 1
+    assert cache.fetch("a", lambda: 2) == 1
+    assert (cache.hit_count, cache.miss_count) == (1, 1)
+    cache.fetch("b", lambda: 3)
+    cache.fetch("a", lambda: 4)  # 'a' is now most recently used
+    cache.fetch("c", lambda: 5)  # evicts 'b'
+    assert len(cache) == 2
+    assert "a" in cache and "c" in cache and "b" not in cache
+
+
+def test_execute():
+    code = "import math\ndef main(x): return math.floor(x)"
+    assert diary_interfaces.execute("t", code, "main", 1.5) == 1
+    namespace = diary_interfaces.fetch_namespace(code)
+    hit_count = diary_interfaces.CODE_CACHE.hit_count
+    assert diary_interfaces.execute("t", code, "main", 2.5) == 2
+    # Code isn't executed again
+    assert diary_interfaces.fetch_namespace(code) is namespace
+    assert diary_interfaces.CODE_CACHE.hit_count == hit_count + 2
+
+
+def test_execute_errors():
+    code = "def main(): raise ValueError()"
+    with pytest.raises(NameError):
+        diary_interfaces.execute("t", code, "is_supported")
+    with pytest.raises(diary_utilities.ExecutionError):
+        diary_interfaces.execute("t", code, "main")